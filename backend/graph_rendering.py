@@ -0,0 +1,149 @@
+import os
+import glob
+import time
+import hashlib
+import tempfile
+
+import networkx as nx
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+from utils import logger
+
+matplotlib.use("agg")
+
+GRAPH_SAVE_FOLDER = "frontend/static/ressources"
+
+# with more nodes the visualization might become messy
+MAX_RENDERED_NODES = 20
+
+
+def graph_content_hash(universe_graph: nx.Graph, millenium_dict: dict) -> str:
+    """
+    Hash the routes of the graph along with the departure and arrival planets highlighted in the rendering.
+    """
+    content = sorted(
+        tuple(sorted((origin, destination))) + (weight,)
+        for origin, destination, weight in universe_graph.edges(data="weight")
+    )
+    content.append((millenium_dict["departure"], millenium_dict["arrival"]))
+    return hashlib.sha1(repr(content).encode()).hexdigest()
+
+
+def render_universe_graph(
+    universe_graph: nx.Graph, millenium_dict: dict, save_folder: str = GRAPH_SAVE_FOLDER
+) -> str:
+    """
+    Create a visualization of the routes graph to add it on the webapp page.
+
+    Images are named after the content of the graph so a graph already rendered is not drawn again.
+
+    Parameters:
+        - universe_graph (nx.Graph): NetworkX graph representing the possible routes in the universe.
+        - millenium_dict (dict): the Millennium Falcon config dict.
+        - save_folder (str): the folder where the image is saved.
+
+    Returns:
+        - image_path (str | None): the path to the .png image, None if the graph is too large
+                                   or if an issue occurred during the rendering.
+    """
+    if universe_graph is None or universe_graph.number_of_nodes() >= MAX_RENDERED_NODES:
+        return None
+
+    image_path = os.path.join(
+        save_folder,
+        "routes_graph_{}.png".format(graph_content_hash(universe_graph, millenium_dict)[:16]),
+    )
+    if os.path.isfile(image_path):
+        try:
+            # mark the image as used so that cleanup_rendered_graphs keeps it
+            os.utime(image_path)
+            return image_path
+        except FileNotFoundError:
+            # deleted by a concurrent cleanup in the meantime
+            pass
+
+    try:
+        # a Figure is used instead of pyplot so that concurrent renderings do not share state
+        figure = Figure()
+        ax = figure.subplots()
+        graph_layout = nx.drawing.spring_layout(universe_graph, seed=0)
+        color_map = []
+        for node in universe_graph:
+            if node == millenium_dict["departure"]:
+                color_map.append("green")
+            elif node == millenium_dict["arrival"]:
+                color_map.append("red")
+            else:
+                color_map.append("orange")
+        nx.draw_networkx(universe_graph, pos=graph_layout, node_color=color_map, ax=ax)
+        nx.draw_networkx_edge_labels(
+            universe_graph,
+            graph_layout,
+            edge_labels={(u, v): a["weight"] for u, v, a in universe_graph.edges(data=True)},
+            ax=ax,
+        )
+        ax.axis("off")
+        legend_handles = [
+            Line2D(
+                [0],
+                [0],
+                marker="o",
+                color="w",
+                label="Circle",
+                markerfacecolor="g",
+                markersize=10,
+            ),
+            Line2D(
+                [0],
+                [0],
+                marker="o",
+                color="w",
+                label="Circle",
+                markerfacecolor="r",
+                markersize=10,
+            ),
+        ]
+        legend_labels = ["Departure Planet", "Arrival Planet"]
+        ax.legend(legend_handles, legend_labels)
+
+        # write to a temporary file first so a concurrent request never serves a partial image
+        os.makedirs(save_folder, exist_ok=True)
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=save_folder, suffix=".tmp")
+        try:
+            with os.fdopen(tmp_fd, "wb") as f:
+                figure.savefig(f, bbox_inches="tight", format="png")
+            os.replace(tmp_path, image_path)
+        except Exception:
+            # do not leave the partial image behind
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+    except Exception:
+        logger.info("Error during graph visualization creation.")
+        return None
+
+    return image_path
+
+
+def cleanup_rendered_graphs(save_folder: str = GRAPH_SAVE_FOLDER, max_age: float = 24 * 3600) -> int:
+    """
+    Deletes the rendered routes images that were not used for max_age seconds.
+
+    Returns:
+        - n_deleted (int): the number of images deleted.
+    """
+    n_deleted = 0
+    now = time.time()
+    for image_path in glob.glob(os.path.join(save_folder, "routes_graph_*.png")):
+        try:
+            if now - os.path.getmtime(image_path) > max_age:
+                os.remove(image_path)
+                n_deleted += 1
+        except FileNotFoundError:
+            # deleted by another process
+            continue
+    return n_deleted
@@ -1,14 +1,65 @@
 import argparse
 import os
+import sys
+import json
+import time
+import pickle
 import networkx as nx
 import itertools
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from typing import NamedTuple
+from fractions import Fraction
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import threading
 import logging
 
 from utils import *
+from solvers import (
+    solve_time_expanded,
+    solve_time_expanded_matrix,
+    search_time_expanded,
+    chain_to_itinerary,
+    prepare_time_expanded,
+    TimeExpandedProblem,
+    TimeExpandedSearch,
+    feasible_planets,
+    feasible_remaining,
+    first_changed_day,
+    min_travel_days,
+    problem_shortest_path,
+    time_expanded_result,
+    build_hunted,
+    check_deadline,
+)
+from universe_csr import UniverseCSR, is_universe_snapshot, load_universe_snapshot, snapshot_graph
+from result_cache import ResultCache, result_cache_key
+from profiling import SolverStats, NULL_STATS
+from scoring import best_by_odds, exact_probability, format_odds
 
 logging.basicConfig(level=logging.INFO)
 
+SOLVERS = ["dp", "bidir", "paths"]
+
+# maximum number of (graph, departure, arrival, autonomy) whose candidate paths are kept in memory
+CANDIDATE_PATHS_CACHE_SIZE = 16
+_candidate_paths_cache = OrderedDict()
+_candidate_paths_lock = threading.Lock()
+
+# maximum number of prepared missions kept in memory by prepare_mission
+MISSION_CACHE_SIZE = 16
+_mission_cache = OrderedDict()
+_mission_cache_lock = threading.Lock()
+
+# number of candidate paths sent to each worker at once when the paths are evaluated in parallel
+PATHS_PER_WORKER = 4
+
+# process pool of compute_paths_odds, kept between the calls on the same graph, see _get_path_pool
+_path_pool = None
+_path_pool_key = None
+_path_pool_lock = threading.RLock()
+_path_context_ids = itertools.count()
+
 def compute_path_length(
     path: list, universe_graph: nx.Graph, autonomy: int
 ) -> (int, int, int):
@@ -23,7 +74,7 @@ def compute_path_length(
     Returns:
         - length_without_refuel (int): the length of the path according to the distance in the universe_graph INCLUDING refuel steps.
         - length_without_refuel (int): the length of the path according to the distance in the universe_graph WITHOUT refuel steps.
-        - n_refuel (int): the number of refuel steps.
+        - n_refuel (int): the smallest number of refuel steps needed along the path.
 
     """
 
@@ -31,39 +82,232 @@ def compute_path_length(
         universe_graph[path[i]][path[i + 1]]["weight"] for i in range(len(path) - 1)
     ]
     length_without_refuel = sum(path_edge_weights)
+
+    # refueling only when the next route cannot be taken with the remaining fuel
+    # gives the smallest number of refuels along the path
     n_refuel = 0
-    for i in range(1, len(path) - 1):
-        incoming_w = universe_graph[path[i - 1]][path[i]]["weight"]
-        outgoing_w = universe_graph[path[i]][path[i + 1]]["weight"]
-        if (incoming_w + outgoing_w) >= autonomy:
+    fuel = autonomy
+    for weight in path_edge_weights:
+        if weight > fuel:
             n_refuel += 1
+            fuel = autonomy
+        fuel -= weight
     total_length = n_refuel + length_without_refuel
 
     return total_length, length_without_refuel, n_refuel
 
 
-def compute_path_odds(
-    path: list, universe_graph: nx.Graph, empire_dict: dict, millenium_dict: dict
-) -> (float, list):
+class PathCandidate(NamedTuple):
+    """
+    A candidate path along with everything about it that does not depend on the Empire Communications.
+    """
+
+    path: list
+    # see compute_path_length
+    total_length: int
+    length_without_refuel: int
+    n_refuel: int
+    # for each planet of the path, the earliest day the Falcon can reach it
+    earliest_arrivals: list
+    # for each planet of the path, the shortest time (travel and refuels) to the arrival from it
+    remaining_lengths: list
+
+
+def make_path_candidate(path: list, universe_graph: nx.Graph, autonomy: int) -> PathCandidate:
+    """
+    Compute the lengths of a path and the arrival windows bounds of its planets.
+    """
+    total_length, length_without_refuel, n_refuel = compute_path_length(
+        path, universe_graph, autonomy
+    )
+    earliest_arrivals = [
+        compute_path_length(path[: i + 1], universe_graph, autonomy)[0]
+        for i in range(len(path))
+    ]
+    remaining_lengths = [
+        compute_path_length(path[i:], universe_graph, autonomy)[0]
+        for i in range(len(path))
+    ]
+    return PathCandidate(
+        path,
+        total_length,
+        length_without_refuel,
+        n_refuel,
+        earliest_arrivals,
+        remaining_lengths,
+    )
+
+
+def candidate_encounters_lower_bound(
+    candidate: PathCandidate, bounty_index: dict, countdown: int
+) -> int:
+    """
+    Compute a lower bound on the number of encounters along a candidate path, see compute_encounters_lower_bound.
+    """
+    lower_bound = 0
+    for i, planet in enumerate(candidate.path):
+        if planet not in bounty_index:
+            continue
+        earliest_arrival = candidate.earliest_arrivals[i]
+        latest_arrival = 0
+        if i > 0:
+            latest_arrival = countdown - candidate.remaining_lengths[i]
+        if count_days(
+            days_to_bitmask(bounty_index[planet]), earliest_arrival, latest_arrival
+        ) == latest_arrival - earliest_arrival + 1:
+            lower_bound += 1
+    return lower_bound
+
+
+def compute_encounters_lower_bound(
+    path: list, universe_graph: nx.Graph, bounty_index: dict, autonomy: int, countdown: int
+) -> int:
+    """
+    Compute a lower bound on the number of encounters with bounty hunters for any itinerary along a path.
+
+    The Falcon reaches the i-th planet of the path between its earliest arrival day (shortest travel
+    and fewest refuels before it) and its latest arrival day (countdown minus the shortest travel and
+    fewest refuels after it). If bounty hunters are present on the planet every day of this window,
+    an encounter cannot be avoided there.
+
+    Parameters:
+        - path (list): a list of the names of the nodes constituting the path from departure to arrival.
+        - universe_graph (nx.Graph): NetworkX graph representing the possible routes in the universe.
+        - bounty_index (dict[int]): the bitmask of the days when bounty hunters are present on each planet,
+                                    see build_bounty_index.
+        - autonomy (int): the autonomy of the Millennium Falcon.
+        - countdown (int): the number of days before the Death Star destroys the arrival planet.
+
+    Returns:
+        - lower_bound (int): the number of planets of the path where an encounter is unavoidable.
+    """
+    return candidate_encounters_lower_bound(
+        make_path_candidate(path, universe_graph, autonomy), bounty_index, countdown
+    )
+
+
+class CandidatePaths:
+    """
+    The simple paths from departure to arrival by increasing travel time, enumerated lazily and kept
+    in memory so that the following Empire Communications do not enumerate them again.
+    """
+
+    def __init__(self, universe_graph: nx.Graph, departure: str, arrival: str, autonomy: int):
+        self.universe_graph = universe_graph
+        self.autonomy = autonomy
+        self._generator = nx.shortest_simple_paths(
+            universe_graph, departure, arrival, weight="weight"
+        )
+        self._candidates = []
+        self._exhausted = False
+        # the networkx generator cannot be advanced by two threads at once
+        self._lock = threading.Lock()
+
+    def _get(self, i: int) -> PathCandidate:
+        """
+        Returns the i-th candidate, None if there are less than i + 1 paths.
+        """
+        with self._lock:
+            while len(self._candidates) <= i and not self._exhausted:
+                try:
+                    path = next(self._generator)
+                except StopIteration:
+                    self._exhausted = True
+                    break
+                self._candidates.append(
+                    make_path_candidate(path, self.universe_graph, self.autonomy)
+                )
+            return self._candidates[i] if i < len(self._candidates) else None
+
+    def iter_candidates(self, max_length: int = None):
+        """
+        Yields the candidate paths by increasing travel time, until the travel time with the refuels forced
+        by the autonomy exceeds max_length.
+        """
+        i = 0
+        while True:
+            candidate = self._get(i)
+            if candidate is None:
+                return
+            # all the following paths are at least as long as this one
+            if max_length is not None and min_travel_days(
+                candidate.length_without_refuel, self.autonomy
+            ) > max_length:
+                return
+            yield candidate
+            i += 1
+
+
+def get_candidate_paths(
+    universe_graph: nx.Graph,
+    departure: str,
+    arrival: str,
+    autonomy: int,
+    countdown: int = None,
+    planets: set = None,
+) -> CandidatePaths:
+    """
+    Returns the CandidatePaths of a graph, departure, arrival, autonomy and countdown from a bounded LRU cache.
+
+    If planets is set, the paths are enumerated in the subgraph of these planets only. They must be the
+    feasible planets of the countdown (see solvers.feasible_planets), which are the same for every call with
+    this countdown, so they are only used when the enumeration is not cached.
+    """
+    # the cached entry holds a reference to the graph, so its id cannot be reused by another graph,
+    # and the version changes when the graph is patched (see utils.load_universe_graph)
+    key = (
+        id(universe_graph),
+        universe_graph.graph.get("version", 0),
+        departure,
+        arrival,
+        autonomy,
+        countdown,
+    )
+    with _candidate_paths_lock:
+        if key in _candidate_paths_cache:
+            _candidate_paths_cache.move_to_end(key)
+            return _candidate_paths_cache[key]
+        candidate_paths = CandidatePaths(
+            universe_graph.subgraph(planets) if planets is not None else universe_graph,
+            departure,
+            arrival,
+            autonomy,
+        )
+        _candidate_paths_cache[key] = candidate_paths
+        if len(_candidate_paths_cache) > CANDIDATE_PATHS_CACHE_SIZE:
+            _candidate_paths_cache.popitem(last=False)
+    return candidate_paths
+
+
+def compute_path_encounters(
+    path: list,
+    universe_graph: nx.Graph,
+    empire_dict: dict,
+    millenium_dict: dict,
+    bounty_index: dict = None,
+    stats: SolverStats = None,
+) -> (int, list):
     """
-    Compute the optimal odds possible given a path
+    Compute the lowest number of encounters with bounty hunters possible given a path
 
     Parameters:
         - path (list): a list of the names of the nodes constituting the path from departure to arrival.
         - universe_graph (nx.Graph): NetworkX graph representing the possible routes in the universe.
         - empire_dict (dict): dict object containing information about the Empire Communications.
         - millenium_dict (dict): dict object containing information about the Millennium Falcon.
+        - bounty_index (dict[int] | None): the bounty hunters schedule compiled by build_bounty_index,
+                                           compiled from empire_dict if None.
+        - stats (SolverStats | None): optional instrumentation of the stops placement, see profiling.py.
 
     Returns:
-        - odds (float): the odds of success of the path.
-        - itinerary (list[tuple] | None): the associated strategy to achieve the odds contains the arrival
-                                          and departure days for each planet in the path. None if the odds are 0.
+        - encounters (int | None): the lowest number of encounters, None if the path cannot be travelled in time.
+        - itinerary (list[tuple] | None): the associated strategy to achieve the encounters contains the arrival
+                                          and departure days for each planet in the path. None if encounters is None.
     """
     autonomy = millenium_dict["autonomy"]
-
-    bounty_dict = defaultdict(set)
-    for bounty in empire_dict["bounty_hunters"]:
-        bounty_dict[bounty["planet"]].add(bounty["day"])
+    countdown = int(empire_dict["countdown"])
+    if bounty_index is None:
+        bounty_index = empire_bounty_index(empire_dict)
 
     path_edge_weights = [
         universe_graph[path[i]][path[i + 1]]["weight"] for i in range(len(path) - 1)
@@ -72,125 +316,968 @@ def compute_path_odds(
         path, universe_graph, autonomy
     )
 
-    if total_length > int(empire_dict["countdown"]):
+    if total_length > countdown:
+        return None, None
+
+    # the path is seen as a line graph whose nodes are the indices of the planets in the path,
+    # the stops (waits and refuels) are then placed by the time-expanded dynamic programming
+    # over (index in path, day, fuel) states in O(len(path) x countdown x autonomy).
+    adjacency = [[(i + 1, weight)] for i, weight in enumerate(path_edge_weights)] + [[]]
+    hunted = [bounty_index.get(planet, 0) for planet in path]
+    remaining = list(itertools.accumulate(reversed(path_edge_weights), initial=0))[::-1]
+
+    lowest_encounter, chain = search_time_expanded(
+        adjacency, hunted, 0, len(path) - 1, autonomy, countdown, remaining, stats
+    )
+    if chain is None:
+        return None, None
+    _, best_stops = chain_to_itinerary(chain)
+    return lowest_encounter, best_stops
+
+
+def compute_path_odds(
+    path: list,
+    universe_graph: nx.Graph,
+    empire_dict: dict,
+    millenium_dict: dict,
+    bounty_index: dict = None,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+) -> (float, list):
+    """
+    Compute the optimal odds possible given a path, see compute_path_encounters.
+
+    Returns:
+        - odds (float): the odds of success of the path.
+        - itinerary (list[tuple] | None): the associated strategy to achieve the odds contains the arrival
+                                          and departure days for each planet in the path. None if the odds are 0.
+    """
+    encounters, itinerary = compute_path_encounters(
+        path, universe_graph, empire_dict, millenium_dict, bounty_index, stats
+    )
+    if encounters is None:
         return 0, None
+    # odds computation based on the number of encounters with bounty hunters
+    return encounters_to_odds(encounters, capture_probability), itinerary
+
+
+def compute_encounters(path: list, itinerary_dates: list, bounty_presence: dict) -> int:
+    """
+    Compute the number of encounters with bounty hunters following a path and an itinerary
+
+    Parameters:
+        - path (list): a list of the names of the nodes constituting the path from departure to arrival.
+        - itinerary (list[tuple]): the associated strategy to achieve the odds contains the arrival
+                                   and departure days for each planet in the path.
+        - bounty_presence (dict[int] | dict[set]): the bitmask (see build_bounty_index) or the set of the days
+                                                   when bounty hunters are present on each planet.
+
+    Returns:
+        - encounters (int): the number of encounters with bounty hunters.
+    """
+    # convert the itinerary and path in a presence bitmask just as the bounty index format,
+    # a planet visited twice accumulates its days of presence.
+    falcon_presence = defaultdict(int)
+    for planet, (arrival, departure) in zip(path, itinerary_dates):
+        if planet in bounty_presence:
+            falcon_presence[planet] |= ((1 << (departure - arrival + 1)) - 1) << arrival
+
+    # the number of encounter is the number of common days summed over the planets.
+    encounters = 0
+    for planet, presence in falcon_presence.items():
+        encounters += (presence & days_to_bitmask(bounty_presence[planet])).bit_count()
+
+    return encounters
+
 
-    # split planets into two groups:
-    # 1 - where the falcon must refuel, i.e. planets where incoming and outgoing travels are above the falcon autonomy
-    # 2 - the others planets
+# state of the worker processes, set once per process by the pool initializers
+_worker_state = {}
 
-    forced_refuel = []
-    may_stop_or_refuel = [path[0]]
-    for i in range(1, len(path) - 1):
-        incoming_w = universe_graph[path[i - 1]][path[i]]["weight"]
-        outgoing_w = universe_graph[path[i]][path[i + 1]]["weight"]
-        if (incoming_w + outgoing_w) >= autonomy:
-            forced_refuel.append(path[i])
 
-        may_stop_or_refuel.append(path[i])
+def _init_path_worker(universe_graph: nx.Graph):
+    """
+    Pool initializer of compute_paths_odds: the graph is sent once per worker and kept for the next calls.
+    """
+    _worker_state["path_graph"] = universe_graph
+    _worker_state["path_context_id"] = None
+
+
+def _evaluate_paths(context_id: int, context: bytes, paths: list) -> (list, dict):
+    """
+    Worker task of compute_paths_odds, the stats of the task are sent back if profiling is enabled.
+
+    The pickled Empire schedule and Falcon of the call (context) are only unpickled by the first task
+    of each call a worker runs.
+    """
+    if _worker_state["path_context_id"] != context_id:
+        _worker_state["path_context"] = pickle.loads(context)
+        _worker_state["path_context_id"] = context_id
+    empire_dict, millenium_dict, bounty_index, profile = _worker_state["path_context"]
+    universe_graph = _worker_state["path_graph"]
+    stats = SolverStats() if profile else None
+    results = [
+        compute_path_encounters(path, universe_graph, empire_dict, millenium_dict, bounty_index, stats)
+        for path in paths
+    ]
+    return results, stats.to_dict() if stats is not None else None
+
+
+def _get_path_pool(universe_graph: nx.Graph, workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the process pool of compute_paths_odds, started again only when the graph or the number
+    of workers changes. Must be called with _path_pool_lock held.
+    """
+    global _path_pool, _path_pool_key
+    # the key keeps a reference to the graph, so its identity cannot be reused by another graph
+    if _path_pool_key is None or _path_pool_key[0] is not universe_graph or _path_pool_key[1] != workers:
+        shutdown_path_pool()
+        _path_pool = ProcessPoolExecutor(
+            workers, initializer=_init_path_worker, initargs=(universe_graph,)
+        )
+        _path_pool_key = (universe_graph, workers)
+    return _path_pool
+
 
-    # compute the number of possible stops and refuels among the path
-    allowed_stop_or_refuel = (
-        empire_dict["countdown"] - length_without_refuel - len(forced_refuel)
+def shutdown_path_pool():
+    """
+    Stops the worker processes of compute_paths_odds, the next parallel call starts new ones.
+    """
+    global _path_pool, _path_pool_key
+    with _path_pool_lock:
+        if _path_pool is not None:
+            _path_pool.shutdown(cancel_futures=True)
+        _path_pool = None
+        _path_pool_key = None
+
+
+def compute_distance_labels(universe_graph: nx.Graph, millenium_dict: dict) -> (dict, dict):
+    """
+    Runs one Dijkstra from the departure and one from the arrival.
+
+    Returns:
+        - from_departure (dict): the shortest travel time from the departure to each reachable planet.
+        - to_arrival (dict): the shortest travel time from each planet to the arrival.
+    """
+    return tuple(
+        nx.single_source_dijkstra_path_length(universe_graph, millenium_dict[planet], weight="weight")
+        if millenium_dict[planet] in universe_graph
+        else {}
+        for planet in ("departure", "arrival")
     )
 
-    itinerary_dates = []
-    best_stops = None
 
-    if allowed_stop_or_refuel > 0:
-        lowest_encounter = empire_dict["countdown"]
+def _merge_worker_stats(results, stats: SolverStats):
+    """
+    Strips the stats sent back by the workers from their results and adds them to stats.
+    """
+    for *result, worker_stats in results:
+        if worker_stats is not None:
+            stats.merge(worker_stats)
+        yield tuple(result)
 
-        # enumerate all possibilities to stops among the path (taking forced stop into account)
-        for stops in itertools.combinations_with_replacement(
-            may_stop_or_refuel, allowed_stop_or_refuel
-        ):
-            stops = list(stops) + forced_refuel
-            itinerary_dates = []
-            stops_per_planet = {planet: stops.count(planet) for planet in path}
 
-            fuel = autonomy
-            for idx_planet, planet in enumerate(path):
-                if idx_planet == 0:
-                    itinerary_dates.append((0, stops_per_planet[planet]))
-                else:
-                    arrival_day = (
-                        itinerary_dates[-1][-1] + path_edge_weights[idx_planet - 1]
+def compute_paths_odds(
+    universe_graph: nx.Graph,
+    empire_dict: dict,
+    millenium_dict: dict,
+    bounty_index: dict = None,
+    workers: int = 1,
+    stats: SolverStats = None,
+    distance_labels: tuple = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+    deadline: float = None,
+) -> (float, list, list):
+    """
+    Compute the optimal odds by enumerating all simple paths from departure to arrival.
+
+    Parameters:
+        - universe_graph (nx.Graph): NetworkX graph representing the possible routes in the universe.
+        - empire_dict (dict): dict object containing information about the Empire Communications.
+        - millenium_dict (dict): dict object containing information about the Millennium Falcon.
+        - bounty_index (dict[int] | None): the bounty hunters schedule compiled by build_bounty_index,
+                                           compiled from empire_dict if None.
+        - workers (int): number of processes evaluating the candidate paths, the result does not
+                         depend on it.
+        - stats (SolverStats | None): optional instrumentation, counts the "paths_evaluated" and
+                                      "paths_pruned", see profiling.py.
+        - distance_labels (tuple[dict] | None): the shortest travel times from the departure and to the
+                                                arrival, computed if None. The paths are only enumerated
+                                                among the planets kept by solvers.feasible_planets.
+        - capture_probability (float): the probability of being captured at each encounter, see scoring.py.
+        - deadline (float | None): time.time() timestamp after which solvers.SearchTimeout is raised
+                                   between two chunks of paths.
+
+    Returns:
+        - odds (float): the best odds of success among all paths.
+        - path (list[str] | None): the path achieving the odds, None if the odds are 0.
+        - itinerary (list[tuple] | None): the associated arrival and departure days, None if the odds are 0.
+    """
+    logger = logging.getLogger("R2D2")
+    autonomy = millenium_dict["autonomy"]
+    countdown = int(empire_dict["countdown"])
+    if bounty_index is None:
+        bounty_index = empire_bounty_index(empire_dict)
+    if distance_labels is None:
+        distance_labels = compute_distance_labels(universe_graph, millenium_dict)
+
+    # planets too far from the departure and arrival to be visited in time are removed
+    # before the enumeration, which stops right away if the arrival itself is removed
+    planets = feasible_planets(*distance_labels, autonomy, countdown)
+    if stats is not None:
+        stats.count("planets_pruned", universe_graph.number_of_nodes() - len(planets))
+    if millenium_dict["arrival"] not in planets:
+        return 0, None, None
+
+    # The mission is possible now we must look at all possible path from departure to arrival
+    # and compute their odds. Paths are generated by increasing travel time, which allows to
+    # stop the enumeration as soon as they get too long, and paths that cannot beat the best
+    # odds found so far are skipped. The enumeration is shared with the previous Empire
+    # Communications on the same graph.
+    candidates = get_candidate_paths(
+        universe_graph, millenium_dict["departure"], millenium_dict["arrival"], autonomy, countdown, planets
+    ).iter_candidates(countdown)
+    # in parallel, the candidates are evaluated by chunks and the results are reduced in the
+    # order of the enumeration, so the chosen path is the same as in the serial evaluation
+    executor = None
+    chunk_size = 1
+
+    # the paths are compared on their number of encounters, the odds decrease with it
+    lowest_encounters = None
+    best_itinerary = None
+    best_path = None
+    n_evaluated = 0
+    n_pruned = 0
+    exhausted = False
+    if workers > 1:
+        # the pool is shared by the calls on the same graph, one parallel evaluation at a time
+        _path_pool_lock.acquire()
+    try:
+        if workers > 1:
+            executor = _get_path_pool(universe_graph, workers)
+            context_id = next(_path_context_ids)
+            context = pickle.dumps(
+                (empire_dict, millenium_dict, bounty_index, stats is not None and stats.enabled)
+            )
+            chunk_size = workers * PATHS_PER_WORKER
+
+        while not exhausted:
+            check_deadline(deadline)
+            chunk = []
+            for candidate in candidates:
+                if candidate.total_length > countdown or (
+                    lowest_encounters is not None
+                    and candidate_encounters_lower_bound(candidate, bounty_index, countdown)
+                    >= lowest_encounters
+                ):
+                    n_pruned += 1
+                    continue
+
+                chunk.append(candidate.path)
+                if len(chunk) >= chunk_size:
+                    break
+            else:
+                exhausted = True
+
+            if not chunk:
+                break
+            if executor is None:
+                results = [
+                    compute_path_encounters(
+                        path, universe_graph, empire_dict, millenium_dict, bounty_index, stats
                     )
+                    for path in chunk
+                ]
+            else:
+                slices = [chunk[i : i + PATHS_PER_WORKER] for i in range(0, len(chunk), PATHS_PER_WORKER)]
+                results = []
+                for (slice_results,) in _merge_worker_stats(
+                    executor.map(
+                        _evaluate_paths,
+                        itertools.repeat(context_id, len(slices)),
+                        itertools.repeat(context, len(slices)),
+                        slices,
+                    ),
+                    stats,
+                ):
+                    results.extend(slice_results)
+            n_evaluated += len(chunk)
+
+            # the first best path of the chunk is kept, as in the order of the enumeration
+            best = best_by_odds([encounters for encounters, _ in results])
+            if best is not None:
+                encounters, itinerary = results[best]
+                if lowest_encounters is None or encounters < lowest_encounters:
+                    lowest_encounters = encounters
+                    best_itinerary = itinerary
+                    best_path = chunk[best]
+
+            # no encounter with bounty hunters, no other path can do better
+            if lowest_encounters == 0:
+                exhausted = True
+    except BrokenProcessPool:
+        # a worker died, the next call starts a new pool
+        shutdown_path_pool()
+        raise
+    finally:
+        if workers > 1:
+            _path_pool_lock.release()
+
+    if stats is not None:
+        stats.count("paths_evaluated", n_evaluated)
+        stats.count("paths_pruned", n_pruned)
+    logger.info(
+        " {} paths evaluated, {} paths pruned.".format(n_evaluated, n_pruned)
+    )
+    if lowest_encounters is None:
+        return 0, None, None
+    return encounters_to_odds(lowest_encounters, capture_probability), best_path, best_itinerary
+
+
+def forced_encounters(
+    bounty_index: dict, millenium_dict: dict, countdown: int, earliest_arrival: int
+) -> int:
+    """
+    Lower bound on the encounters of any itinerary: bounty hunters on the departure on day 0, and bounty
+    hunters on the arrival on every day between the earliest possible arrival and the countdown.
+    """
+    encounters = bounty_index.get(millenium_dict["departure"], 0) & 1
+    if earliest_arrival <= countdown and count_days(
+        bounty_index.get(millenium_dict["arrival"], 0), earliest_arrival, countdown
+    ) == countdown - earliest_arrival + 1:
+        encounters += 1
+    return encounters
+
+
+def iter_paths_odds_anytime(
+    universe_graph: nx.Graph,
+    empire_dict: dict,
+    millenium_dict: dict,
+    bounty_index: dict = None,
+    distance_labels: tuple = None,
+    time_budget: float = None,
+    max_paths: int = None,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+):
+    """
+    Anytime variant of compute_paths_odds: evaluates the candidate paths in the same order and yields
+    the best result found so far each time it improves, until the search ends or the budget is spent.
+
+    Parameters:
+        - universe_graph (nx.Graph): NetworkX graph representing the possible routes in the universe.
+        - empire_dict (dict): dict object containing information about the Empire Communications.
+        - millenium_dict (dict): dict object containing information about the Millennium Falcon.
+        - bounty_index (dict[int] | None): the bounty hunters schedule compiled by build_bounty_index,
+                                           compiled from empire_dict if None.
+        - distance_labels (tuple[dict] | None): see compute_paths_odds, computed if None.
+        - time_budget (float | None): seconds after which the search stops, unlimited if None.
+                                      The budget is checked between two candidate paths.
+        - max_paths (int | None): number of candidate paths evaluated after which the search stops,
+                                  unlimited if None.
+        - stats (SolverStats | None): optional instrumentation, see compute_paths_odds.
+        - capture_probability (float): the probability of being captured at each encounter, see scoring.py.
+
+    Yields:
+        - odds (float | None): the best odds found so far, None (unknown) if the budget ran out before
+                               any itinerary was found.
+        - path (list[str] | None): the path achieving the odds, None if no path was found yet.
+        - itinerary (list[tuple] | None): the associated arrival and departure days.
+        - optimal (bool): whether no other simple path can beat the odds, only True for the last result.
+        - upper_bound (float): an upper bound on the odds of the paths not evaluated yet.
+    """
+    start = time.perf_counter()
+    autonomy = millenium_dict["autonomy"]
+    countdown = int(empire_dict["countdown"])
+    if bounty_index is None:
+        bounty_index = empire_bounty_index(empire_dict)
+    if distance_labels is None:
+        distance_labels = compute_distance_labels(universe_graph, millenium_dict)
+
+    planets = feasible_planets(*distance_labels, autonomy, countdown)
+    if millenium_dict["arrival"] not in planets:
+        yield 0, None, None, True, 0
+        return
+
+    # no path can avoid these encounters, reaching them proves optimality
+    floor = forced_encounters(
+        bounty_index,
+        millenium_dict,
+        countdown,
+        min_travel_days(distance_labels[0][millenium_dict["arrival"]], autonomy),
+    )
+    ceiling = encounters_to_odds(floor, capture_probability)
+    candidates = get_candidate_paths(
+        universe_graph, millenium_dict["departure"], millenium_dict["arrival"], autonomy, countdown, planets
+    ).iter_candidates(countdown)
 
-                    # while following the path check if fuel is never empty
-                    # (i.e. stop arrangement would make the path infeasible)
-                    fuel -= path_edge_weights[idx_planet - 1]
-                    if fuel < 0:
-                        break
-                    leaving_day = arrival_day + stops_per_planet[planet]
+    max_odds = 0
+    lowest_encounters = None
+    best_path = None
+    best_itinerary = None
+    n_evaluated = 0
+    n_pruned = 0
+    exhausted = True
+    for candidate in candidates:
+        if (max_paths is not None and n_evaluated >= max_paths) or (
+            time_budget is not None and time.perf_counter() - start > time_budget
+        ):
+            exhausted = False
+            break
 
-                    # if the falcon stop one day ore more, it always refuels
-                    if leaving_day - arrival_day > 0:
-                        fuel = autonomy
-                    itinerary_dates.append((arrival_day, leaving_day))
+        if candidate.total_length > countdown or (
+            lowest_encounters is not None
+            and candidate_encounters_lower_bound(candidate, bounty_index, countdown)
+            >= lowest_encounters
+        ):
+            n_pruned += 1
+            continue
 
-            nb_encounters = compute_encounters(path, itinerary_dates, bounty_dict)
+        encounters, itinerary = compute_path_encounters(
+            candidate.path, universe_graph, empire_dict, millenium_dict, bounty_index, stats
+        )
+        n_evaluated += 1
+        if encounters is not None and (lowest_encounters is None or encounters < lowest_encounters):
+            lowest_encounters, best_path, best_itinerary = encounters, candidate.path, itinerary
+            max_odds = encounters_to_odds(encounters, capture_probability)
+            if encounters <= floor:
+                break
+            yield max_odds, best_path, best_itinerary, False, ceiling
 
-            if nb_encounters < lowest_encounter:
-                lowest_encounter = nb_encounters
-                best_stops = itinerary_dates.copy()
+    if stats is not None:
+        stats.count("paths_evaluated", n_evaluated)
+        stats.count("paths_pruned", n_pruned)
+    if exhausted:
+        yield max_odds, best_path, best_itinerary, True, max_odds
     else:
-        # if all stops are forced, only one arrangement need to be checked
-        for idx_planet, planet in enumerate(path):
-            if idx_planet == 0:
-                itinerary_dates.append((0, 0))
-            else:
-                arrival_day = (
-                    itinerary_dates[-1][-1] + path_edge_weights[idx_planet - 1]
+        # the odds are unknown if no itinerary was found before the budget ran out
+        yield max_odds if best_path is not None else None, best_path, best_itinerary, False, ceiling
+
+
+class Mission(NamedTuple):
+    """
+    Everything needed to compute the odds that does not depend on the Empire Communications.
+    """
+
+    millenium_dict: dict
+    # the CSR representation of the routes when they are read from a snapshot, except for the "paths" solver
+    universe_graph: nx.Graph | UniverseCSR
+    solver: str
+    # shortest path between departure and arrival, None if there is none
+    shortest_path: list
+    # precomputed data of the "dp" and "bidir" solvers, None for the "paths" solver or if there is no path
+    problem: TimeExpandedProblem
+    # shortest travel times from the departure and to the arrival used by the "paths" solver,
+    # see compute_distance_labels, None for the other solvers or if there is no path
+    distance_labels: tuple
+
+
+def prepare_mission(
+    millenium_path: str,
+    millenium_dict: dict,
+    solver: str = "dp",
+    graph_cache_dir: str = None,
+    stats: SolverStats = None,
+) -> Mission:
+    """
+    Loads the routes graph and precomputes everything that is independent of the Empire Communications.
+
+    The precomputations are kept in a bounded LRU cache keyed on the graph identity, departure,
+    arrival, autonomy and solver, so the following calls on the same (cached) graph are immediate.
+
+    Parameters:
+        - millenium_path (str): path to the Millennium Falcon .json file, used to locate the routes .db file.
+        - millenium_dict (dict): dict object containing information about the Millennium Falcon.
+        - solver (str): the odds computation engine, see compute_odds.
+        - graph_cache_dir (str | None): optional folder where the routes graphs are pickled between runs.
+        - stats (SolverStats | None): optional instrumentation of the preparation, see profiling.py.
+
+    Returns:
+        - mission (Mission | None): the precomputed mission, None if the routes .db file is wrong.
+    """
+    if solver not in SOLVERS:
+        raise ValueError("Unknown solver {}, expected one of {}.".format(solver, SOLVERS))
+    stats = stats or NULL_STATS
+
+    # check weither route_db is absolute or relative path
+    db_path = resolve_db_path(millenium_path, millenium_dict)
+    with stats.stage("load_graph"):
+        if is_universe_snapshot(db_path):
+            universe_graph = load_universe_snapshot(db_path, millenium_dict["autonomy"])
+            if universe_graph is not None and solver == "paths":
+                universe_graph = snapshot_graph(universe_graph)
+        else:
+            universe_graph = build_unvierse_graph(db_path, millenium_dict, graph_cache_dir, stats)
+
+    if universe_graph is None:
+        return None
+
+    # the cached entry holds a reference to the graph, so its id cannot be reused by another graph,
+    # and the version changes when the graph is patched (see utils.load_universe_graph)
+    key = (
+        id(universe_graph),
+        universe_graph.graph.get("version", 0) if isinstance(universe_graph, nx.Graph) else 0,
+        millenium_dict["departure"],
+        millenium_dict["arrival"],
+        millenium_dict["autonomy"],
+        solver,
+    )
+    with _mission_cache_lock:
+        if key in _mission_cache:
+            _mission_cache.move_to_end(key)
+            stats.count("mission_cache_hits")
+            return _mission_cache[key]._replace(millenium_dict=millenium_dict)
+
+    problem = None
+    distance_labels = None
+    if isinstance(universe_graph, UniverseCSR):
+        # there is no NetworkX graph, the shortest path is found with the precomputed search data
+        with stats.stage("prepare_dp"):
+            problem = prepare_time_expanded(universe_graph, millenium_dict)
+        shortest_path = problem_shortest_path(problem) if problem is not None else None
+        if shortest_path is None:
+            problem = None
+    else:
+        # check if there is a shortest path in the graph between departure and arrival
+        try:
+            with stats.stage("shortest_path"):
+                shortest_path = nx.algorithms.shortest_path(
+                    universe_graph,
+                    source=millenium_dict["departure"],
+                    target=millenium_dict["arrival"],
+                    weight="weight",
                 )
-                leaving_day = arrival_day
-                if planet in forced_refuel:
-                    leaving_day += 1
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            shortest_path = None
 
-                itinerary_dates.append((arrival_day, leaving_day))
-        lowest_encounter = compute_encounters(path, itinerary_dates, bounty_dict)
-        best_stops = itinerary_dates.copy()
+        if solver in ("dp", "bidir") and shortest_path is not None:
+            with stats.stage("prepare_dp"):
+                problem = prepare_time_expanded(universe_graph, millenium_dict)
+        elif solver == "paths" and shortest_path is not None:
+            with stats.stage("distance_labels"):
+                distance_labels = compute_distance_labels(universe_graph, millenium_dict)
 
-    # odds computation based on the number of encounters with bounty hunters
-    odds = (1 - sum(9**i / (10 ** (i + 1)) for i in range(lowest_encounter))) * 100
-    return odds, best_stops
+    mission = Mission(
+        millenium_dict, universe_graph, solver, shortest_path, problem, distance_labels
+    )
+    with _mission_cache_lock:
+        _mission_cache[key] = mission
+        if len(_mission_cache) > MISSION_CACHE_SIZE:
+            _mission_cache.popitem(last=False)
+    return mission
 
 
-def compute_encounters(path: list, itinerary_dates: list, bounty_presence: dict) -> int:
+def clear_mission_cache():
     """
-    Compute the number of encounters with bounty hunters following a path and an itinerary
+    Empties the in-memory caches of prepare_mission and get_candidate_paths.
+    """
+    with _mission_cache_lock:
+        _mission_cache.clear()
+    with _candidate_paths_lock:
+        _candidate_paths_cache.clear()
+
+
+def load_mission(
+    millenium_path: str,
+    solver: str = "dp",
+    graph_cache_dir: str = None,
+    stats: SolverStats = None,
+) -> Mission:
+    """
+    Safely loads the Millennium Falcon .json file and prepares the mission, see prepare_mission.
+    """
+    stats = stats or NULL_STATS
+    with stats.stage("load_json"):
+        millenium_dict = safe_load_json(millenium_path, FALCON_SCHEMA)
+    if millenium_dict is None:
+        return None
+    return prepare_mission(millenium_path, millenium_dict, solver, graph_cache_dir, stats)
+
+
+def solve_mission(
+    mission: Mission,
+    empire_dict: dict,
+    workers: int = 1,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+    deadline: float = None,
+) -> (float, list):
+    """
+    Computes the odds of success of a prepared mission against one Empire Communication.
 
     Parameters:
-        - path (list): a list of the names of the nodes constituting the path from departure to arrival.
-        - itinerary (list[tuple]): the associated strategy to achieve the odds contains the arrival
-                                   and departure days for each planet in the path.
-        - bounty_presence (dict[set]): dict object containing the set of day when bounty hunters are present on each planet.
+        - mission (Mission): the mission prepared by prepare_mission or load_mission.
+        - empire_dict (dict): dict object containing information about the Empire Communications.
+        - workers (int): number of processes evaluating the candidate paths of the "paths" solver.
+        - stats (SolverStats | None): optional instrumentation of the computation, see profiling.py.
+        - capture_probability (float): the probability of being captured at each encounter, see scoring.py.
+        - deadline (float | None): time.time() timestamp after which the computation is abandoned.
 
     Returns:
-        - encounters (int): the number of encounters with bounty hunters.
+        - odds (float): the odds of success.
+        - itinerary (list[str] | None): The prettified strings for each step in the itinerary,
+                                      if an itinerary is possible, None otherwise.
+
+    Raises:
+        - SearchTimeout: if the deadline is passed before the odds are computed.
     """
-    itinerary_dates
-    falcon_presence = {}
-    day = 0
+    logger = logging.getLogger('R2D2')
+    millenium_dict = mission.millenium_dict
+    universe_graph = mission.universe_graph
+    stats = stats or NULL_STATS
 
-    # convert the itinerary and path in a presence dict just as bounty_presence format.
-    for planet, (arrival, departure) in zip(path, itinerary_dates):
-        falcon_presence[planet] = set(i for i in range(arrival, departure + 1))
-        day = departure + 1
+    if mission.shortest_path is None:
+        logger.info(
+            " No path found between {} and {}. Its odds of success are 0%.".format(
+                millenium_dict["departure"], millenium_dict["arrival"]
+            )
+        )
+        return 0, None
 
-    bounty_planets = set(bounty_presence)
-    falcon_planets = set(falcon_presence)
+    # the bounty hunters schedule is compiled once for all the candidate itineraries
+    with stats.stage("build_bounty_index"):
+        bounty_index = empire_bounty_index(empire_dict)
 
-    # the number of encounter is the size of the intersecting sets summed over the planets.
-    encounters = 0
-    for planet in bounty_planets.intersection(falcon_planets):
-        encounters += len(bounty_presence[planet].intersection(falcon_presence[planet]))
+    if mission.solver == "paths":
+        # check if the shortest path is too long
+        path_length, path_length_without_refuel, n_refuel = compute_path_length(
+            mission.shortest_path, universe_graph, millenium_dict["autonomy"]
+        )
 
-    return encounters
+        if path_length > int(empire_dict["countdown"]):
+            logger.info(
+                " Shortest path is too slow for the Falcon to reach {} before the Death Star annihilates the planet... Its odds of success are 0%.".format(
+                    millenium_dict["arrival"]
+                )
+            )
+            return 0, None
+
+        with stats.stage("solve_paths"):
+            max_odds, best_path, best_itinerary = compute_paths_odds(
+                universe_graph,
+                empire_dict,
+                millenium_dict,
+                bounty_index,
+                workers,
+                stats,
+                mission.distance_labels,
+                capture_probability,
+                deadline,
+            )
+    else:
+        with stats.stage("solve_" + mission.solver):
+            max_odds, best_path, best_itinerary = solve_time_expanded(
+                universe_graph,
+                millenium_dict,
+                empire_dict,
+                bounty_index,
+                mission.problem,
+                stats,
+                capture_probability,
+                bidirectional=mission.solver == "bidir",
+                deadline=deadline,
+            )
+        if best_path is None:
+            logger.info(
+                " The Falcon cannot reach {} before the Death Star annihilates the planet... Its odds of success are 0%.".format(
+                    millenium_dict["arrival"]
+                )
+            )
+            return 0, None
+
+    logger.info(
+        " The Falcon can reach {} before the Death Star annihilates the planet! Its odds of success are {}%.".format(
+            millenium_dict["arrival"], max_odds
+        )
+    )
+    with stats.stage("prettify_path"):
+        itinerary = prettify_path(best_path, best_itinerary)
+    return max_odds, itinerary
+
+
+class AnytimeResult(NamedTuple):
+    """
+    A result of the anytime search, see solve_mission_anytime.
+    """
+
+    # None (unknown) if the budget ran out before any itinerary was found
+    odds: float
+    # prettified itinerary, None if no itinerary was found (yet)
+    itinerary: list
+    # whether no other simple path can beat the odds
+    optimal: bool
+    # upper bound on the odds of the paths not evaluated yet
+    upper_bound: float
+
+
+def solve_mission_anytime(
+    mission: Mission,
+    empire_dict: dict,
+    time_budget: float = None,
+    max_paths: int = None,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+):
+    """
+    Computes the odds of a prepared mission within a time or work budget, by enumerating the candidate
+    paths by increasing travel time (see iter_paths_odds_anytime) whatever the solver of the mission.
+
+    Yields:
+        - result (AnytimeResult): the best result found so far, each time it improves. The last result
+                                  is the best one found within the budget.
+    """
+    logger = logging.getLogger('R2D2')
+    millenium_dict = mission.millenium_dict
+    if mission.shortest_path is None:
+        yield AnytimeResult(0, None, True, 0)
+        return
+
+    universe_graph = mission.universe_graph
+    if isinstance(universe_graph, UniverseCSR):
+        # the candidate paths are enumerated by NetworkX
+        universe_graph = snapshot_graph(universe_graph)
+
+    result = None
+    for odds, path, itinerary, optimal, upper_bound in iter_paths_odds_anytime(
+        universe_graph,
+        empire_dict,
+        millenium_dict,
+        distance_labels=mission.distance_labels,
+        time_budget=time_budget,
+        max_paths=max_paths,
+        stats=stats,
+        capture_probability=capture_probability,
+    ):
+        result = AnytimeResult(
+            odds,
+            prettify_path(path, itinerary) if path is not None else None,
+            optimal,
+            upper_bound,
+        )
+        yield result
+
+    if result.optimal:
+        logger.info(" Best odds found: {}%, optimal.".format(result.odds))
+    elif result.odds is None:
+        logger.warning(
+            " The budget ran out before any itinerary was found, the odds are unknown and at most {}%.".format(
+                result.upper_bound
+            )
+        )
+    else:
+        logger.warning(
+            " The budget ran out, the best odds found are {}% and the odds are at most {}%.".format(
+                result.odds, result.upper_bound
+            )
+        )
+
+
+def solve_mission_matrix(
+    mission: Mission,
+    empire_dict: dict,
+    departures: list = None,
+    arrivals: list = None,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+):
+    """
+    Computes the odds of success from many departures to many arrivals of the routes graph of a prepared
+    mission, with one search per departure (see solvers.solve_time_expanded_matrix).
+
+    Parameters:
+        - mission (Mission): the mission prepared by prepare_mission or load_mission, whatever its solver.
+        - empire_dict (dict): dict object containing information about the Empire Communications.
+        - departures (list[str] | None): the departure planets, the departure of the Falcon if None.
+        - arrivals (list[str] | None): the arrival planets, the arrival of the Falcon if None.
+        - stats (SolverStats | None): optional instrumentation of the computation, see profiling.py.
+        - capture_probability (float): the probability of being captured at each encounter, see scoring.py.
+
+    Yields:
+        - departure (str): the departure planet, rows are yielded in the order of departures as soon as
+                           they are computed.
+        - row (dict[str, tuple]): for each arrival, the odds of success and the prettified itinerary
+                                  (None if no itinerary is possible).
+    """
+    millenium_dict = mission.millenium_dict
+    departures = departures or [millenium_dict["departure"]]
+    arrivals = arrivals or [millenium_dict["arrival"]]
+    stats = stats or NULL_STATS
+
+    with stats.stage("build_bounty_index"):
+        bounty_index = empire_bounty_index(empire_dict)
+    rows = solve_time_expanded_matrix(
+        mission.universe_graph,
+        millenium_dict["autonomy"],
+        empire_dict,
+        departures,
+        arrivals,
+        bounty_index,
+        stats,
+        capture_probability,
+    )
+    while True:
+        with stats.stage("solve_matrix_row"):
+            departure, row = next(rows, (None, None))
+        if row is None:
+            return
+        with stats.stage("prettify_path"):
+            yield departure, {
+                arrival: (odds, prettify_path(path, itinerary) if path is not None else None)
+                for arrival, (odds, path, itinerary) in row.items()
+            }
+
+
+class SolverSession:
+    """
+    The search of a prepared mission against an Empire Communication, updated incrementally when bounty
+    hunters are added or removed or when the countdown changes.
+
+    After a change, only the days from the first one whose states change are searched again (see
+    solvers.TimeExpandedSearch), and a change on a planet and day the Falcon cannot reach is free.
+    The odds and itinerary are those of solve_mission on the updated Empire Communication.
+
+    Parameters:
+        - mission (Mission): a mission prepared for the "dp" solver by prepare_mission or load_mission.
+        - empire_dict (dict): dict object containing information about the Empire Communications.
+        - stats (SolverStats | None): optional instrumentation of the searches, see profiling.py.
+        - capture_probability (float): the probability of being captured at each encounter, see scoring.py.
+    """
+
+    def __init__(
+        self,
+        mission: Mission,
+        empire_dict: dict,
+        stats: SolverStats = None,
+        capture_probability: float = CAPTURE_PROBABILITY,
+    ):
+        if mission.solver != "dp":
+            raise ValueError("A solver session needs a mission prepared for the dp solver.")
+        self.mission = mission
+        self.countdown = int(empire_dict["countdown"])
+        # copied, the bitmasks are changed by the updates
+        self.bounty_index = dict(empire_bounty_index(empire_dict))
+        # (planet, day) of the bounty hunters after the countdown, indexed when the countdown is raised
+        self.late_hunters = set(empire_late_hunters(empire_dict))
+        self.capture_probability = capture_probability
+        self.stats = stats or NULL_STATS
+
+        self.search = None
+        problem = mission.problem
+        if problem is None:
+            return
+        self.search = TimeExpandedSearch(
+            problem.adjacency,
+            build_hunted(problem.index, len(problem.names), self.bounty_index),
+            problem.source,
+            problem.target,
+            mission.millenium_dict["autonomy"],
+            self.countdown,
+            feasible_remaining(problem, self.countdown),
+            record=True,
+        )
+        with self.stats.stage("solve_dp"):
+            self.search.search(0, self.stats)
+
+    def add_hunter(self, planet: str, day: int):
+        """
+        Adds bounty hunters on a planet on a day.
+        """
+        self._set_hunter(planet, day, True)
+
+    def remove_hunter(self, planet: str, day: int):
+        """
+        Removes the bounty hunters of a planet on a day, duplicates included.
+        """
+        self._set_hunter(planet, day, False)
+
+    def _set_hunter(self, planet: str, day: int, present: bool):
+        # the Falcon leaves on day 0, earlier days can be ignored
+        if day < 0:
+            return
+        if day > self.countdown:
+            if present:
+                self.late_hunters.add((planet, day))
+            else:
+                self.late_hunters.discard((planet, day))
+            return
+        bitmask = self.bounty_index.get(planet, 0)
+        bitmask = bitmask | (1 << day) if present else bitmask & ~(1 << day)
+        if bitmask:
+            self.bounty_index[planet] = bitmask
+        else:
+            self.bounty_index.pop(planet, None)
+
+        if self.search is not None and planet in self.mission.problem.index:
+            with self.stats.stage("update_dp"):
+                self.search.set_hunted(self.mission.problem.index[planet], day, present, self.stats)
+
+    def set_countdown(self, countdown: int):
+        """
+        Changes the countdown of the Empire Communication.
+        """
+        countdown = int(countdown)
+        if countdown == self.countdown:
+            return
+        # the bitmasks only hold the days up to the countdown
+        if countdown > self.countdown:
+            for planet, day in [hunter for hunter in self.late_hunters if hunter[1] <= countdown]:
+                self.late_hunters.remove((planet, day))
+                self.bounty_index[planet] = self.bounty_index.get(planet, 0) | (1 << day)
+        else:
+            kept = (1 << (countdown + 1)) - 1
+            for planet, bitmask in list(self.bounty_index.items()):
+                self.late_hunters.update((planet, day) for day in bitmask_to_days(bitmask & ~kept))
+                if bitmask & kept:
+                    self.bounty_index[planet] = bitmask & kept
+                else:
+                    del self.bounty_index[planet]
+        if self.search is not None:
+            problem = self.mission.problem
+            self.search.hunted[:] = build_hunted(problem.index, len(problem.names), self.bounty_index)
+            with self.stats.stage("update_dp"):
+                day = first_changed_day(
+                    problem, self.mission.millenium_dict["autonomy"], self.countdown, countdown
+                )
+                self.search.countdown = countdown
+                self.search.remaining = feasible_remaining(problem, countdown)
+                self.search.resume(day, self.stats)
+        self.countdown = countdown
+
+    def empire_dict(self) -> dict:
+        """
+        Returns the current Empire Communication, in the form of load_empire_index.
+        """
+        return IndexedEmpire(self.countdown, dict(self.bounty_index), frozenset(self.late_hunters))
+
+    def solve(self) -> (float, list):
+        """
+        Returns:
+            - odds (float): the odds of success against the current Empire Communication.
+            - itinerary (list[str] | None): The prettified strings for each step in the itinerary,
+                                          if an itinerary is possible, None otherwise.
+        """
+        if self.search is None:
+            return 0, None
+        odds, path, itinerary = time_expanded_result(
+            self.mission.problem.names, *self.search.result(), self.capture_probability
+        )
+        if path is None:
+            return 0, None
+        with self.stats.stage("prettify_path"):
+            return odds, prettify_path(path, itinerary)
 
 
 def compute_odds(
-    millenium_path: str, empire_path: str, verbose: bool = False
+    millenium_path: str,
+    empire_path: str,
+    verbose: bool = False,
+    solver: str = None,
+    graph_cache_dir: str = None,
+    workers: int = 1,
+    result_cache: ResultCache = None,
+    stats: SolverStats = None,
+    time_budget: float = None,
+    max_paths: int = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
 ) -> (float, list):
     """
     Computes the odds of success given paths to the Millennium Falcon and Empire Com files.
@@ -199,89 +1286,353 @@ def compute_odds(
         - millenium_path (str): path to the Millennium Falcon .json file
         - empire_path (str): path to the Empire Communication .json file
         - verbose (bool): switch for verbosity
+        - solver (str | None): "dp" for the dynamic programming over (planet, day, fuel) states, "bidir" for its
+                               meet-in-the-middle variant keeping fewer states in memory on long countdowns,
+                               "paths" for the enumeration of all simple paths (slower, kept for cross-checking).
+                               "dp" if None, or "paths" if a budget is set, the only solver supporting one.
+        - graph_cache_dir (str | None): optional folder where the routes graphs are pickled between runs.
+        - workers (int): number of processes evaluating the candidate paths of the "paths" solver.
+        - result_cache (ResultCache | None): if set, the results of previous computations on the same
+                                             Falcon, routes .db file and Empire Communication are reused.
+        - stats (SolverStats | None): if set, filled with the wall time of each stage of the computation
+                                      and counters of the work done, see profiling.py.
+        - time_budget (float | None): if set, seconds after which the best odds found so far are returned,
+                                      see compute_odds_anytime.
+        - max_paths (int | None): if set, number of candidate paths after which the best odds found so far
+                                  are returned, see compute_odds_anytime.
+        - capture_probability (float): the probability of being captured by the bounty hunters at each
+                                       encounter, see scoring.py.
 
     Returns:
-        - odds (float | None): the odds of success, None if input paths or files are wrong.
+        - odds (float | None): the odds of success, None if input paths or files are wrong, or if the budget
+                               ran out before any itinerary was found (see compute_odds_anytime for the
+                               bound on the odds of such runs).
         - itinerary (list[str] | None): The prettified strings for each step in the itinerary,
                                       if an itinerary is possible, None otherwise.
 
+    Raises:
+        - ValueError: if a budget is set along with another solver than "paths".
     """
-    # print(logger.level)
+    if time_budget is not None or max_paths is not None:
+        if solver not in (None, "paths"):
+            raise ValueError(
+                "The time and paths budgets only apply to the 'paths' solver, not '{}'.".format(solver)
+            )
+        for result in compute_odds_anytime(
+            millenium_path,
+            empire_path,
+            time_budget,
+            max_paths,
+            verbose,
+            graph_cache_dir,
+            result_cache,
+            stats,
+            capture_probability,
+        ):
+            pass
+        return result.odds, result.itinerary
+
+    solver = solver or "dp"
     logger = logging.getLogger('R2D2')
     logger.setLevel(logging.INFO if verbose else logging.CRITICAL)
 
-    millenium_dict, empire_dict = get_json_contents(millenium_path, empire_path)
+    stats = stats or NULL_STATS
+
+    with stats.stage("load_json"):
+        millenium_dict, empire_dict = get_json_contents(millenium_path, empire_path)
     if millenium_dict is None or empire_dict is None:
         logger.warning(" Abort Mission !")
         return None, None
 
-    # check weither route_db is absolute or relative path
-    if os.path.isfile(millenium_dict["routes_db"]):
-        db_path = millenium_dict["routes_db"]
-    else:
-        db_directory = os.path.dirname(millenium_path)
-        db_path = os.path.join(db_directory, millenium_dict["routes_db"])
-    universe_graph = build_unvierse_graph(db_path, millenium_dict)
+    key = get_result_cache_key(
+        result_cache, millenium_path, millenium_dict, empire_dict, solver, capture_probability
+    )
+    if key is not None:
+        result = result_cache.get(key)
+        if result is not None:
+            stats.count("result_cache_hits")
+            logger.info(" Odds found in the result cache: {}%.".format(result[0]))
+            return result
 
-    if universe_graph is None:
+    mission = prepare_mission(millenium_path, millenium_dict, solver, graph_cache_dir, stats)
+    if mission is None:
         return None, None
 
-    # check if there is a shortest path in the graph between departure and arrival
-    try:
-        shortest_path = nx.algorithms.shortest_path(
-            universe_graph,
-            source=millenium_dict["departure"],
-            target=millenium_dict["arrival"],
-            weight="weight",
-        )
+    odds, itinerary = solve_mission(mission, empire_dict, workers, stats, capture_probability)
+    if key is not None:
+        result_cache.put(key, odds, itinerary)
+    return odds, itinerary
 
-    except nx.NetworkXNoPath:
-        logger.info(
-            " No path found between {} and {}. Its odds of success are 0%.".format(
-                millenium_dict["departure"], millenium_dict["arrival"]
-            )
-        )
-        return 0, None
 
-    # check if the shortest path is too long
-    path_length, path_length_without_refuel, n_refuel = compute_path_length(
-        shortest_path, universe_graph, millenium_dict["autonomy"]
+def compute_odds_anytime(
+    millenium_path: str,
+    empire_path: str,
+    time_budget: float = None,
+    max_paths: int = None,
+    verbose: bool = False,
+    graph_cache_dir: str = None,
+    result_cache: ResultCache = None,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+):
+    """
+    Computes the odds of success given paths to the Millennium Falcon and Empire Com files,
+    yielding improving results until the search ends or the budget is spent.
+
+    Parameters:
+        - millenium_path (str): path to the Millennium Falcon .json file
+        - empire_path (str): path to the Empire Communication .json file
+        - time_budget (float | None): seconds after which the search stops, unlimited if None.
+        - max_paths (int | None): number of candidate paths evaluated after which the search stops,
+                                  unlimited if None.
+        - verbose (bool): switch for verbosity
+        - graph_cache_dir (str | None): optional folder where the routes graphs are pickled between runs.
+        - result_cache (ResultCache | None): if set, the optimal results of previous computations are reused,
+                                             and the optimal result of this one is stored, see compute_odds.
+        - stats (SolverStats | None): optional instrumentation, see profiling.py.
+        - capture_probability (float): the probability of being captured at each encounter, see scoring.py.
+
+    Yields:
+        - result (AnytimeResult): the best odds and itinerary found so far, whether they are optimal
+                                  and an upper bound on the odds of the paths not evaluated yet.
+                                  A single result with None odds and upper bound is yielded if input
+                                  paths or files are wrong.
+    """
+    logger = logging.getLogger('R2D2')
+    logger.setLevel(logging.INFO if verbose else logging.CRITICAL)
+
+    stats = stats or NULL_STATS
+
+    with stats.stage("load_json"):
+        millenium_dict, empire_dict = get_json_contents(millenium_path, empire_path)
+    if millenium_dict is None or empire_dict is None:
+        logger.warning(" Abort Mission !")
+        yield AnytimeResult(None, None, False, None)
+        return
+
+    key = get_result_cache_key(
+        result_cache, millenium_path, millenium_dict, empire_dict, "paths", capture_probability
     )
+    if key is not None:
+        result = result_cache.get(key)
+        if result is not None:
+            stats.count("result_cache_hits")
+            logger.info(" Odds found in the result cache: {}%.".format(result[0]))
+            yield AnytimeResult(result[0], result[1], True, result[0])
+            return
 
-    if path_length > int(empire_dict["countdown"]):
-        logger.info(
-            " Shortest path is too slow for the Falcon to reach {} before the Death Star annihilates the planet... Its odds of success are 0%.".format(
-                millenium_dict["arrival"]
-            )
-        )
-        return 0, None
+    mission = prepare_mission(millenium_path, millenium_dict, "paths", graph_cache_dir, stats)
+    if mission is None:
+        yield AnytimeResult(None, None, False, None)
+        return
 
-    # The mission is possible now we must look at all possible path from departure to arrival
-    # and compute their odds.
-    max_odds = 0
-    best_itinerary = None
-    best_path = None
-    for path in nx.shortest_simple_paths(
-        universe_graph,
-        millenium_dict["departure"],
-        millenium_dict["arrival"],
-        weight="weight",
+    for result in solve_mission_anytime(
+        mission, empire_dict, time_budget, max_paths, stats, capture_probability
     ):
-        odds, itinerary = compute_path_odds(
-            path, universe_graph, empire_dict, millenium_dict
-        )
-        if odds > max_odds:
-            max_odds = odds
-            best_itinerary = itinerary
-            best_path = path
-        max_odds = max(odds, max_odds)
+        yield result
+    # results cut short by the budget are not cached
+    if key is not None and result.optimal:
+        result_cache.put(key, result.odds, result.itinerary)
 
-    logger.info(
-        " The Falcon can reach {} before the Death Star annihilates the planet! Its odds of success are {}%.".format(
-            millenium_dict["arrival"], max_odds
-        )
+
+def get_result_cache_key(
+    result_cache: ResultCache,
+    millenium_path: str,
+    millenium_dict: dict,
+    empire_dict: dict,
+    solver: str,
+    capture_probability: float,
+) -> str:
+    """
+    Computes the result cache key of a computation, see result_cache_key.
+
+    Returns:
+        - key (str | None): the key, None if there is no result cache, the routes .db file is missing or
+                            the capture probability is exact (the cache only stores float odds).
+    """
+    if result_cache is None or isinstance(capture_probability, Fraction):
+        return None
+    fingerprint = db_fingerprint(resolve_db_path(millenium_path, millenium_dict))
+    if fingerprint is None:
+        return None
+    return result_cache_key(millenium_dict, fingerprint, empire_dict, solver, capture_probability)
+
+
+def compute_odds_matrix(
+    millenium_path: str,
+    empire_path: str,
+    departures: list = None,
+    arrivals: list = None,
+    verbose: bool = False,
+    graph_cache_dir: str = None,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+):
+    """
+    Computes the odds of success from many departures to many arrivals against the same Empire Communication,
+    the routes graph being the one of the Millennium Falcon .json file.
+
+    Parameters:
+        - millenium_path (str): path to the Millennium Falcon .json file
+        - empire_path (str): path to the Empire Communication .json file
+        - departures (list[str] | None): the departure planets, the departure of the Falcon if None.
+        - arrivals (list[str] | None): the arrival planets, the arrival of the Falcon if None.
+        - verbose (bool): switch for verbosity
+        - graph_cache_dir (str | None): optional folder where the routes graphs are pickled between runs.
+        - stats (SolverStats | None): optional instrumentation, see profiling.py.
+        - capture_probability (float): the probability of being captured at each encounter, see scoring.py.
+
+    Yields:
+        - departure (str): the departure planet, rows are yielded as soon as they are computed.
+        - row (dict[str, tuple]): for each arrival, the odds of success and the prettified itinerary,
+                                  see solve_mission_matrix. The odds are None if input paths or files are wrong.
+    """
+    logger = logging.getLogger('R2D2')
+    logger.setLevel(logging.INFO if verbose else logging.CRITICAL)
+
+    millenium_dict, empire_dict = get_json_contents(millenium_path, empire_path)
+    mission = None
+    if millenium_dict is not None and empire_dict is not None:
+        mission = prepare_mission(millenium_path, millenium_dict, "dp", graph_cache_dir, stats)
+    if mission is None:
+        logger.warning(" Abort Mission !")
+        for departure in departures or [None]:
+            yield departure, {arrival: (None, None) for arrival in arrivals or []}
+        return
+
+    yield from solve_mission_matrix(
+        mission, empire_dict, departures, arrivals, stats, capture_probability
+    )
+
+
+def list_empire_files(empire_paths: list) -> list:
+    """
+    Expands the directories of a list of paths into the .json files they contain (sorted by name).
+    """
+    empire_files = []
+    for empire_path in empire_paths:
+        if os.path.isdir(empire_path):
+            empire_files.extend(
+                os.path.join(empire_path, filename)
+                for filename in sorted(os.listdir(empire_path))
+                if allowed_file(filename)
+            )
+        else:
+            empire_files.append(empire_path)
+    return empire_files
+
+
+def _init_batch_worker(
+    millenium_path: str,
+    solver: str,
+    graph_cache_dir: str,
+    verbose: bool,
+    profile: bool = False,
+    capture_probability: float = CAPTURE_PROBABILITY,
+):
+    """
+    Pool initializer of compute_odds_batch: each worker loads the mission once.
+    """
+    logging.getLogger('R2D2').setLevel(logging.INFO if verbose else logging.CRITICAL)
+    stats = SolverStats() if profile else None
+    _worker_state["mission"] = load_mission(millenium_path, solver, graph_cache_dir, stats)
+    # the loading is reported with the first file of the worker
+    _worker_state["batch_stats"] = stats
+    _worker_state["capture_probability"] = capture_probability
+
+
+def _solve_empire_file(empire_path: str) -> (str, float, list, dict):
+    """
+    Computes the odds of one Empire Communication file against the mission of the worker,
+    the stats of the task are sent back if profiling is enabled.
+    """
+    mission = _worker_state["mission"]
+    capture_probability = _worker_state["capture_probability"]
+    stats = _worker_state["batch_stats"]
+    if stats is None:
+        return _solve_empire_path(mission, empire_path, None, capture_probability) + (None,)
+    _worker_state["batch_stats"] = SolverStats()
+    return _solve_empire_path(mission, empire_path, stats, capture_probability) + (stats.to_dict(),)
+
+
+def _solve_empire_path(
+    mission: Mission,
+    empire_path: str,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+) -> (str, float, list):
+    """
+    Computes the odds of one Empire Communication file against a prepared mission.
+    """
+    with (stats or NULL_STATS).stage("load_json"):
+        empire_dict = load_empire_dict(empire_path)
+    if mission is None or empire_dict is None:
+        logging.getLogger('R2D2').warning(" Abort Mission !")
+        return empire_path, None, None
+    odds, itinerary = solve_mission(
+        mission, empire_dict, stats=stats, capture_probability=capture_probability
     )
-    return max_odds, prettify_path(best_path, best_itinerary)
+    return empire_path, odds, itinerary
+
+
+def compute_odds_batch(
+    millenium_path: str,
+    empire_paths: list,
+    verbose: bool = False,
+    solver: str = "dp",
+    graph_cache_dir: str = None,
+    workers: int = 1,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+):
+    """
+    Computes the odds of success of many Empire Communications against the same Millennium Falcon.
+
+    The Falcon config and the routes graph are loaded once (once per worker process) and everything
+    that does not depend on the Empire Communications is precomputed before the files are processed.
+
+    Parameters:
+        - millenium_path (str): path to the Millennium Falcon .json file
+        - empire_paths (list[str]): paths to Empire Communication .json files or to directories containing them.
+        - verbose (bool): switch for verbosity
+        - solver (str): the odds computation engine, see compute_odds.
+        - graph_cache_dir (str | None): optional folder where the routes graphs are pickled between runs.
+        - workers (int): number of processes the Empire Communications are dispatched to,
+                         the results are yielded in the order of the files in any case.
+        - stats (SolverStats | None): if set, filled with the instrumentation of all the files
+                                      (and workers), see profiling.py.
+        - capture_probability (float): the probability of being captured at each encounter, see scoring.py.
+
+    Yields:
+        - empire_path (str): the path to the Empire Communication .json file.
+        - odds (float | None): the odds of success, None if the file is wrong.
+        - itinerary (list[str] | None): The prettified strings for each step in the itinerary,
+                                      if an itinerary is possible, None otherwise.
+    """
+    logger = logging.getLogger('R2D2')
+    logger.setLevel(logging.INFO if verbose else logging.CRITICAL)
+
+    empire_files = list_empire_files(empire_paths)
+
+    if workers > 1:
+        with ProcessPoolExecutor(
+            workers,
+            initializer=_init_batch_worker,
+            initargs=(
+                millenium_path,
+                solver,
+                graph_cache_dir,
+                verbose,
+                stats is not None and stats.enabled,
+                capture_probability,
+            ),
+        ) as executor:
+            yield from _merge_worker_stats(executor.map(_solve_empire_file, empire_files), stats)
+        return
+
+    mission = load_mission(millenium_path, solver, graph_cache_dir, stats)
+    for empire_path in empire_files:
+        yield _solve_empire_path(mission, empire_path, stats, capture_probability)
 
 
 def parse_command_line():
@@ -297,19 +1648,202 @@ def parse_command_line():
         help="Path to the Millenium Falcon config file",
     )
     parser.add_argument(
-        "empire_path", default="", type=str, help="Path to the Empire config file"
+        "empire_path",
+        nargs="+",
+        type=str,
+        help="Path to the Empire config file, several files or directories with --batch",
+    )
+    parser.add_argument(
+        "--batch",
+        help="Compute the odds of every Empire config file and print one JSON line per file",
+        action=argparse.BooleanOptionalAction,
     )
     parser.add_argument(
         "--verbose", help="Display logs", action=argparse.BooleanOptionalAction
     )
+    parser.add_argument(
+        "--solver",
+        default=None,
+        choices=SOLVERS,
+        help="Odds computation engine, 'dp' by default, 'bidir' meets in the middle to save memory, "
+        "'paths' enumerates all simple paths (slow, the only one supporting --time-budget and --max-paths)",
+    )
+    parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        help="Number of processes used for the Empire files of --batch, or the candidate paths of the 'paths' solver",
+    )
+    parser.add_argument(
+        "--graph-cache-dir",
+        default=None,
+        type=str,
+        help="Folder where the routes graph is cached to skip reading the DB file on the next runs",
+    )
+    parser.add_argument(
+        "--time-budget",
+        default=None,
+        type=float,
+        help="Seconds after which the best odds found so far are returned, with the 'paths' solver",
+    )
+    parser.add_argument(
+        "--max-paths",
+        default=None,
+        type=int,
+        help="Number of candidate paths evaluated after which the best odds found so far are returned",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Print the time spent in each stage of the computation and counters of the work done",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--departures",
+        nargs="+",
+        default=None,
+        type=str,
+        help="Compute the odds from each of these planets (and to each of --arrivals), one JSON line per departure",
+    )
+    parser.add_argument(
+        "--arrivals",
+        nargs="+",
+        default=None,
+        type=str,
+        help="Compute the odds to each of these planets (and from each of --departures)",
+    )
+    parser.add_argument(
+        "--capture-probability",
+        default=CAPTURE_PROBABILITY,
+        type=float,
+        help="Probability of being captured each time the Falcon meets bounty hunters",
+    )
+    parser.add_argument(
+        "--exact",
+        help="Compute the odds as exact fractions, e.g. 729/10 for 72.9",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--result-cache",
+        default=None,
+        type=str,
+        help="SQLite file where the computed odds are stored and reused for identical inputs",
+    )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if not 0 <= args.capture_probability <= 1:
+        parser.error("--capture-probability must be between 0 and 1")
+    if (args.departures or args.arrivals) and (args.batch or args.time_budget or args.max_paths):
+        parser.error("--departures and --arrivals cannot be combined with --batch, --time-budget or --max-paths")
+    if not args.batch and len(args.empire_path) > 1:
+        parser.error("several Empire config files can only be given with --batch")
+    budget = args.time_budget is not None or args.max_paths is not None
+    if budget and args.batch:
+        parser.error("--time-budget and --max-paths cannot be combined with --batch")
+    if budget and args.solver not in (None, "paths"):
+        parser.error("--time-budget and --max-paths only apply to the 'paths' solver")
+    args.solver = args.solver or ("paths" if budget else "dp")
+    if args.exact:
+        if args.result_cache:
+            parser.error("--exact cannot be combined with --result-cache, which only stores float odds")
+        args.capture_probability = exact_probability(args.capture_probability)
+    return args
 
 
 if __name__ == "__main__":
     args = parse_command_line()
+    stats = SolverStats() if args.profile else None
+    if args.departures or args.arrivals:
+        for departure, row in compute_odds_matrix(
+            args.millenium_path,
+            args.empire_path[0],
+            args.departures,
+            args.arrivals,
+            verbose=args.verbose,
+            graph_cache_dir=args.graph_cache_dir,
+            stats=stats,
+            capture_probability=args.capture_probability,
+        ):
+            print(
+                json.dumps(
+                    {
+                        "departure": departure,
+                        "arrivals": {
+                            arrival: {"odds": odds, "itinerary": itinerary}
+                            for arrival, (odds, itinerary) in row.items()
+                        },
+                    },
+                    # exact odds are written as a fraction string
+                    default=str,
+                ),
+                flush=True,
+            )
+        if stats is not None:
+            print(stats.report(), file=sys.stderr)
+        sys.exit()
+
+    if args.batch:
+        for empire_path, odds, itinerary in compute_odds_batch(
+            args.millenium_path,
+            args.empire_path,
+            verbose=args.verbose,
+            solver=args.solver,
+            graph_cache_dir=args.graph_cache_dir,
+            workers=args.workers,
+            stats=stats,
+            capture_probability=args.capture_probability,
+        ):
+            print(
+                json.dumps({"empire": empire_path, "odds": odds, "itinerary": itinerary}, default=str),
+                flush=True,
+            )
+        if stats is not None:
+            print(stats.report(), file=sys.stderr)
+        sys.exit()
+
+    result_cache = ResultCache(db_path=args.result_cache) if args.result_cache else None
+    if args.time_budget is not None or args.max_paths is not None:
+        for result in compute_odds_anytime(
+            args.millenium_path,
+            args.empire_path[0],
+            time_budget=args.time_budget,
+            max_paths=args.max_paths,
+            verbose=args.verbose,
+            graph_cache_dir=args.graph_cache_dir,
+            result_cache=result_cache,
+            stats=stats,
+            capture_probability=args.capture_probability,
+        ):
+            pass
+        if result.upper_bound is None:
+            pass
+        elif result.optimal:
+            print("The odds of success are {}.".format(format_odds(result.odds)))
+        elif result.odds is None:
+            print(
+                "The odds of success are unknown, the budget ran out before any itinerary was found: "
+                "they are at most {}.".format(format_odds(result.upper_bound))
+            )
+        else:
+            print(
+                "The odds of success are between {} and {}, the budget ran out before the itinerary "
+                "was proven optimal.".format(format_odds(result.odds), format_odds(result.upper_bound))
+            )
+        if stats is not None:
+            print(stats.report(), file=sys.stderr)
+        sys.exit()
+
     odds, itinerary = compute_odds(
-        args.millenium_path, args.empire_path, verbose=args.verbose
+        args.millenium_path,
+        args.empire_path[0],
+        verbose=args.verbose,
+        solver=args.solver,
+        graph_cache_dir=args.graph_cache_dir,
+        workers=args.workers,
+        result_cache=result_cache,
+        stats=stats,
+        capture_probability=args.capture_probability,
     )
     if odds is not None:
-        print("The odds of success are {:.1f}%.".format(odds))
+        print("The odds of success are {}.".format(format_odds(odds)))
+    if stats is not None:
+        print(stats.report(), file=sys.stderr)
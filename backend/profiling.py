@@ -0,0 +1,126 @@
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+
+class SolverStats:
+    """
+    Wall time spent in each stage of an odds computation and counters of the work done.
+
+    An instance is passed to the functions of the computation with their optional stats argument,
+    which record their stages and counters in it. Stages are timed each time they run, so an
+    instance can aggregate many computations (see merge).
+    """
+
+    # False for NULL_STATS, which records nothing
+    enabled = True
+
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Context manager timing a stage of the computation.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings[name] += elapsed
+                self.calls[name] += 1
+
+    def count(self, name: str, n: int = 1):
+        """
+        Increments a counter.
+        """
+        with self._lock:
+            self.counters[name] += n
+
+    def merge(self, other):
+        """
+        Adds the timings and counters of other, a SolverStats or the result of its to_dict.
+        """
+        if isinstance(other, SolverStats):
+            other = other.to_dict()
+        with self._lock:
+            for name, seconds in other["timings"].items():
+                self.timings[name] += seconds
+            for name, n in other["calls"].items():
+                self.calls[name] += n
+            for name, n in other["counters"].items():
+                self.counters[name] += n
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            - stats (dict): the "timings" (in seconds) and number of "calls" of each stage and the "counters".
+        """
+        with self._lock:
+            return {
+                "timings": dict(self.timings),
+                "calls": dict(self.calls),
+                "counters": dict(self.counters),
+            }
+
+    def report(self) -> str:
+        """
+        Returns a human readable table of the stages and counters.
+        """
+        stats = self.to_dict()
+        lines = ["{:<24} {:>10} {:>8}".format("stage", "seconds", "calls")]
+        for name, seconds in stats["timings"].items():
+            lines.append("{:<24} {:>10.4f} {:>8}".format(name, seconds, stats["calls"][name]))
+        for name, n in stats["counters"].items():
+            lines.append("{:<24} {:>10}".format(name, n))
+        return "\n".join(lines)
+
+    def to_prometheus(self, prefix: str = "r2d2") -> str:
+        """
+        Returns the stages and counters in the Prometheus text exposition format.
+        """
+        stats = self.to_dict()
+        lines = [
+            "# HELP {}_stage_seconds_total Wall time spent in each stage of the odds computation.".format(prefix),
+            "# TYPE {}_stage_seconds_total counter".format(prefix),
+        ]
+        for name, seconds in stats["timings"].items():
+            lines.append('{}_stage_seconds_total{{stage="{}"}} {}'.format(prefix, name, seconds))
+        lines += [
+            "# HELP {}_stage_calls_total Number of runs of each stage of the odds computation.".format(prefix),
+            "# TYPE {}_stage_calls_total counter".format(prefix),
+        ]
+        for name, n in stats["calls"].items():
+            lines.append('{}_stage_calls_total{{stage="{}"}} {}'.format(prefix, name, n))
+        for name, n in stats["counters"].items():
+            lines += [
+                "# TYPE {}_{}_total counter".format(prefix, name),
+                "{}_{}_total {}".format(prefix, name, n),
+            ]
+        return "\n".join(lines) + "\n"
+
+
+class _NullStats(SolverStats):
+    """
+    SolverStats recording nothing, used when the instrumentation is not requested.
+    """
+
+    enabled = False
+
+    def stage(self, name: str):
+        return nullcontext()
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+    def merge(self, other):
+        pass
+
+
+NULL_STATS = _NullStats()
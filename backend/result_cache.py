@@ -0,0 +1,218 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from utils import logger, bitmask_to_days, IndexedEmpire, CAPTURE_PROBABILITY
+
+# default number of results kept in memory by a ResultCache
+RESULT_CACHE_SIZE = 256
+
+# default number of seconds a result is reused by a ResultCache
+RESULT_CACHE_TTL = 3600
+
+
+def normalize_empire_dict(empire_dict: dict) -> dict:
+    """
+    Returns an Empire Communication with its bounty hunters sorted and without duplicate (planet, day) entries
+    nor entries before day 0 or after the countdown, two Empire Communications with the same normalized form
+    have the same odds.
+    The bounty hunters may already be indexed, see utils.load_empire_index.
+    """
+    if isinstance(empire_dict, IndexedEmpire):
+        bounties = [
+            (planet, day)
+            for planet, days in sorted(empire_dict.bounty_index.items())
+            for day in bitmask_to_days(days)
+        ]
+    else:
+        bounties = sorted(
+            {
+                (bounty["planet"], bounty["day"])
+                for bounty in empire_dict["bounty_hunters"]
+                if 0 <= bounty["day"] <= empire_dict["countdown"]
+            }
+        )
+    return {
+        "countdown": empire_dict["countdown"],
+        "bounty_hunters": [{"planet": planet, "day": day} for planet, day in bounties],
+    }
+
+
+def result_cache_key(
+    millenium_dict: dict,
+    db_fingerprint: tuple,
+    empire_dict: dict,
+    solver: str = "dp",
+    capture_probability: float = CAPTURE_PROBABILITY,
+) -> str:
+    """
+    Canonical hash of everything the odds of a mission depend on.
+
+    Parameters:
+        - millenium_dict (dict): the Millennium Falcon config dict.
+        - db_fingerprint (tuple): the fingerprint of the routes .db file, see utils.db_fingerprint.
+        - empire_dict (dict): dict object containing information about the Empire Communications.
+        - solver (str): the odds computation engine, the itineraries of the solvers may differ.
+        - capture_probability (float): the probability of being captured at each encounter.
+
+    Returns:
+        - key (str): the hexadecimal SHA-256 of the canonical JSON of the inputs.
+    """
+    content = {
+        "falcon": {
+            "autonomy": millenium_dict["autonomy"],
+            "departure": millenium_dict["departure"],
+            "arrival": millenium_dict["arrival"],
+        },
+        "routes_db": list(db_fingerprint),
+        "empire": normalize_empire_dict(empire_dict),
+        "solver": solver,
+        "capture_probability": float(capture_probability),
+    }
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache of computed (odds, itinerary) results, see result_cache_key.
+
+    Results are kept in an in-memory LRU and, if db_path is set, in a SQLite file shared between
+    processes and runs. Results older than ttl seconds are computed again. The number of hits and
+    misses is counted, see stats.
+    """
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL, db_path: str = None):
+        """
+        Parameters:
+            - max_size (int): maximum number of results kept in memory.
+            - ttl (float | None): seconds during which a result is reused, forever if None.
+            - db_path (str | None): optional SQLite file where the results are also stored.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if db_path is not None:
+            try:
+                con = self._connect()
+                try:
+                    with con:
+                        con.execute(
+                            "CREATE TABLE IF NOT EXISTS RESULTS (key TEXT PRIMARY KEY, result TEXT, created REAL)"
+                        )
+                finally:
+                    con.close()
+            except sqlite3.Error as e:
+                logger.warning("Result cache {} is not usable. Reason: {}".format(db_path, e))
+                self.db_path = None
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created >= self.ttl
+
+    def _get_persistent(self, key: str, now: float) -> tuple:
+        try:
+            con = self._connect()
+            try:
+                row = con.execute(
+                    "SELECT result, created FROM RESULTS WHERE key = ?", (key,)
+                ).fetchone()
+            finally:
+                con.close()
+        except sqlite3.Error as e:
+            logger.warning("Failed to read the result cache {}. Reason: {}".format(self.db_path, e))
+            return None
+        if row is None or self._expired(row[1], now):
+            return None
+        odds, itinerary = json.loads(row[0])
+        return (odds, itinerary), row[1]
+
+    def get(self, key: str) -> tuple:
+        """
+        Returns:
+            - result (tuple | None): the cached (odds, itinerary), None if the key is missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1], now):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        entry = self._get_persistent(key, now) if self.db_path is not None else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, entry)
+        return entry[0]
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def put(self, key: str, odds: float, itinerary: list):
+        """
+        Stores the result of a computation.
+        """
+        now = time.time()
+        with self._lock:
+            self._store(key, ((odds, itinerary), now))
+        if self.db_path is None:
+            return
+        try:
+            con = self._connect()
+            try:
+                with con:
+                    con.execute(
+                        "INSERT OR REPLACE INTO RESULTS (key, result, created) VALUES (?, ?, ?)",
+                        (key, json.dumps([odds, itinerary]), now),
+                    )
+            finally:
+                con.close()
+        except sqlite3.Error as e:
+            logger.warning("Failed to save in the result cache {}. Reason: {}".format(self.db_path, e))
+
+    def clear(self):
+        """
+        Empties both tiers of the cache and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+        if self.db_path is not None:
+            try:
+                con = self._connect()
+                try:
+                    with con:
+                        con.execute("DELETE FROM RESULTS")
+                finally:
+                    con.close()
+            except sqlite3.Error as e:
+                logger.warning("Failed to clear the result cache {}. Reason: {}".format(self.db_path, e))
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            - stats (dict): the number of "hits" and "misses" and the number of results in memory ("size").
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -0,0 +1,462 @@
+import os
+import bisect
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple
+from urllib.request import pathname2url
+
+# number of rows fetched at once from the routes DB
+ROUTES_BATCH_SIZE = 10000
+
+
+class ConnectionPool:
+    """
+    Read-only connections to the routes .db files, kept open between the reads.
+
+    Connections are opened with the URI mode=ro, so a missing file is an error instead of an empty DB
+    being created. A connection is used by one thread at a time and given back to the pool after use,
+    at most max_idle connections per file are kept open. A connection is not reused when the file
+    was replaced (another inode), nor after a fork.
+
+    Parameters:
+        - max_idle (int): the number of idle connections kept open per file.
+        - immutable (bool): open the files with immutable=1, SQLite then skips all locking but does not see
+                            any change made to a file, only for files that are never updated.
+        - mmap_size (int): if positive, the number of bytes of a file SQLite reads through memory mapping.
+    """
+
+    def __init__(self, max_idle: int = 4, immutable: bool = False, mmap_size: int = 0):
+        self.max_idle = max_idle
+        self.immutable = immutable
+        self.mmap_size = mmap_size
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _file_id(self, db_path: str) -> tuple:
+        db_stat = os.stat(db_path)
+        return (db_stat.st_dev, db_stat.st_ino)
+
+    def connect(self, db_path: str) -> sqlite3.Connection:
+        """
+        Opens a new read-only connection to a .db file, not managed by the pool.
+
+        Raises:
+            - sqlite3.Error: if the file cannot be opened.
+        """
+        uri = "file:{}?mode=ro".format(pathname2url(os.path.abspath(db_path)))
+        if self.immutable:
+            uri += "&immutable=1"
+        con = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        if self.mmap_size > 0:
+            con.execute("PRAGMA mmap_size = {:d}".format(self.mmap_size))
+        return con
+
+    @contextmanager
+    def connection(self, db_path: str):
+        """
+        Context manager lending a connection of the pool to a .db file.
+
+        Raises:
+            - sqlite3.Error: if the file cannot be opened.
+        """
+        path = os.path.realpath(db_path)
+        try:
+            file_id = self._file_id(path)
+        except OSError as e:
+            raise sqlite3.OperationalError("unable to open database file {}: {}".format(db_path, e))
+
+        con = None
+        with self._lock:
+            if self._pid != os.getpid():
+                # the connections inherited from the parent process must not be used
+                self._idle = {}
+                self._pid = os.getpid()
+            idle = self._idle.get(path)
+            if idle is not None and idle[0] != file_id:
+                # the file was replaced, the connections read the previous one
+                for stale in self._idle.pop(path)[1]:
+                    stale.close()
+                idle = None
+            if idle:
+                con = idle[1].pop()
+        if con is None:
+            con = self.connect(path)
+
+        try:
+            yield con
+        except BaseException:
+            con.close()
+            raise
+        with self._lock:
+            idle = self._idle.setdefault(path, (file_id, []))
+            if idle[0] == file_id and len(idle[1]) < self.max_idle:
+                idle[1].append(con)
+                con = None
+        if con is not None:
+            con.close()
+
+    def close_all(self):
+        """
+        Closes the idle connections.
+        """
+        with self._lock:
+            for _, connections in self._idle.values():
+                for con in connections:
+                    con.close()
+            self._idle = {}
+
+
+# the pool used to read the routes, its options can be changed before the first read
+ROUTES_DB_POOL = ConnectionPool()
+
+
+def iter_route_rows(
+    con: sqlite3.Connection, autonomy: int, batch_size: int = ROUTES_BATCH_SIZE, after_rowid: int = None
+):
+    """
+    Streams the routes of a .db file that the Falcon can take, with their rowid, in the rowid order.
+
+    Routes longer than the autonomy are filtered by the SQL query.
+
+    Parameters:
+        - con (sqlite3.Connection): a connection to the .db file.
+        - autonomy (int): the autonomy of the Millennium Falcon.
+        - batch_size (int): the number of rows fetched from the DB at once.
+        - after_rowid (int | None): if set, only the rows with a higher rowid are read.
+
+    Yields:
+        - (rowid, origin, destination, travel_time) (tuple[int, str, str, int]): a route of the universe.
+
+    Raises:
+        - sqlite3.Error: if the DB file cannot be read.
+        - ValueError: if a route has no origin, no destination or a non positive travel time.
+    """
+    if after_rowid is None:
+        cur = con.execute(
+            "SELECT rowid, origin, destination, travel_time FROM ROUTES WHERE travel_time <= ? ORDER BY rowid",
+            (autonomy,),
+        )
+    else:
+        cur = con.execute(
+            "SELECT rowid, origin, destination, travel_time FROM ROUTES WHERE travel_time <= ? AND rowid > ? "
+            "ORDER BY rowid",
+            (autonomy, after_rowid),
+        )
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        for rowid, origin, destination, travel_time in rows:
+            if not origin or not destination or travel_time <= 0:
+                raise ValueError("Invalid route {} -> {}.".format(origin, destination))
+            yield rowid, origin, destination, int(travel_time)
+
+
+# the table where the triggers of install_routes_changelog record the rowids of the changed routes
+CHANGELOG_TABLE = "ROUTES_CHANGELOG"
+# maximum number of rowids bound to one query
+_ROWIDS_PER_QUERY = 500
+
+
+def install_routes_changelog(db_path: str):
+    """
+    Adds to a routes .db file a changelog table filled by triggers with the rowid of each route inserted,
+    updated or deleted, so that the graphs cached from the file are patched with the changed rows only.
+
+    Without a changelog, only the rows appended to the file are read when it is updated (see RoutesIndex).
+
+    Raises:
+        - sqlite3.Error: if the DB file cannot be written.
+    """
+    con = sqlite3.connect(db_path)
+    try:
+        with con:
+            con.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS {0} (id INTEGER PRIMARY KEY AUTOINCREMENT, route_rowid INTEGER NOT NULL);
+                CREATE TRIGGER IF NOT EXISTS {0}_insert AFTER INSERT ON ROUTES BEGIN
+                    INSERT INTO {0} (route_rowid) VALUES (NEW.rowid);
+                END;
+                CREATE TRIGGER IF NOT EXISTS {0}_update AFTER UPDATE ON ROUTES BEGIN
+                    INSERT INTO {0} (route_rowid) VALUES (OLD.rowid), (NEW.rowid);
+                END;
+                CREATE TRIGGER IF NOT EXISTS {0}_delete AFTER DELETE ON ROUTES BEGIN
+                    INSERT INTO {0} (route_rowid) VALUES (OLD.rowid);
+                END;
+                """.format(CHANGELOG_TABLE)
+            )
+    finally:
+        con.close()
+
+
+def _changelog_position(con: sqlite3.Connection) -> int:
+    """
+    The id of the last entry of the changelog of a .db file, None if it has no changelog.
+    """
+    if con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CHANGELOG_TABLE,)
+    ).fetchone() is None:
+        return None
+    return con.execute("SELECT COALESCE(MAX(id), 0) FROM {}".format(CHANGELOG_TABLE)).fetchone()[0]
+
+
+@contextmanager
+def _read_transaction(con: sqlite3.Connection):
+    """
+    Context manager reading a .db file in one transaction, so that all the queries see the same version.
+    """
+    con.execute("BEGIN")
+    try:
+        yield con
+    finally:
+        con.execute("ROLLBACK")
+
+
+class RoutesChanges(NamedTuple):
+    """
+    The rows of a routes .db file changed since a RoutesIndex was read or patched, see RoutesIndex.changes.
+    """
+
+    # (rowid, origin, destination, travel_time) of the rows added or updated
+    rows: list
+    # rowids of the rows removed
+    removed: list
+    # the row with the highest rowid and the last changelog entry read
+    last_row: tuple
+    last_change: int
+
+
+class RoutesIndex:
+    """
+    The rows of a routes .db file a graph was built from, so that the graph can be patched when rows are
+    added to, removed from or updated in the file instead of being built again.
+
+    The changed rows are found from the changelog of the file (see install_routes_changelog), only the
+    rows it lists are read. A file without a changelog is expected to only get new rows: the rows after
+    the highest rowid read are read, and the other rows are checked with SQL aggregates (number of rows,
+    sums of their rowids, travel times and name lengths) and the row of the highest rowid. When they differ,
+    the graph must be built again. Updates that keep them all are only seen through a changelog.
+
+    As for a graph read from scratch, the travel time of a route given by several rows is the one of
+    the row with the highest rowid, and planets without any route are not in the graph.
+    """
+
+    def __init__(self):
+        # rowid -> (origin, destination, travel_time)
+        self.rows = {}
+        # unordered pair of planets -> sorted rowids of its routes, only for the pairs patched so far
+        self.pair_rows = {}
+        # the (rowid, origin, destination, travel_time) row with the highest rowid, None if there is no row
+        self.last_row = None
+        # the last changelog entry read, None if the file has no changelog
+        self.last_change = None
+        # number of rows and sums of their rowids, travel times and name lengths, checked without changelog
+        self.checksum = (0, 0, 0, 0)
+
+    @staticmethod
+    def _pair(origin: str, destination: str) -> tuple:
+        return (origin, destination) if origin <= destination else (destination, origin)
+
+    @staticmethod
+    def _row_checksum(rowid: int, origin: str, destination: str, travel_time: int) -> tuple:
+        return (1, rowid, travel_time, len(origin) + len(destination))
+
+    @staticmethod
+    def _read_last_row(con: sqlite3.Connection) -> tuple:
+        return con.execute(
+            "SELECT rowid, origin, destination, travel_time FROM ROUTES ORDER BY rowid DESC LIMIT 1"
+        ).fetchone()
+
+    def _unchanged(self, con: sqlite3.Connection, autonomy: int) -> bool:
+        """
+        Whether the rows up to the highest rowid read look unchanged, see the class docstring.
+        """
+        if self.last_row is None:
+            return True
+        last_row = con.execute(
+            "SELECT rowid, origin, destination, travel_time FROM ROUTES WHERE rowid = ?", (self.last_row[0],)
+        ).fetchone()
+        checksum = con.execute(
+            "SELECT COUNT(*), COALESCE(SUM(rowid), 0), COALESCE(SUM(travel_time), 0), "
+            "COALESCE(SUM(length(origin) + length(destination)), 0) FROM ROUTES WHERE travel_time <= ? AND rowid <= ?",
+            (autonomy, self.last_row[0]),
+        ).fetchone()
+        return last_row == self.last_row and tuple(checksum) == self.checksum
+
+    def _update_checksum(self, row: tuple, sign: int):
+        self.checksum = tuple(
+            total + sign * value for total, value in zip(self.checksum, self._row_checksum(*row))
+        )
+
+    def read(self, graph, con: sqlite3.Connection, autonomy: int):
+        """
+        Reads all the routes of a .db file into the index and the graph.
+
+        Raises:
+            - sqlite3.Error: if the DB file cannot be read.
+            - ValueError: if a route is invalid.
+        """
+        rows = self.rows
+        add_edge = graph.add_edge
+        n_rows = total_rowid = total_time = total_length = 0
+        with _read_transaction(con):
+            self.last_change = _changelog_position(con)
+            for rowid, origin, destination, travel_time in iter_route_rows(con, autonomy):
+                rows[rowid] = (origin, destination, travel_time)
+                add_edge(origin, destination, weight=travel_time)
+                n_rows += 1
+                total_rowid += rowid
+                total_time += travel_time
+                total_length += len(origin) + len(destination)
+            self.last_row = self._read_last_row(con)
+        self.pair_rows = {}
+        self.checksum = (n_rows, total_rowid, total_time, total_length)
+
+    def _read_rowids(self, con: sqlite3.Connection, autonomy: int, rowids: list) -> list:
+        rows = []
+        for start in range(0, len(rowids), _ROWIDS_PER_QUERY):
+            chunk = rowids[start : start + _ROWIDS_PER_QUERY]
+            for rowid, origin, destination, travel_time in con.execute(
+                "SELECT rowid, origin, destination, travel_time FROM ROUTES "
+                "WHERE travel_time <= ? AND rowid IN ({})".format(", ".join("?" * len(chunk))),
+                [autonomy] + chunk,
+            ):
+                if not origin or not destination or travel_time <= 0:
+                    raise ValueError("Invalid route {} -> {}.".format(origin, destination))
+                rows.append((rowid, origin, destination, int(travel_time)))
+        return rows
+
+    def changes(self, con: sqlite3.Connection, autonomy: int) -> RoutesChanges:
+        """
+        Reads the rows of the .db file changed since the last read, without changing the index.
+
+        Returns:
+            - changes (RoutesChanges | None): the changed rows, to patch the graph with apply. None if the
+                                              changes cannot be found, the graph must then be built again.
+
+        Raises:
+            - sqlite3.Error: if the DB file cannot be read.
+            - ValueError: if a changed route is invalid.
+        """
+        with _read_transaction(con):
+            last_change = _changelog_position(con)
+            last_row = self._read_last_row(con)
+            if self.last_change is not None and last_change is not None:
+                first_change = con.execute(
+                    "SELECT MIN(id) FROM {} WHERE id > ?".format(CHANGELOG_TABLE), (self.last_change,)
+                ).fetchone()[0]
+                if first_change is not None and first_change > self.last_change + 1:
+                    # entries were purged from the changelog
+                    return None
+                rowids = [
+                    rowid
+                    for rowid, in con.execute(
+                        "SELECT DISTINCT route_rowid FROM {} WHERE id > ?".format(CHANGELOG_TABLE),
+                        (self.last_change,),
+                    )
+                ]
+                current = self._read_rowids(con, autonomy, rowids)
+                read = {row[0] for row in current}
+                removed = [rowid for rowid in rowids if rowid in self.rows and rowid not in read]
+            elif self.last_change is None and last_change is None:
+                if not self._unchanged(con, autonomy):
+                    # rows were updated or removed
+                    return None
+                after_rowid = None if self.last_row is None else self.last_row[0]
+                current = list(iter_route_rows(con, autonomy, after_rowid=after_rowid))
+                removed = []
+            else:
+                # the changelog was added or dropped
+                return None
+        rows = [row for row in current if self.rows.get(row[0]) != row[1:]]
+        return RoutesChanges(rows, removed, last_row, last_change)
+
+    def _add(self, graph, rowid: int, origin: str, destination: str, travel_time: int):
+        self.rows[rowid] = (origin, destination, travel_time)
+        rowids = self.pair_rows[self._pair(origin, destination)]
+        bisect.insort(rowids, rowid)
+        graph.add_edge(origin, destination, weight=self.rows[rowids[-1]][2])
+        self._update_checksum((rowid, origin, destination, travel_time), 1)
+
+    def _remove(self, graph, rowid: int):
+        origin, destination, travel_time = self.rows.pop(rowid)
+        self._update_checksum((rowid, origin, destination, travel_time), -1)
+        rowids = self.pair_rows[self._pair(origin, destination)]
+        rowids.remove(rowid)
+        if rowids:
+            graph.add_edge(origin, destination, weight=self.rows[rowids[-1]][2])
+            return
+        graph.remove_edge(origin, destination)
+        for planet in (origin, destination):
+            if planet in graph and graph.degree(planet) == 0:
+                graph.remove_node(planet)
+
+    def _index_pairs(self, pairs: set):
+        missing = pairs - self.pair_rows.keys()
+        if not missing:
+            return
+        for pair in missing:
+            self.pair_rows[pair] = []
+        # both orientations of the pairs, so that rows are matched without building their pair
+        targets = missing | {(destination, origin) for origin, destination in missing}
+        for rowid, route in self.rows.items():
+            if route[:2] in targets:
+                self.pair_rows[self._pair(*route[:2])].append(rowid)
+        for pair in missing:
+            self.pair_rows[pair].sort()
+
+    @staticmethod
+    def _copy_graph(graph, pairs: set):
+        """
+        A copy of the graph to patch the routes of pairs of planets on. Only the adjacency of the planets of
+        the pairs and the attributes of their routes are copied, the rest is shared with the graph.
+
+        graph.copy() copies every route, which takes seconds on large universes, so the dicts of the graph
+        are shared directly. This relies on the internals of the networkx version pinned in requirements.txt
+        (test_copy_graph compares the copy with graph.copy()), graph.copy() is used if they are not found.
+        """
+        if not (isinstance(getattr(graph, "_adj", None), dict) and isinstance(getattr(graph, "_node", None), dict)):
+            return graph.copy()
+        copy = graph.__class__()
+        copy.graph.update(graph.graph)
+        copy._node.update(graph._node)
+        copy._adj.update(graph._adj)
+        for planet in {planet for pair in pairs for planet in pair}:
+            if planet in copy._adj:
+                copy._adj[planet] = dict(copy._adj[planet])
+        for origin, destination in pairs:
+            if origin in copy._adj and destination in copy._adj[origin]:
+                attributes = dict(copy._adj[origin][destination])
+                copy._adj[origin][destination] = copy._adj[destination][origin] = attributes
+        return copy
+
+    def apply(self, graph, changes: RoutesChanges) -> tuple:
+        """
+        Patches the index with the changes read by changes, and a copy of the graph if any row changed.
+        The graph itself is left unchanged for its current users.
+
+        Returns:
+            - graph (nx.Graph): the patched copy of the graph, the graph itself if no row changed.
+            - n_changed (int): the number of rows added, removed or updated.
+        """
+        rows = self.rows
+        pairs = (
+            {self._pair(*rows[rowid][:2]) for rowid in changes.removed}
+            | {self._pair(*rows[row[0]][:2]) for row in changes.rows if row[0] in rows}
+            | {self._pair(*row[1:3]) for row in changes.rows}
+        )
+        self._index_pairs(pairs)
+        if pairs:
+            graph = self._copy_graph(graph, pairs)
+            graph.graph["version"] = graph.graph.get("version", 0) + 1
+        for rowid in changes.removed:
+            self._remove(graph, rowid)
+        for row in changes.rows:
+            if row[0] in rows:
+                self._remove(graph, row[0])
+            self._add(graph, *row)
+        self.last_row = changes.last_row
+        self.last_change = changes.last_change
+        return graph, len(changes.removed) + len(changes.rows)
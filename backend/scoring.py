@@ -0,0 +1,107 @@
+from fractions import Fraction
+
+import numpy as np
+
+# probability that the bounty hunters capture the Falcon at each encounter
+CAPTURE_PROBABILITY = 0.1
+
+# decimals the float odds are rounded to, which hides the error of the power
+ODDS_DECIMALS = 12
+
+
+def exact_probability(probability) -> Fraction:
+    """
+    Converts a probability into a Fraction, floats are read as their shortest decimal representation (0.1 is 1/10).
+
+    The odds computed with a Fraction capture probability are exact Fractions, see encounters_to_odds.
+    """
+    if isinstance(probability, float):
+        return Fraction(repr(probability))
+    return Fraction(probability)
+
+
+def encounters_to_odds(
+    nb_encounters: int, capture_probability: float = CAPTURE_PROBABILITY, exact: bool = False
+) -> float:
+    """
+    Convert a number of encounters with bounty hunters into odds of success (in %).
+
+    Each encounter is survived with probability 1 - capture_probability, so the odds are
+    100 x (1 - capture_probability) ^ nb_encounters.
+
+    Parameters:
+        - nb_encounters (int): the number of encounters with bounty hunters.
+        - capture_probability (float | Fraction | str): the probability of being captured at each encounter.
+        - exact (bool): compute the odds as an exact Fraction instead of a float, always the case when
+                        capture_probability is a Fraction.
+
+    Returns:
+        - odds (float | Fraction): the odds of success, rounded to ODDS_DECIMALS decimals when not exact.
+    """
+    if exact or isinstance(capture_probability, Fraction):
+        return 100 * (1 - exact_probability(capture_probability)) ** nb_encounters
+    # e.g. 100 x 0.9 ^ 3 = 72.90000000000001
+    return round(100 * (1 - float(capture_probability)) ** nb_encounters, ODDS_DECIMALS)
+
+
+def format_odds(odds) -> str:
+    """
+    Formats odds in %, exact odds as their fraction followed by their value with one decimal.
+    """
+    if isinstance(odds, Fraction):
+        return "{}% ({:.1f}%)".format(odds, float(odds))
+    return "{:.1f}%".format(odds)
+
+
+def _encounters_array(encounters) -> np.ndarray:
+    """
+    Converts numbers of encounters into a float array, None (an infeasible itinerary) being numpy.inf.
+    """
+    return np.fromiter(
+        (np.inf if n is None else n for n in encounters), dtype=np.float64, count=len(encounters)
+    )
+
+
+def odds_array(encounters, capture_probability: float = CAPTURE_PROBABILITY) -> np.ndarray:
+    """
+    Vectorized encounters_to_odds over numbers of encounters, rounded the same way.
+
+    Infeasible itineraries can be given as None or numpy.inf encounters, their odds are 0. With a Fraction
+    capture probability, the exact odds are computed one by one into an array of objects.
+    """
+    if isinstance(capture_probability, Fraction):
+        return np.array(
+            [0 if n is None or n == np.inf else encounters_to_odds(n, capture_probability) for n in encounters],
+            dtype=object,
+        )
+    counts = _encounters_array(encounters)
+    odds = np.round(100 * np.power(1 - float(capture_probability), counts), ODDS_DECIMALS)
+    # 1 ^ inf is 1 when the Falcon is never captured
+    odds[np.isinf(counts)] = 0
+    return odds
+
+
+def rank_by_odds(encounters) -> np.ndarray:
+    """
+    Ranks itineraries from the best odds to the worst given their numbers of encounters, None for an
+    infeasible itinerary. Ties keep their order, so the first itinerary is preferred.
+
+    Returns:
+        - order (np.ndarray): the indices of the itineraries, best first.
+    """
+    return np.argsort(_encounters_array(encounters), kind="stable")
+
+
+def best_by_odds(encounters) -> int:
+    """
+    The first itinerary of rank_by_odds, without sorting them all.
+
+    Returns:
+        - best (int | None): the index of the first itinerary with the fewest encounters,
+                             None if they are all infeasible.
+    """
+    counts = _encounters_array(encounters)
+    if not len(counts):
+        return None
+    best = int(np.argmin(counts))
+    return None if np.isinf(counts[best]) else best
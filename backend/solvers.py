@@ -0,0 +1,907 @@
+import heapq
+import math
+import time
+from typing import NamedTuple
+
+import networkx as nx
+
+from utils import encounters_to_odds, empire_bounty_index, CAPTURE_PROBABILITY
+from scoring import odds_array
+from universe_csr import UniverseCSR, CSRAdjacency
+from profiling import SolverStats
+
+
+def build_adjacency(universe_graph: nx.Graph | UniverseCSR) -> (list, dict, list):
+    """
+    Intern the planets of the routes graph into integer ids and build an adjacency list.
+
+    Parameters:
+        - universe_graph (nx.Graph | UniverseCSR): NetworkX graph or CSR representation of the possible
+                                                   routes in the universe.
+
+    With the CSR representation, the names and the arrays are not copied: the routes of a planet are read
+    from the arrays each time it is visited (see universe_csr.CSRAdjacency), and the names of a snapshot
+    when they are used.
+
+    Returns:
+        - names (list[str]): the name of each planet, indexed by planet id.
+        - index (dict[str, int]): the id of each planet, indexed by planet name.
+        - adjacency (list[list[tuple]] | CSRAdjacency): for each planet id, the (neighbor id, travel time)
+                                                       pairs, to be iterated once per lookup.
+    """
+    if isinstance(universe_graph, UniverseCSR):
+        names = universe_graph.names
+        index = universe_graph.index
+        if index is None:
+            index = {name: node for node, name in enumerate(names)}
+        return names, index, CSRAdjacency(universe_graph)
+
+    names = list(universe_graph.nodes)
+    index = {name: node for node, name in enumerate(names)}
+    adjacency = [
+        [
+            (index[neighbor], int(attributes["weight"]))
+            for neighbor, attributes in universe_graph[name].items()
+            # waiting on a planet is always better than a round trip on a self-loop
+            if neighbor != name
+        ]
+        for name in names
+    ]
+    return names, index, adjacency
+
+
+class SearchTimeout(Exception):
+    """
+    Raised by the searches given a deadline when it is passed, see check_deadline.
+    """
+
+
+def check_deadline(deadline: float):
+    """
+    Raises SearchTimeout if the deadline, a time.time() timestamp, is passed. None is no deadline.
+    """
+    if deadline is not None and time.time() > deadline:
+        raise SearchTimeout("The computation did not finish before its deadline.")
+
+
+def build_hunted(index: dict, n_planets: int, bounty_index: dict) -> list:
+    """
+    The bounty hunters bitmasks (see build_bounty_index) of each planet id, 0 for the planets without any.
+    """
+    hunted = [0] * n_planets
+    for planet, bitmask in bounty_index.items():
+        node = index.get(planet)
+        if node is not None:
+            hunted[node] = bitmask
+    return hunted
+
+
+def shortest_travel_times(adjacency: list, source: int | list) -> list:
+    """
+    Dijkstra algorithm over an adjacency list, refuels are not taken into account.
+
+    Returns:
+        - distances (list[int | float]): the shortest travel time from source (or from the closest of
+                                         a list of planet ids) to each planet id, math.inf for planets
+                                         that cannot be reached.
+    """
+    sources = [source] if isinstance(source, int) else source
+    distances = [math.inf] * len(adjacency)
+    for node in sources:
+        distances[node] = 0
+    queue = [(0, node) for node in sources]
+    while queue:
+        distance, node = heapq.heappop(queue)
+        if distance > distances[node]:
+            continue
+        for neighbor, weight in adjacency[node]:
+            if distance + weight < distances[neighbor]:
+                distances[neighbor] = distance + weight
+                heapq.heappush(queue, (distance + weight, neighbor))
+    return distances
+
+
+def min_travel_days(travel_time: int, autonomy: int) -> int:
+    """
+    Lower bound on the number of days needed for a travel time, counting the refuel days forced by the autonomy.
+    """
+    if travel_time == math.inf:
+        return math.inf
+    return travel_time + max(0, math.ceil(travel_time / autonomy) - 1)
+
+
+def feasible_planets(
+    from_departure: dict, to_arrival: dict, autonomy: int, countdown: int
+) -> set:
+    """
+    Fast-fail precheck: the planets that can be part of an itinerary reaching the arrival in time.
+
+    A planet is kept when its shortest travel time from the departure plus its shortest travel time
+    to the arrival, with the refuels forced by the autonomy, fits in the countdown. Planets that
+    cannot be reached at all are dropped too.
+
+    Parameters:
+        - from_departure (dict): the shortest travel time from the departure to each reachable planet.
+        - to_arrival (dict): the shortest travel time from each reachable planet to the arrival.
+        - autonomy (int): the autonomy of the Millennium Falcon.
+        - countdown (int): the last day the Falcon can reach the arrival.
+
+    Returns:
+        - planets (set): the planets that can be visited, empty if the arrival cannot be reached in time.
+    """
+    return {
+        planet
+        for planet, distance in from_departure.items()
+        if min_travel_days(distance + to_arrival.get(planet, math.inf), autonomy) <= countdown
+    }
+
+
+def _relax(layers: list, day: int, node: int, fuel: int, cost: int, parent: tuple):
+    """
+    Keep the (cost, parent) pair of a (planet, day, fuel) state if it improves the known one.
+    The layers are created up to the day, so they end with the last day a state is reached.
+    """
+    if day >= len(layers):
+        layers.extend({} for _ in range(day + 1 - len(layers)))
+    states = layers[day].setdefault(node, {})
+    if fuel not in states or cost < states[fuel][0]:
+        states[fuel] = (cost, parent)
+
+
+class TimeExpandedSearch:
+    """
+    Resumable state of search_time_expanded.
+
+    The layers of the processed days are kept, so when the bounty hunters of a day or the countdown
+    change, the search resumes from the first day whose states change instead of starting over
+    (see resume). Resuming needs the transitions emitted by the days before it, they are only
+    recorded when record is True.
+
+    Without target (None), the search is not pruned by the best itinerary and runs until the countdown,
+    the best itinerary to any planet can then be walked back, see best_state and result_to.
+    """
+
+    def __init__(
+        self,
+        adjacency: list,
+        hunted: list,
+        source: int,
+        target: int,
+        autonomy: int,
+        countdown: int,
+        remaining: list,
+        record: bool = False,
+        start: tuple = None,
+        goal: int = 0,
+        deadline: float = None,
+    ):
+        self.adjacency = adjacency
+        self.hunted = hunted
+        self.source = source
+        self.target = target
+        self.autonomy = autonomy
+        self.countdown = countdown
+        self.remaining = remaining
+        # (fuel, encounters) of the Falcon on the source on day 0, full and those of the day if None
+        self.start = start
+        # the search stops as soon as an itinerary with this many encounters reaches the target
+        self.goal = goal
+        # the search raises SearchTimeout when a day starts after this time.time() timestamp
+        self.deadline = deadline
+        # layers[day][planet][fuel] = (encounters, parent state)
+        self.layers = []
+        # best (encounters, day, fuel) state of the target after each processed day
+        self.best_at = []
+        # (arrival day, planet, fuel, encounters before the arrival, parent state) emitted by each processed day
+        self.transitions = [] if record else None
+        # whether the search stopped before the countdown on an itinerary reaching the goal
+        self.stopped = False
+
+    @property
+    def last_day(self) -> int:
+        """
+        The last processed day, -1 if the search did not start.
+        """
+        return len(self.best_at) - 1
+
+    def search(self, from_day: int = 0, stats: SolverStats = None, until: int = None) -> (int, list):
+        """
+        Runs the search from from_day, the days before it must have been processed already.
+        If until is set, the search stops before that day, the states of the following days reached
+        by then being left in their layers.
+
+        Returns:
+            - lowest_encounter (int | None): see search_time_expanded.
+            - chain (list[tuple] | None): see search_time_expanded.
+        """
+        adjacency, hunted, remaining = self.adjacency, self.hunted, self.remaining
+        autonomy, countdown, target = self.autonomy, self.countdown, self.target
+        self.stopped = False
+        if remaining[self.source] > countdown:
+            self.layers, self.best_at = [], []
+            if self.transitions is not None:
+                self.transitions = []
+            return None, None
+
+        # the layers of the following days are only created when a state reaches them, so a long
+        # countdown costs nothing past the last day the Falcon can be anywhere
+        layers = self.layers[:from_day]
+        self.layers = layers
+        del self.best_at[from_day:]
+        if from_day == 0:
+            fuel, cost = self.start or (autonomy, hunted[self.source] & 1)
+            _relax(layers, 0, self.source, fuel, cost, None)
+        else:
+            # the transitions of the previous days to the days not processed yet are replayed
+            # in their order, with the current schedule and countdown
+            for day in range(max(0, from_day - autonomy), from_day):
+                for arrival_day, node, fuel, cost, parent in self.transitions[day]:
+                    if arrival_day >= from_day and arrival_day + remaining[node] <= countdown:
+                        _relax(
+                            layers, arrival_day, node, fuel, cost + ((hunted[node] >> arrival_day) & 1), parent
+                        )
+        if self.transitions is not None:
+            del self.transitions[from_day:]
+        best = self.best_at[-1] if self.best_at else None
+        n_expanded = 0
+        n_encounters = 0
+
+        last_day = countdown if until is None else min(countdown, until - 1)
+        for day in range(from_day, last_day + 1):
+            if day >= len(layers):
+                # no state is reached on this day nor after
+                break
+            check_deadline(self.deadline)
+            layer = layers[day]
+            emitted = None
+            if self.transitions is not None:
+                emitted = []
+                self.transitions.append(emitted)
+
+            # states of a layer are final once all previous days have been expanded
+            if target in layer:
+                fuel, (cost, _) = min(layer[target].items(), key=lambda state: state[1][0])
+                if best is None or cost < best[0]:
+                    best = (cost, day, fuel)
+            self.best_at.append(best)
+            if best is not None and best[0] <= self.goal:
+                self.stopped = True
+                break
+
+            for node, states in layer.items():
+                if node == target:
+                    continue
+                lowest = math.inf
+                # a state is dominated by a state of the same planet and day with more fuel
+                # and fewer encounters
+                for fuel in sorted(states, reverse=True):
+                    cost = states[fuel][0]
+                    if cost >= lowest or (best is not None and cost >= best[0]):
+                        continue
+                    lowest = cost
+                    parent = (day, node, fuel)
+                    n_expanded += 1
+
+                    # wait one day on the planet, which refuels the Falcon
+                    if day + 1 + remaining[node] <= countdown:
+                        n_encounters += 1
+                        _relax(
+                            layers,
+                            day + 1,
+                            node,
+                            autonomy,
+                            cost + ((hunted[node] >> (day + 1)) & 1),
+                            parent,
+                        )
+                        if emitted is not None:
+                            emitted.append((day + 1, node, autonomy, cost, parent))
+
+                    for neighbor, weight in adjacency[node]:
+                        arrival_day = day + weight
+                        if weight > fuel or arrival_day + remaining[neighbor] > countdown:
+                            continue
+                        n_encounters += 1
+                        _relax(
+                            layers,
+                            arrival_day,
+                            neighbor,
+                            fuel - weight,
+                            cost + ((hunted[neighbor] >> arrival_day) & 1),
+                            parent,
+                        )
+                        if emitted is not None:
+                            emitted.append((arrival_day, neighbor, fuel - weight, cost, parent))
+
+        if stats is not None:
+            stats.count("states_expanded", n_expanded)
+            stats.count("encounters_computed", n_encounters)
+            stats.count("days_searched", len(self.best_at) - from_day)
+        return self.result()
+
+    def resume(self, day: int, stats: SolverStats = None) -> (int, list):
+        """
+        Updates the result after a change of the schedule or the countdown that can only change the
+        states of day and of the following days, hunted, countdown and remaining being updated in place.
+        The transitions must have been recorded.
+        """
+        if self.stopped and day > self.last_day:
+            # the days after the itinerary reaching the goal were never searched
+            return self.result()
+        return self.search(min(day, self.last_day + 1), stats)
+
+    def set_hunted(self, node: int, day: int, present: bool, stats: SolverStats = None) -> (int, list):
+        """
+        Adds or removes the bounty hunters of a planet on a day and updates the result.
+        """
+        if present:
+            self.hunted[node] |= 1 << day
+        else:
+            self.hunted[node] &= ~(1 << day)
+        # the presence of bounty hunters is only read when a state of the planet on that day is reached
+        if day <= self.last_day and node in self.layers[day]:
+            return self.resume(day, stats)
+        return self.result()
+
+    def result(self) -> (int, list):
+        """
+        Walks back the parent states of the best itinerary found by the last search.
+        """
+        return self.result_to(self.target, self.best_at[-1] if self.best_at else None)
+
+    def best_state(self, target: int) -> tuple:
+        """
+        The best (encounters, day, fuel) state of a planet in the processed days: the fewest encounters,
+        then the earliest day, as for the target of the search. None if the planet is never reached.
+        """
+        best = None
+        for day in range(self.last_day + 1):
+            states = self.layers[day].get(target)
+            if states:
+                fuel, (cost, _) = min(states.items(), key=lambda state: state[1][0])
+                if best is None or cost < best[0]:
+                    best = (cost, day, fuel)
+        return best
+
+    def result_to(self, target: int, best: tuple) -> (int, list):
+        """
+        Walks back the parent states from the best state of a planet, see best_state.
+        """
+        if best is None:
+            return None, None
+
+        lowest_encounter, day, fuel = best
+        chain = []
+        state = (day, target, fuel)
+        while state is not None:
+            chain.append(state[:2])
+            day, node, fuel = state
+            state = self.layers[day][node][fuel][1]
+        chain.reverse()
+        return lowest_encounter, chain
+
+
+def search_time_expanded(
+    adjacency: list,
+    hunted: list,
+    source: int,
+    target: int,
+    autonomy: int,
+    countdown: int,
+    remaining: list,
+    stats: SolverStats = None,
+    deadline: float = None,
+) -> (int, list):
+    """
+    Find the itinerary with the fewest bounty hunter encounters in the time-expanded routes graph.
+
+    States (planet, day, fuel) are processed day after day: from each state the Falcon either waits
+    one day on the planet (which refuels it) or travels to a neighbor it has enough fuel to reach.
+    The cost of a state is the lowest number of encounters needed to reach it. The search runs in
+    O((planets + routes) x countdown x autonomy) and stops as soon as an itinerary without any
+    encounter reaches the target.
+
+    Parameters:
+        - adjacency (list[list[tuple]] | CSRAdjacency): for each planet id, the (neighbor id, travel time)
+                                                       pairs, to be iterated once per lookup.
+        - hunted (list[int]): for each planet id, the bitmask of the days when bounty hunters are present.
+        - source (int): the id of the departure planet.
+        - target (int): the id of the arrival planet.
+        - autonomy (int): the autonomy of the Millennium Falcon.
+        - countdown (int): the last day the Falcon can reach the target.
+        - remaining (list[int | float]): for each planet id, a lower bound on the travel time to the target.
+        - stats (SolverStats | None): optional instrumentation, counts the "states_expanded" and the
+                                      "encounters_computed" for the transitions between states.
+        - deadline (float | None): time.time() timestamp after which the search raises SearchTimeout.
+
+    Returns:
+        - lowest_encounter (int | None): the lowest number of encounters, None if the target cannot be reached in time.
+        - chain (list[tuple] | None): the (day, planet id) states of the best itinerary, None if the target cannot be reached.
+    """
+    return TimeExpandedSearch(
+        adjacency, hunted, source, target, autonomy, countdown, remaining, deadline=deadline
+    ).search(0, stats)
+
+
+def _pareto_labels(labels: list) -> list:
+    """
+    Keep the (fuel, encounters) labels not dominated by a label needing less fuel with fewer encounters,
+    sorted by increasing fuel and decreasing encounters.
+    """
+    front = []
+    for fuel, cost in sorted(labels):
+        if not front or cost < front[-1][1]:
+            front.append((fuel, cost))
+    return front
+
+
+def cost_to_go(
+    adjacency: list,
+    hunted: list,
+    target: int,
+    autonomy: int,
+    countdown: int,
+    remaining: list,
+    earliest: list,
+    first_day: int,
+    stats: SolverStats = None,
+    bound: float = math.inf,
+    deadline: float = None,
+) -> dict:
+    """
+    Backward pass of search_bidirectional: the fewest encounters from a state to the target, computed day
+    after day from the countdown down to first_day, keeping only the labels of the next autonomy days.
+
+    The labels of a planet on a day are (fuel, encounters) pairs: from the planet on that day with at
+    least that fuel, the target can be reached in time with that many more encounters (those of the day
+    itself not included).
+
+    Parameters:
+        - earliest (list[int | float]): for each planet id, a lower bound on the first day the Falcon can be
+                                        on the planet, the planets are not labelled before.
+        - first_day (int): the first day labelled.
+        - bound (int | float): labels with at least this many encounters are dropped.
+        - deadline (float | None): time.time() timestamp after which the pass raises SearchTimeout.
+        - other parameters: see search_time_expanded.
+
+    Returns:
+        - window (dict[int, dict]): for the days first_day to first_day + autonomy, the labels of each planet,
+                                    sorted by increasing fuel and decreasing encounters.
+    """
+    horizon = max(autonomy, 1)
+    nodes = [node for node in range(len(adjacency)) if remaining[node] <= countdown]
+    window = {}
+    n_labelled = 0
+    for day in range(countdown, first_day - 1, -1):
+        check_deadline(deadline)
+        layer = {}
+        following = window.get(day + 1, {})
+        for node in nodes:
+            if earliest[node] > day or day + remaining[node] > countdown:
+                continue
+            if node == target:
+                layer[node] = [(0, 0)]
+                continue
+
+            labels = []
+            # wait one day, which refuels the Falcon whatever its fuel
+            if node in following:
+                labels.append((0, ((hunted[node] >> (day + 1)) & 1) + following[node][-1][1]))
+            for neighbor, weight in adjacency[node]:
+                if weight > autonomy:
+                    continue
+                arrival_labels = window.get(day + weight, {}).get(neighbor)
+                if arrival_labels is None:
+                    continue
+                encounter = (hunted[neighbor] >> (day + weight)) & 1
+                for fuel, cost in arrival_labels:
+                    if fuel + weight > autonomy:
+                        break
+                    labels.append((fuel + weight, cost + encounter))
+            labels = [(fuel, cost) for fuel, cost in labels if cost < bound]
+            if labels:
+                layer[node] = _pareto_labels(labels)
+                n_labelled += 1
+        window[day] = layer
+        # the labels are only read by the days at most autonomy days before
+        window.pop(day + horizon + 1, None)
+    if stats is not None:
+        stats.count("states_labelled", n_labelled)
+    return window
+
+
+def search_bidirectional(
+    adjacency: list,
+    hunted: list,
+    source: int,
+    target: int,
+    autonomy: int,
+    countdown: int,
+    remaining: list,
+    earliest: list,
+    stats: SolverStats = None,
+    meeting_day: int = None,
+    deadline: float = None,
+) -> (int, list):
+    """
+    Meet-in-the-middle variant of search_time_expanded, finding an itinerary with the same encounters while
+    keeping about half of the states in memory.
+
+    The forward search runs from the departure until the meeting day, and the backward pass (see cost_to_go)
+    computes the fewest encounters to the arrival from the states of the meeting day and the following
+    autonomy days. The two are joined on the states reached by the forward search on these days, which
+    include the travels crossing the meeting day. The itinerary after the best joining state is then found
+    by a forward search from that state alone, which stops as soon as it reaches the known encounters.
+
+    Parameters:
+        - earliest (list[int | float]): for each planet id, a lower bound on the first day the Falcon can be on it.
+        - meeting_day (int | None): the day the searches are joined, the middle of the countdown if None.
+        - other parameters: see search_time_expanded.
+
+    Returns:
+        - lowest_encounter (int | None): see search_time_expanded.
+        - chain (list[tuple] | None): see search_time_expanded.
+    """
+    if remaining[source] > countdown:
+        return None, None
+    if meeting_day is None:
+        meeting_day = (countdown + 1) // 2
+
+    forward = TimeExpandedSearch(
+        adjacency, hunted, source, target, autonomy, countdown, remaining, deadline=deadline
+    )
+    forward.search(0, stats, until=meeting_day)
+    if forward.stopped:
+        return forward.result()
+
+    # the best itinerary arriving before the meeting day wins the ties
+    best = forward.best_at[-1] if forward.best_at else None
+    lowest = best[0] if best is not None else math.inf
+    backward = cost_to_go(
+        adjacency, hunted, target, autonomy, countdown, remaining, earliest, meeting_day, stats, lowest, deadline
+    )
+    meeting = None
+    for day in range(meeting_day, min(meeting_day + autonomy, countdown, len(forward.layers) - 1) + 1):
+        for node, states in forward.layers[day].items():
+            labels = backward[day].get(node)
+            if labels is None:
+                continue
+            for fuel, (cost, _) in states.items():
+                to_go = min((to_go for needed, to_go in labels if needed <= fuel), default=math.inf)
+                if cost + to_go < lowest:
+                    lowest = cost + to_go
+                    meeting = (day, node, fuel)
+    del backward
+    if meeting is None:
+        return forward.result()
+
+    # the states before the meeting are walked back, then the rest of the itinerary is searched from it
+    day, node, fuel = meeting
+    cost = forward.layers[day][node][fuel][0]
+    _, chain = forward.result_to(node, (cost, day, fuel))
+    del forward
+    after = TimeExpandedSearch(
+        adjacency,
+        [bitmask >> day for bitmask in hunted],
+        node,
+        target,
+        autonomy,
+        countdown - day,
+        remaining,
+        start=(fuel, 0),
+        goal=lowest - cost,
+        deadline=deadline,
+    )
+    _, chain_after = after.search(0, stats)
+    return lowest, chain + [(day + later, planet) for later, planet in chain_after[1:]]
+
+
+def chain_to_itinerary(chain: list) -> (list, list):
+    """
+    Merge the consecutive days spent on the same planet of a chain of (day, planet id) states.
+
+    Returns:
+        - nodes (list[int]): the planet ids visited, in order.
+        - itinerary (list[tuple]): the arrival and departure days for each visited planet.
+    """
+    nodes, itinerary = [], []
+    for day, node in chain:
+        if nodes and nodes[-1] == node:
+            itinerary[-1] = (itinerary[-1][0], day)
+        else:
+            nodes.append(node)
+            itinerary.append((day, day))
+    return nodes, itinerary
+
+
+class TimeExpandedProblem(NamedTuple):
+    """
+    The part of the time-expanded search that does not depend on the Empire Communications.
+    """
+
+    names: list
+    index: dict
+    adjacency: list
+    source: int
+    target: int
+    # lower bound on the travel time from each planet to the arrival
+    remaining: list
+    # lower bound on the travel time from the departure to each planet
+    from_source: list
+    # lower bound on the number of days of an itinerary through each planet, see feasible_planets
+    through_days: list
+
+
+def prepare_time_expanded(
+    universe_graph: nx.Graph | UniverseCSR, millenium_dict: dict
+) -> TimeExpandedProblem:
+    """
+    Intern the planets and compute the travel times from the departure and to the arrival, once for any
+    number of Empire Communications.
+
+    Returns:
+        - problem (TimeExpandedProblem | None): the precomputed search data,
+                                                None if the departure or arrival planet has no route.
+    """
+    names, index, adjacency = build_adjacency(universe_graph)
+    if millenium_dict["departure"] not in index or millenium_dict["arrival"] not in index:
+        return None
+
+    # travel time to the arrival without refuel, a lower bound used to discard
+    # states from which the Falcon cannot make it before the end of the countdown
+    target = index[millenium_dict["arrival"]]
+    remaining = shortest_travel_times(adjacency, target)
+    source = index[millenium_dict["departure"]]
+    from_source = shortest_travel_times(adjacency, source)
+    through_days = [
+        min_travel_days(to_source + to_target, millenium_dict["autonomy"])
+        for to_source, to_target in zip(from_source, remaining)
+    ]
+
+    return TimeExpandedProblem(
+        names, index, adjacency, source, target, remaining, from_source, through_days
+    )
+
+
+def feasible_remaining(problem: TimeExpandedProblem, countdown: int) -> list:
+    """
+    The remaining travel times of a problem, infinite for the planets dropped by the feasibility precheck
+    (see feasible_planets) so the search never enters them.
+    """
+    return [
+        distance if days <= countdown else math.inf
+        for distance, days in zip(problem.remaining, problem.through_days)
+    ]
+
+
+def problem_shortest_path(problem: TimeExpandedProblem) -> list:
+    """
+    A shortest path from the departure to the arrival of a problem, refuels are not taken into account.
+
+    Returns:
+        - path (list[str] | None): the planets of the path, None if the arrival cannot be reached.
+    """
+    node = problem.source
+    if problem.remaining[node] == math.inf:
+        return None
+    path = [problem.names[node]]
+    while node != problem.target:
+        # travel times are positive, so each step gets strictly closer to the arrival
+        node = next(
+            neighbor
+            for neighbor, weight in problem.adjacency[node]
+            if weight + problem.remaining[neighbor] == problem.remaining[node]
+        )
+        path.append(problem.names[node])
+    return path
+
+
+def first_changed_day(
+    problem: TimeExpandedProblem, autonomy: int, countdown: int, new_countdown: int
+) -> int:
+    """
+    Lower bound on the first day whose states may differ when the countdown of a search changes.
+
+    A transition to a planet is kept when its arrival day plus the remaining travel time of the planet
+    fits in the countdown, and the planets dropped by the precheck are never entered. The transitions
+    kept under only one of the countdowns arrive after the lowest countdown minus the remaining travel
+    time of the planet, or, for the planets only dropped under the lowest countdown, after their travel
+    time from the departure. They leave at most autonomy days before.
+    """
+    low, high = sorted((countdown, new_countdown))
+    first_arrival = math.inf
+    for to_target, from_source, days in zip(problem.remaining, problem.from_source, problem.through_days):
+        if days <= low:
+            first_arrival = min(first_arrival, low + 1 - to_target)
+        elif days <= high:
+            first_arrival = min(first_arrival, from_source)
+    return max(0, first_arrival - autonomy)
+
+
+def time_expanded_result(
+    names: list,
+    lowest_encounter: int,
+    chain: list,
+    capture_probability: float = CAPTURE_PROBABILITY,
+) -> (float, list, list):
+    """
+    Converts the result of a search into odds, planet names and itinerary, see solve_time_expanded.
+    """
+    if chain is None:
+        return 0, None, None
+
+    nodes, itinerary = chain_to_itinerary(chain)
+    return (
+        encounters_to_odds(lowest_encounter, capture_probability),
+        [names[node] for node in nodes],
+        itinerary,
+    )
+
+
+def solve_time_expanded(
+    universe_graph: nx.Graph | UniverseCSR,
+    millenium_dict: dict,
+    empire_dict: dict,
+    bounty_index: dict = None,
+    problem: TimeExpandedProblem = None,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+    bidirectional: bool = False,
+    deadline: float = None,
+) -> (float, list, list):
+    """
+    Compute the optimal odds with a dynamic programming over (planet, day, fuel) states,
+    see search_time_expanded. Unlike the path enumeration, the itinerary may visit a planet twice.
+
+    Parameters:
+        - universe_graph (nx.Graph | UniverseCSR): NetworkX graph or CSR representation of the possible
+                                                   routes in the universe.
+        - millenium_dict (dict): dict object containing information about the Millennium Falcon.
+        - empire_dict (dict): dict object containing information about the Empire Communications.
+        - bounty_index (dict[int] | None): the bounty hunters schedule compiled by build_bounty_index,
+                                           compiled from empire_dict if None.
+        - problem (TimeExpandedProblem | None): the result of prepare_time_expanded for this graph and
+                                                Falcon, computed if None.
+        - stats (SolverStats | None): optional instrumentation of the search, see profiling.py.
+        - capture_probability (float): the probability of being captured at each encounter, see scoring.py.
+        - bidirectional (bool): use the meet-in-the-middle search_bidirectional, which keeps fewer states
+                                in memory on long countdowns.
+        - deadline (float | None): time.time() timestamp after which the search raises SearchTimeout.
+
+    Returns:
+        - odds (float): the best odds of success, 0 if the arrival cannot be reached in time.
+        - path (list[str] | None): the planets visited from departure to arrival, None if the odds are 0.
+        - itinerary (list[tuple] | None): the arrival and departure days for each planet in the path,
+                                          None if the odds are 0.
+    """
+    if problem is None:
+        problem = prepare_time_expanded(universe_graph, millenium_dict)
+        if problem is None:
+            return 0, None, None
+
+    if bounty_index is None:
+        bounty_index = empire_bounty_index(empire_dict)
+    hunted = build_hunted(problem.index, len(problem.names), bounty_index)
+    autonomy = millenium_dict["autonomy"]
+    countdown = empire_dict["countdown"]
+
+    # the search never enters the planets dropped by the feasibility precheck (see feasible_planets),
+    # and does not start at all if the arrival is dropped
+    remaining = feasible_remaining(problem, countdown)
+    if stats is not None:
+        stats.count("planets_pruned", sum(days > countdown for days in problem.through_days))
+
+    if bidirectional:
+        lowest_encounter, chain = search_bidirectional(
+            problem.adjacency,
+            hunted,
+            problem.source,
+            problem.target,
+            autonomy,
+            countdown,
+            remaining,
+            [min_travel_days(distance, autonomy) for distance in problem.from_source],
+            stats,
+            deadline=deadline,
+        )
+    else:
+        lowest_encounter, chain = search_time_expanded(
+            problem.adjacency,
+            hunted,
+            problem.source,
+            problem.target,
+            autonomy,
+            countdown,
+            remaining,
+            stats,
+            deadline,
+        )
+    return time_expanded_result(problem.names, lowest_encounter, chain, capture_probability)
+
+
+def solve_time_expanded_matrix(
+    universe_graph: nx.Graph | UniverseCSR,
+    autonomy: int,
+    empire_dict: dict,
+    departures: list,
+    arrivals: list,
+    bounty_index: dict = None,
+    stats: SolverStats = None,
+    capture_probability: float = CAPTURE_PROBABILITY,
+):
+    """
+    Compute the optimal odds from each departure to each arrival, with one search per departure.
+
+    The search of a departure has no target: it runs until the countdown and keeps the states of all the
+    planets, the arrivals included, from which the best itinerary to each arrival is walked back. States
+    are only pruned when no arrival can be reached from them in time. The odds are those of
+    solve_time_expanded for each pair, among itineraries with the same odds another one may be chosen.
+
+    Parameters:
+        - universe_graph (nx.Graph | UniverseCSR): NetworkX graph or CSR representation of the possible
+                                                   routes in the universe.
+        - autonomy (int): the autonomy of the Millennium Falcon.
+        - empire_dict (dict): dict object containing information about the Empire Communications.
+        - departures (list[str]): the departure planets, one row each.
+        - arrivals (list[str]): the arrival planets, one column each.
+        - bounty_index (dict[int] | None): the bounty hunters schedule compiled by build_bounty_index,
+                                           compiled from empire_dict if None.
+        - stats (SolverStats | None): optional instrumentation of the searches, see profiling.py.
+        - capture_probability (float): the probability of being captured at each encounter, see scoring.py.
+
+    Yields:
+        - departure (str): the departure planet of the row, in the order of departures.
+        - row (dict[str, tuple]): for each arrival, the odds, the planets visited and the itinerary,
+                                  see solve_time_expanded.
+    """
+    names, index, adjacency = build_adjacency(universe_graph)
+    if bounty_index is None:
+        bounty_index = empire_bounty_index(empire_dict)
+    hunted = build_hunted(index, len(names), bounty_index)
+    countdown = int(empire_dict["countdown"])
+
+    targets = [index[arrival] for arrival in arrivals if arrival in index]
+    # travel time to the closest arrival, the states from which no arrival can be reached are discarded
+    to_targets = shortest_travel_times(adjacency, targets)
+    no_path = (0, None, None)
+    for departure in departures:
+        if departure not in index or not targets:
+            yield departure, {arrival: no_path for arrival in arrivals}
+            continue
+
+        source = index[departure]
+        remaining = [
+            to_target if min_travel_days(from_source + to_target, autonomy) <= countdown else math.inf
+            for from_source, to_target in zip(shortest_travel_times(adjacency, source), to_targets)
+        ]
+        search = TimeExpandedSearch(
+            adjacency, hunted, source, None, autonomy, countdown, remaining
+        )
+        search.search(0, stats)
+
+        results = {
+            arrival: search.result_to(index[arrival], search.best_state(index[arrival]))
+            for arrival in arrivals
+            if arrival in index
+        }
+        # the odds of the whole row are computed at once
+        row_odds = dict(
+            zip(
+                results,
+                odds_array(
+                    [lowest_encounter if chain is not None else None for lowest_encounter, chain in results.values()],
+                    capture_probability,
+                ).tolist(),
+            )
+        )
+        row = {}
+        for arrival in arrivals:
+            if arrival not in results:
+                row[arrival] = no_path
+                continue
+            lowest_encounter, chain = results[arrival]
+            if chain is None:
+                row[arrival] = no_path
+                continue
+            nodes, itinerary = chain_to_itinerary(chain)
+            row[arrival] = (row_odds[arrival], [names[node] for node in nodes], itinerary)
+        yield departure, row
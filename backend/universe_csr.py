@@ -0,0 +1,442 @@
+import os
+import sys
+import sqlite3
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from typing import NamedTuple
+
+import numpy as np
+import networkx as nx
+
+from utils import iter_routes, logger, db_fingerprint, GRAPH_CACHE_SIZE
+
+# first bytes of a universe snapshot file, the last one is the version of the format
+SNAPSHOT_MAGIC = b"R2D2CSR\x02"
+# the magic followed by 7 little-endian int64: number of planets, number of CSR entries, size of the
+# names blob, autonomy the routes were filtered with (0 if none), longest travel time, 2 reserved.
+# The sections follow, each aligned on 8 bytes: offsets, offsets of the names in the blob, planet ids
+# sorted by name, neighbors, weights and the blob of the UTF-8 names
+SNAPSHOT_HEADER_SIZE = 64
+
+_snapshot_cache = OrderedDict()
+_snapshot_cache_lock = threading.Lock()
+# NetworkX graphs of the cached snapshots, see snapshot_graph
+_snapshot_graphs = OrderedDict()
+
+
+class UniverseCSR(NamedTuple):
+    """
+    Compressed sparse row representation of the routes graph, planets are interned to integer ids.
+
+    The neighbors of the planet of id i are neighbors[offsets[i]:offsets[i + 1]] and the travel
+    times of the corresponding routes are weights[offsets[i]:offsets[i + 1]]. Each route appears
+    once in each direction.
+    """
+
+    names: list
+    offsets: np.ndarray
+    neighbors: np.ndarray
+    weights: np.ndarray
+    # the id of each planet name, built by solvers.build_adjacency when None
+    index: dict = None
+
+
+class SnapshotNames(Sequence):
+    """
+    The planet names of a universe snapshot, decoded from the mapped names blob when they are read.
+    """
+
+    def __init__(self, blob: np.ndarray, name_offsets: np.ndarray):
+        self.blob = blob
+        self.name_offsets = name_offsets
+
+    def __len__(self) -> int:
+        return len(self.name_offsets) - 1
+
+    def encoded(self, node: int) -> bytes:
+        return self.blob[int(self.name_offsets[node]) : int(self.name_offsets[node + 1])].tobytes()
+
+    def __getitem__(self, node: int) -> str:
+        if not -len(self) <= node < len(self):
+            raise IndexError("planet id out of range")
+        return self.encoded(node % len(self)).decode("utf-8")
+
+
+class SnapshotIndex(Mapping):
+    """
+    The id of each planet name of a universe snapshot, found by a binary search on the ids sorted by name,
+    so that no dict of all the planets is built.
+    """
+
+    def __init__(self, names: SnapshotNames, name_order: np.ndarray):
+        self.names = names
+        self.name_order = name_order
+
+    def __len__(self) -> int:
+        return len(self.name_order)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __getitem__(self, name: str) -> int:
+        if not isinstance(name, str):
+            raise KeyError(name)
+        encoded = name.encode("utf-8")
+        low, high = 0, len(self.name_order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.names.encoded(int(self.name_order[middle])) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.name_order) and self.names.encoded(int(self.name_order[low])) == encoded:
+            return int(self.name_order[low])
+        raise KeyError(name)
+
+
+class CSRAdjacency(Sequence):
+    """
+    The adjacency list of the CSR representation, see solvers.build_adjacency: the (neighbor id, travel time)
+    pairs of a planet are read from slices of the arrays each time the planet is visited. Nothing is copied
+    nor kept, so the routes of a snapshot stay in the memory mapped pages shared by the processes.
+    """
+
+    def __init__(self, universe: UniverseCSR):
+        # memoryviews of the arrays, reading them gives Python ints without going through NumPy
+        self.offsets = memoryview(np.ascontiguousarray(universe.offsets, dtype=np.int64))
+        self.neighbors = memoryview(np.ascontiguousarray(universe.neighbors, dtype=np.int32))
+        self.weights = memoryview(np.ascontiguousarray(universe.weights, dtype=np.int32))
+        self._n_planets = len(self.offsets) - 1
+
+    def __len__(self) -> int:
+        return self._n_planets
+
+    def __getitem__(self, node: int):
+        """
+        Returns an iterator over the (neighbor id, travel time) pairs of the planet.
+        """
+        if not 0 <= node < self._n_planets:
+            raise IndexError("planet id out of range")
+        start, end = self.offsets[node], self.offsets[node + 1]
+        return zip(self.neighbors[start:end], self.weights[start:end])
+
+
+def routes_to_csr(routes) -> UniverseCSR:
+    """
+    Build the CSR representation of the universe from (origin, destination, travel_time) routes.
+
+    As in a nx.Graph, the last travel time read for a pair of planets is kept and self-loops,
+    which are never worth taking, are dropped.
+    """
+    names = []
+    index = {}
+    edges = {}
+    for origin, destination, travel_time in routes:
+        ids = []
+        for name in (origin, destination):
+            if name not in index:
+                index[name] = len(names)
+                names.append(name)
+            ids.append(index[name])
+        if ids[0] != ids[1]:
+            edges[(min(ids), max(ids))] = travel_time
+
+    pairs = np.array(list(edges), dtype=np.int32).reshape(-1, 2)
+    travel_times = np.fromiter(edges.values(), dtype=np.int32, count=len(edges))
+
+    # each route is stored in both directions, sorted by origin
+    sources = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    order = np.argsort(sources, kind="stable")
+    neighbors = np.concatenate([pairs[:, 1], pairs[:, 0]])[order]
+    weights = np.concatenate([travel_times, travel_times])[order]
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=len(names)), out=offsets[1:])
+
+    return UniverseCSR(names, offsets, neighbors, weights)
+
+
+def graph_to_csr(universe_graph: nx.Graph) -> UniverseCSR:
+    """
+    Convert a NetworkX routes graph to its CSR representation.
+    """
+    return routes_to_csr(
+        (origin, destination, int(weight))
+        for origin, destination, weight in universe_graph.edges(data="weight")
+    )
+
+
+def read_routes_csr(db_path: str, autonomy: int) -> UniverseCSR:
+    """
+    Reads the routes of a .db file directly into the CSR representation, without building a NetworkX graph.
+
+    Parameters:
+        - db_path (str): the path to the .db file.
+        - autonomy (int): the autonomy of the Millennium Falcon, longer routes are dropped.
+
+    Returns:
+        - universe (UniverseCSR | None): the CSR representation of the routes,
+                                         None if an issue is encountered during the handling of the .db file.
+    """
+    try:
+        return routes_to_csr(iter_routes(db_path, autonomy))
+    except (sqlite3.Error, ValueError, TypeError):
+        logger.warning(
+            "An issue occurred during the opening of the DB file, route graph was not created."
+        )
+        return None
+
+
+def graph_from_csr(universe: UniverseCSR) -> nx.Graph:
+    """
+    Convert the CSR representation of the universe to a NetworkX routes graph, for the code that needs one
+    (the "paths" solver, the rendering of the graph...).
+    """
+    G = nx.Graph()
+    G.add_nodes_from(universe.names)
+    offsets = universe.offsets.tolist()
+    neighbors = universe.neighbors.tolist()
+    weights = universe.weights.tolist()
+    for node, name in enumerate(universe.names):
+        for k in range(offsets[node], offsets[node + 1]):
+            if neighbors[k] > node:
+                G.add_edge(name, universe.names[neighbors[k]], weight=weights[k])
+    return G
+
+
+def snapshot_graph(universe: UniverseCSR) -> nx.Graph:
+    """
+    graph_from_csr of a snapshot, converted once per snapshot.
+
+    load_universe_snapshot returns the same UniverseCSR for the same file (path, modification time and
+    size) and autonomy, so its graph is cached along with it, and the caches keyed on the graph
+    (prepare_mission, get_candidate_paths, the process pool of the "paths" solver) are hit on the next calls.
+    """
+    key = id(universe)
+    with _snapshot_cache_lock:
+        # the entry holds a reference to the snapshot, so its id cannot be reused by another one
+        if key in _snapshot_graphs:
+            _snapshot_graphs.move_to_end(key)
+            return _snapshot_graphs[key][1]
+
+    graph = graph_from_csr(universe)
+    with _snapshot_cache_lock:
+        # another thread may have converted the same snapshot meanwhile, its graph is kept
+        graph = _snapshot_graphs.setdefault(key, (universe, graph))[1]
+        if len(_snapshot_graphs) > GRAPH_CACHE_SIZE:
+            _snapshot_graphs.popitem(last=False)
+    return graph
+
+
+def filter_csr(universe: UniverseCSR, autonomy: int) -> UniverseCSR:
+    """
+    Drops the routes of the CSR representation longer than the autonomy, the planets are kept.
+    """
+    keep = universe.weights <= autonomy
+    sources = np.repeat(np.arange(len(universe.names)), np.diff(universe.offsets))
+    offsets = np.zeros(len(universe.names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources[keep], minlength=len(universe.names)), out=offsets[1:])
+    return UniverseCSR(
+        universe.names, offsets, universe.neighbors[keep], universe.weights[keep], universe.index
+    )
+
+
+def _aligned(position: int) -> int:
+    return (position + 7) // 8 * 8
+
+
+def write_universe_snapshot(universe: UniverseCSR, snapshot_path: str, autonomy: int = None):
+    """
+    Writes the CSR representation of the universe in the binary snapshot format, see load_universe_snapshot.
+
+    The file is written to a temporary file first, so processes mapping the previous snapshot keep
+    reading it and no process ever reads a partial snapshot.
+
+    Parameters:
+        - universe (UniverseCSR): the CSR representation of the routes.
+        - snapshot_path (str): the path to the snapshot file.
+        - autonomy (int | None): the autonomy the routes were filtered with, None if they were not.
+    """
+    names = [name.encode("utf-8") for name in universe.names]
+    name_order = np.array(sorted(range(len(names)), key=names.__getitem__), dtype="<i4")
+    name_offsets = np.zeros(len(names) + 1, dtype="<i8")
+    np.cumsum([len(name) for name in names], out=name_offsets[1:])
+    header = np.array(
+        [
+            len(names),
+            len(universe.neighbors),
+            name_offsets[-1],
+            autonomy or 0,
+            universe.weights.max() if len(universe.weights) else 0,
+            0,
+            0,
+        ],
+        dtype="<i8",
+    )
+    sections = [
+        np.asarray(universe.offsets, dtype="<i8").tobytes(),
+        name_offsets.tobytes(),
+        name_order.tobytes(),
+        np.asarray(universe.neighbors, dtype="<i4").tobytes(),
+        np.asarray(universe.weights, dtype="<i4").tobytes(),
+        b"".join(names),
+    ]
+
+    folder = os.path.dirname(os.path.abspath(snapshot_path))
+    tmp_fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(tmp_fd, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + header.tobytes())
+            for section in sections:
+                f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+                f.write(section)
+        os.replace(tmp_path, snapshot_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def compile_universe_snapshot(db_path: str, snapshot_path: str, autonomy: int = None) -> UniverseCSR:
+    """
+    Compiles the routes of a .db file into a binary snapshot, see load_universe_snapshot.
+
+    Parameters:
+        - db_path (str): the path to the .db file.
+        - snapshot_path (str): the path to the snapshot file.
+        - autonomy (int | None): if set, routes longer than the autonomy are dropped and the snapshot
+                                 cannot be loaded for a higher autonomy.
+
+    Returns:
+        - universe (UniverseCSR | None): the CSR representation of the routes,
+                                         None if an issue is encountered during the handling of the .db file.
+    """
+    universe = read_routes_csr(db_path, autonomy if autonomy is not None else np.iinfo(np.int32).max)
+    if universe is not None:
+        write_universe_snapshot(universe, snapshot_path, autonomy)
+    return universe
+
+
+def is_universe_snapshot(path: str) -> bool:
+    """
+    Tells whether a routes file is a universe snapshot rather than a .db file.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    except OSError:
+        return False
+
+
+def _map_universe_snapshot(snapshot_path: str, autonomy: int = None) -> UniverseCSR:
+    with open(snapshot_path, "rb") as f:
+        header = f.read(SNAPSHOT_HEADER_SIZE)
+    if len(header) < SNAPSHOT_HEADER_SIZE or not header.startswith(SNAPSHOT_MAGIC):
+        raise ValueError("{} is not a universe snapshot.".format(snapshot_path))
+    n_planets, n_entries, names_size, compiled_autonomy, max_weight, _, _ = np.frombuffer(
+        header, dtype="<i8", offset=len(SNAPSHOT_MAGIC)
+    ).tolist()
+    if autonomy is not None and 0 < compiled_autonomy < autonomy:
+        raise ValueError(
+            "{} was compiled for an autonomy of {}, not {}.".format(
+                snapshot_path, compiled_autonomy, autonomy
+            )
+        )
+
+    data = np.memmap(snapshot_path, dtype=np.uint8, mode="r")
+    sections = []
+    position = SNAPSHOT_HEADER_SIZE
+    layout = [
+        ("<i8", n_planets + 1),
+        ("<i8", n_planets + 1),
+        ("<i4", n_planets),
+        ("<i4", n_entries),
+        ("<i4", n_entries),
+        ("u1", names_size),
+    ]
+    for dtype, count in layout:
+        position = _aligned(position)
+        size = count * np.dtype(dtype).itemsize
+        if position + size > len(data):
+            raise ValueError("{} is truncated.".format(snapshot_path))
+        sections.append(data[position : position + size].view(dtype))
+        position += size
+    offsets, name_offsets, name_order, neighbors, weights, blob = sections
+
+    names = SnapshotNames(blob, name_offsets)
+    universe = UniverseCSR(names, offsets, neighbors, weights, SnapshotIndex(names, name_order))
+    if autonomy is not None and max_weight > autonomy:
+        universe = filter_csr(universe, autonomy)
+    return universe
+
+
+def load_universe_snapshot(snapshot_path: str, autonomy: int = None) -> UniverseCSR:
+    """
+    Loads a universe snapshot compiled by compile_universe_snapshot.
+
+    The arrays of the snapshot are memory mapped read-only and all the processes of a host share the same
+    pages through the OS page cache. Nothing is read nor decoded when loading, except when some routes are
+    longer than the autonomy: the routes are then copied without them. The planet names are decoded when
+    they are read, see SnapshotNames and SnapshotIndex, and the routes of a planet when a search visits it,
+    see CSRAdjacency.
+    Snapshots are kept in a process-level LRU cache keyed by the resolved path, modification time and
+    size of the file and the autonomy, as for load_universe_graph.
+
+    Parameters:
+        - snapshot_path (str): the path to the snapshot file.
+        - autonomy (int | None): the autonomy of the Millennium Falcon, longer routes are dropped.
+
+    Returns:
+        - universe (UniverseCSR | None): the CSR representation of the routes,
+                                         None if the file is not a valid snapshot for this autonomy.
+    """
+    fingerprint = db_fingerprint(snapshot_path)
+    if fingerprint is None:
+        logger.warning("Snapshot file {} not found, route graph was not created.".format(snapshot_path))
+        return None
+    key = fingerprint + (autonomy,)
+    with _snapshot_cache_lock:
+        if key in _snapshot_cache:
+            _snapshot_cache.move_to_end(key)
+            return _snapshot_cache[key]
+
+    try:
+        universe = _map_universe_snapshot(snapshot_path, autonomy)
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        logger.warning("Failed to load the snapshot {}. Reason: {}".format(snapshot_path, e))
+        return None
+
+    with _snapshot_cache_lock:
+        _snapshot_cache[key] = universe
+        if len(_snapshot_cache) > GRAPH_CACHE_SIZE:
+            _snapshot_cache.popitem(last=False)
+    return universe
+
+
+def parse_command_line():
+    """
+    Handle the argument parsing for the snapshot compiler CLI.
+    """
+    parser = argparse.ArgumentParser("universe_csr", add_help=True)
+    parser.add_argument("db_path", type=str, help="Path to the routes .db file")
+    parser.add_argument("snapshot_path", type=str, help="Path to the universe snapshot to write")
+    parser.add_argument(
+        "--autonomy",
+        default=None,
+        type=int,
+        help="Drop the routes longer than this autonomy, the snapshot then cannot be used for a higher one",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_command_line()
+    universe = compile_universe_snapshot(args.db_path, args.snapshot_path, args.autonomy)
+    if universe is None:
+        sys.exit(1)
+    print(
+        "{} planets and {} routes written to {}.".format(
+            len(universe.names), len(universe.neighbors) // 2, args.snapshot_path
+        )
+    )
@@ -1,14 +1,18 @@
 import os
-import shutil
 import json
+import re
+import hashlib
 import logging
+import pickle
 import sqlite3
+import tempfile
+import threading
+from collections import defaultdict, OrderedDict
 import networkx as nx
-import matplotlib
-import matplotlib.pyplot as plt
-from matplotlib.lines import Line2D
 
-matplotlib.use('agg')
+from profiling import SolverStats, NULL_STATS
+from scoring import encounters_to_odds, CAPTURE_PROBABILITY
+from routes_db import ROUTES_DB_POOL, ROUTES_BATCH_SIZE, RoutesIndex, iter_route_rows
 
 logger = logging.Logger(name="R2D2", level=logging.INFO)
 
@@ -17,110 +21,382 @@ EMPIRE_SCHEMA = {"countdown": int, "bounty_hunters": [{"planet": str, "day": int
 FALCON_SCHEMA = {"autonomy": int, "departure": str, "arrival": str, "routes_db": str}
 
 ALLOWED_EXTENSIONS = ["json"]
-GRAPH_SAVE_PATH = "frontend/static/ressources/routes_graph.png"
 
+# maximum number of routes graphs kept in memory by load_universe_graph
+GRAPH_CACHE_SIZE = 8
+_graph_cache = OrderedDict()
+_graph_cache_lock = threading.Lock()
 
-def build_unvierse_graph(db_path: str, millenium_dict: dict) -> nx.Graph:
+# maximum number of routes graphs pickled in the cache_dir of load_universe_graph
+GRAPH_PICKLE_CACHE_SIZE = 16
+
+
+def iter_routes(db_path: str, autonomy: int, batch_size: int = ROUTES_BATCH_SIZE):
     """
-    Loads the routes file and construct the routes graph of the universe
+    Streams the routes of a .db file that the Falcon can take, by batches of rows.
+
+    Routes longer than the autonomy are filtered by the SQL query, the file is read through a
+    pooled read-only connection (see routes_db.ConnectionPool).
 
     Parameters:
         - db_path (str): the path to the .db file.
-        - millenium_dict (dict): the Millennium Falcon config dict.
+        - autonomy (int): the autonomy of the Millennium Falcon.
+        - batch_size (int): the number of rows fetched from the DB at once.
+
+    Yields:
+        - (origin, destination, travel_time) (tuple[str, str, int]): a route of the universe.
+
+    Raises:
+        - sqlite3.Error: if the DB file cannot be read.
+        - ValueError: if a route has no origin, no destination or a non positive travel time.
+    """
+    with ROUTES_DB_POOL.connection(db_path) as con:
+        for _, origin, destination, travel_time in iter_route_rows(con, autonomy, batch_size):
+            yield origin, destination, travel_time
+
+
+def read_routes_graph(db_path: str, autonomy: int, index: RoutesIndex = None) -> nx.Graph:
+    """
+    Reads the routes of a .db file into a graph, without any caching.
+
+    Parameters:
+        - db_path (str): the path to the .db file.
+        - autonomy (int): the autonomy of the Millennium Falcon, longer routes are dropped.
+        - index (RoutesIndex | None): if set, filled with the rows of the routes, to patch the graph later.
 
     Returns:
         - G (nx.Graph | None): the NetworkX graph containing all routes information,
                             None if an issue is encountered during the handling of the .db file.
     """
-    if os.path.isfile(GRAPH_SAVE_PATH):
-        os.remove(GRAPH_SAVE_PATH)
-    autonomy = millenium_dict["autonomy"]
-
+    G = nx.Graph()
     # safely open the DB file.
     try:
-        con = sqlite3.connect(db_path)
-        cur = con.cursor()
-
-        # no need to consider routes that cannot be taken by the falcon,
-        # i.e. with cost larger than its autonomy
-        # (could be done from the query as well)
-        db_answer = [row for row in cur.execute("SELECT * FROM ROUTES")]
-        assert all(
-            [
-                edge[0] is not None
-                and edge[1] is not None
-                and edge[0] != ""
-                and edge[1] != ""
-                and edge[2] > 0
-                for edge in db_answer
-            ]
+        if index is None:
+            for origin, destination, travel_time in iter_routes(db_path, autonomy):
+                G.add_edge(origin, destination, weight=travel_time)
+        else:
+            with ROUTES_DB_POOL.connection(db_path) as con:
+                index.read(G, con, autonomy)
+    except (sqlite3.Error, ValueError, TypeError):
+        logger.warning(
+            "An issue occurred during the opening of the DB file, route graph was not created."
         )
-        edge_list = [
-            "{} {} {{'weight':{}}}".format(edge[0], edge[1], int(edge[2]))
-            for edge in db_answer
-            if int(edge[2]) <= autonomy
-        ]
+        return None
 
-        con.close()
+    return G
 
-    except:
-        logger.warn(
-            "An issue occurred during the opening of the DB file, route graph was not created."
-        )
+
+def db_fingerprint(db_path: str) -> tuple:
+    """
+    Identifies a version of a .db file by its resolved path, modification time and size.
+
+    Returns:
+        - fingerprint (tuple | None): the (path, mtime_ns, size) of the file, None if it does not exist.
+    """
+    try:
+        db_stat = os.stat(db_path)
+    except OSError:
         return None
+    return (os.path.realpath(db_path), db_stat.st_mtime_ns, db_stat.st_size)
+
+
+def load_universe_graph(
+    db_path: str, autonomy: int, cache_dir: str = None, stats: SolverStats = None
+) -> nx.Graph:
+    """
+    Loads the routes graph of a .db file, reusing the graph of a previous call when possible.
+
+    Graphs are kept in a process-level LRU cache of GRAPH_CACHE_SIZE entries keyed by the resolved
+    path, modification time and size of the .db file and the autonomy, and in the cache_dir, where the
+    GRAPH_PICKLE_CACHE_SIZE pickles used last are kept. When the .db file is updated,
+    a copy of the cached graph of its previous version is patched with the rows added, removed and
+    updated since (see RoutesIndex) and replaces it in the cache, its graph attribute "version" being
+    incremented. Graphs loaded from the pickle cache are built again. The returned graph is shared
+    between callers and must not be modified, a graph previously returned is never modified either.
+
+    Parameters:
+        - db_path (str): the path to the .db file.
+        - autonomy (int): the autonomy of the Millennium Falcon, longer routes are dropped.
+        - cache_dir (str | None): if set, a folder where graphs are also pickled so that a new
+                                  process can skip the reading of the .db file.
+        - stats (SolverStats | None): optional instrumentation of the loading, see profiling.py.
 
-    G = nx.parse_edgelist(edge_list, data=True)
-    # if the routes graph is small enough create a visualization of the graph to
-    # add it on the webapp page.
-    if G.number_of_nodes() < 20:  # with more than 20 nodes it might become messy
+    Returns:
+        - G (nx.Graph | None): the NetworkX graph containing all routes information,
+                            None if an issue is encountered during the handling of the .db file.
+    """
+    stats = stats or NULL_STATS
+    fingerprint = db_fingerprint(db_path)
+    if fingerprint is None:
+        logger.warning("DB file {} not found, route graph was not created.".format(db_path))
+        return None
+    key = fingerprint + (autonomy,)
+
+    with _graph_cache_lock:
+        if key in _graph_cache:
+            _graph_cache.move_to_end(key)
+            stats.count("graph_cache_hits")
+            return _graph_cache[key][0]
+    stats.count("graph_cache_misses")
+
+    G = _refresh_cached_graph(db_path, key, stats)
+    if G is not None:
+        return G
+
+    G = None
+    index = None
+    pickle_path = None
+    if cache_dir is not None:
+        pickle_path = os.path.join(
+            cache_dir, hashlib.sha1(repr(key).encode()).hexdigest() + ".pickle"
+        )
         try:
-            graph_layout = nx.drawing.spring_layout(G)
-            color_map = []
-            for node in G:
-                if node == millenium_dict["departure"]:
-                    color_map.append("green")
-                elif node == millenium_dict["arrival"]:
-                    color_map.append("red")
-                else:
-                    color_map.append("orange")
-            nx.draw_networkx(G, pos=graph_layout, node_color=color_map)
-            nx.draw_networkx_edge_labels(
-                G,
-                graph_layout,
-                edge_labels={(u, v): a["weight"] for u, v, a in G.edges(data=True)},
-            )
-            plt.axis("off")
-            legend_handles = [
-                Line2D(
-                    [0],
-                    [0],
-                    marker="o",
-                    color="w",
-                    label="Circle",
-                    markerfacecolor="g",
-                    markersize=10,
-                ),
-                Line2D(
-                    [0],
-                    [0],
-                    marker="o",
-                    color="w",
-                    label="Circle",
-                    markerfacecolor="r",
-                    markersize=10,
-                ),
-            ]
-            legend_labels = ["Departure Planet", "Arrival Planet"]
-            plt.legend(legend_handles, legend_labels)
-            plt.savefig(GRAPH_SAVE_PATH, bbox_inches="tight")
-            plt.clf()
-        except:
-            logger.info('Error during graph visualization creation.')
-            if os.path.isfile(GRAPH_SAVE_PATH):
-                os.remove(GRAPH_SAVE_PATH)
+            with stats.stage("load_graph_pickle"), open(pickle_path, "rb") as f:
+                G = pickle.load(f)
+            # the pickles used last are kept by _evict_graph_pickles
+            os.utime(pickle_path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            G = None
+
+    if G is None:
+        index = RoutesIndex()
+        with stats.stage("read_routes"):
+            G = read_routes_graph(db_path, autonomy, index)
+        if G is None:
+            return None
+        stats.count("routes_loaded", G.number_of_edges())
+        if pickle_path is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                # write to a temporary file first so other processes never read a partial pickle
+                tmp_fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+                with os.fdopen(tmp_fd, "wb") as f:
+                    pickle.dump(G, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, pickle_path)
+            except OSError as e:
+                logger.warning("Failed to save the route graph in {}. Reason: {}".format(cache_dir, e))
+            else:
+                _evict_graph_pickles(cache_dir)
+
+    with _graph_cache_lock:
+        _graph_cache[key] = (G, index)
+        if len(_graph_cache) > GRAPH_CACHE_SIZE:
+            _graph_cache.popitem(last=False)
     return G
 
 
+def _evict_graph_pickles(cache_dir: str, max_size: int = GRAPH_PICKLE_CACHE_SIZE):
+    """
+    Deletes the pickled graphs of cache_dir with the oldest modification times, so that max_size are left.
+    Pickles deleted meanwhile by another process are skipped.
+    """
+    mtimes = {}
+    try:
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith(".pickle"):
+                try:
+                    mtimes[entry.path] = entry.stat().st_mtime_ns
+                except FileNotFoundError:
+                    pass
+    except OSError as e:
+        logger.warning("Failed to list the route graphs of {}. Reason: {}".format(cache_dir, e))
+        return
+    for path in sorted(mtimes, key=mtimes.get)[: max(len(mtimes) - max_size, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Failed to delete the route graph {}. Reason: {}".format(path, e))
+
+
+def _refresh_cached_graph(db_path: str, key: tuple, stats: SolverStats) -> nx.Graph:
+    """
+    Patches a copy of the cached graph of a previous version of a .db file with the rows changed since,
+    and caches it under the key of the current version instead of the previous one.
+
+    The changed rows are read without holding the cache lock, and the graph of the previous version is
+    left unchanged for the callers still using it.
+
+    Returns:
+        - G (nx.Graph | None): the patched graph, None if no previous version is cached or if the
+                               refresh failed.
+    """
+    with _graph_cache_lock:
+        old_key = next(
+            (
+                cached_key
+                for cached_key, (_, index) in _graph_cache.items()
+                if cached_key[0] == key[0] and cached_key[-1] == key[-1] and index is not None
+            ),
+            None,
+        )
+        if old_key is None:
+            return None
+        entry = _graph_cache[old_key]
+    G, index = entry
+
+    try:
+        with stats.stage("refresh_routes"), ROUTES_DB_POOL.connection(db_path) as con:
+            changes = index.changes(con, key[-1])
+    except (sqlite3.Error, ValueError, TypeError):
+        changes = None
+    if changes is None:
+        logger.warning("The changes of the route graph could not be read, it is read again.")
+        return None
+
+    with _graph_cache_lock:
+        if _graph_cache.get(old_key) is not entry:
+            # another thread refreshed or evicted the graph meanwhile
+            cached = _graph_cache.get(key)
+            return None if cached is None else cached[0]
+        # the index now belongs to this thread only
+        del _graph_cache[old_key]
+
+    with stats.stage("refresh_routes"):
+        G, n_changed = index.apply(G, changes)
+    with _graph_cache_lock:
+        _graph_cache[key] = (G, index)
+        if len(_graph_cache) > GRAPH_CACHE_SIZE:
+            _graph_cache.popitem(last=False)
+    stats.count("routes_patched", n_changed)
+    return G
+
+
+def clear_graph_cache():
+    """
+    Empties the in-memory cache of load_universe_graph.
+    """
+    with _graph_cache_lock:
+        _graph_cache.clear()
+
+
+def build_unvierse_graph(
+    db_path: str, millenium_dict: dict, cache_dir: str = None, stats: SolverStats = None
+) -> nx.Graph:
+    """
+    Loads the routes file and construct the routes graph of the universe
+
+    Parameters:
+        - db_path (str): the path to the .db file.
+        - millenium_dict (dict): the Millennium Falcon config dict.
+        - cache_dir (str | None): optional folder for the on-disk cache of load_universe_graph.
+        - stats (SolverStats | None): optional instrumentation of the loading, see profiling.py.
+
+    Returns:
+        - G (nx.Graph | None): the NetworkX graph containing all routes information,
+                            None if an issue is encountered during the handling of the .db file.
+
+    The visualization of the graph for the webapp is created separately, see graph_rendering.py.
+    """
+    return load_universe_graph(db_path, millenium_dict["autonomy"], cache_dir, stats)
+
+
+def resolve_db_path(millenium_path: str, millenium_dict: dict) -> str:
+    """
+    Returns the path to the routes .db file, which is either absolute or relative to the Millennium Falcon .json file.
+    """
+    if os.path.isfile(millenium_dict["routes_db"]):
+        return millenium_dict["routes_db"]
+    return os.path.join(os.path.dirname(millenium_path), millenium_dict["routes_db"])
+
+
+def build_bounty_index(bounty_hunters: list, countdown: int) -> dict:
+    """
+    Compile the bounty hunters schedule into a per-planet bitmask of the days they are present.
+
+    Only the days from 0 to the countdown are indexed: the Falcon is never anywhere on the other days,
+    and the size of a bitmask stays bounded by the countdown whatever the days of the file.
+
+    Parameters:
+        - bounty_hunters (list[dict]): the "bounty_hunters" list of an Empire Communication.
+        - countdown (int): the countdown of the Empire Communication.
+
+    Returns:
+        - bounty_index (dict[int]): for each planet, an integer whose bit d is set when bounty hunters
+                                    are present on the planet on day d.
+    """
+    bounty_index = defaultdict(int)
+    for bounty in bounty_hunters:
+        if 0 <= bounty["day"] <= countdown:
+            bounty_index[bounty["planet"]] |= 1 << bounty["day"]
+    return dict(bounty_index)
+
+
+class IndexedEmpire(dict):
+    """
+    An Empire Communication whose bounty hunters are already compiled by build_bounty_index, as returned
+    by load_empire_index. As a dict it only holds the "countdown", the schedule is an attribute so that
+    a dict received from a client can never pass for an indexed one.
+
+    The bounty hunters after the countdown are not in the bitmasks, they are kept as (planet, day) pairs
+    in late_hunters so that the countdown of a SolverSession can be raised.
+    """
+
+    def __init__(self, countdown: int, bounty_index: dict, late_hunters: frozenset = frozenset()):
+        super().__init__(countdown=countdown)
+        self.bounty_index = bounty_index
+        self.late_hunters = late_hunters
+
+
+def empire_bounty_index(empire_dict: dict) -> dict:
+    """
+    Returns the bounty hunters schedule of an Empire Communication, already indexed by load_empire_index
+    or compiled from its "bounty_hunters" by build_bounty_index.
+    """
+    if isinstance(empire_dict, IndexedEmpire):
+        return empire_dict.bounty_index
+    return build_bounty_index(empire_dict["bounty_hunters"], empire_dict["countdown"])
+
+
+def empire_late_hunters(empire_dict: dict) -> frozenset:
+    """
+    Returns the (planet, day) pairs of the bounty hunters after the countdown of an Empire Communication.
+    """
+    if isinstance(empire_dict, IndexedEmpire):
+        return frozenset(empire_dict.late_hunters)
+    return frozenset(
+        (bounty["planet"], bounty["day"])
+        for bounty in empire_dict["bounty_hunters"]
+        if bounty["day"] > empire_dict["countdown"]
+    )
+
+
+def bitmask_to_days(bitmask: int) -> list:
+    """
+    Convert a bitmask into the sorted list of the days d whose bit is set.
+    """
+    days = []
+    while bitmask:
+        lowest = bitmask & -bitmask
+        days.append(lowest.bit_length() - 1)
+        bitmask ^= lowest
+    return days
+
+
+def days_to_bitmask(days) -> int:
+    """
+    Convert a set of days into a bitmask whose bit d is set when d is in the set, bitmasks are left unchanged.
+    """
+    if isinstance(days, int):
+        return days
+    bitmask = 0
+    for day in days:
+        if day >= 0:
+            bitmask |= 1 << day
+    return bitmask
+
+
+def count_days(bitmask: int, first_day: int, last_day: int) -> int:
+    """
+    Count the days set in a bitmask between first_day and last_day (both included).
+    """
+    if last_day < first_day:
+        return 0
+    window = (1 << (last_day - first_day + 1)) - 1
+    return ((bitmask >> first_day) & window).bit_count()
+
+
 def safe_load_json(path: str, schema: dict) -> dict:
     """
     Safely load a .json file and checks if it matches the schema
@@ -141,20 +417,249 @@ def safe_load_json(path: str, schema: dict) -> dict:
             logger.warning(" JSON file has a wrong format.")
             loaded_dict = None
         else:
-            logger.info(" Successfully load {} file.".format(path))
-            logger.info(loaded_dict)
+            logger.info(" Successfully load %s file.", path)
+            # formatting a large dict is expensive, it is skipped when it would not be displayed
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(loaded_dict)
     except:
-        logger.warning(" Error loading {} file.".format(path))
-    logger.info(loaded_dict)
+        logger.warning(" Error loading %s file.", path)
+    return loaded_dict
+
+
+# number of characters read at once from the Empire Communication files by load_empire_index
+JSON_CHUNK_SIZE = 1 << 16
+
+# characters that may follow the end of a number decoded from a chunk when it goes on in the next one
+_NUMBER_TAIL = re.compile(r"[0-9+\-.eE]*\Z")
+
+
+class _JSONStream:
+    """
+    Reads the JSON values of a text file one at a time, keeping only the part of the file being decoded
+    in memory. The arrays and objects iterated by iter_array and iter_object are never built, the other
+    values are decoded with json.JSONDecoder.raw_decode.
+    """
+
+    def __init__(self, f, chunk_size: int = None):
+        self.f = f
+        self.chunk_size = chunk_size or JSON_CHUNK_SIZE
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """
+        Drops the characters already read and appends the next ones, at least as many as kept so that
+        decoding a large value again and again stays linear. Returns False at the end of the file.
+        """
+        chunk = self.f.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def next_char(self) -> str:
+        """
+        Skips the whitespace and returns the next character without reading it, "" at the end of the file.
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def read_char(self, expected: str) -> str:
+        """
+        Reads the next character, which must be one of expected.
+        """
+        char = self.next_char()
+        if not char or char not in expected:
+            raise ValueError("Expected one of {!r}.".format(expected))
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """
+        Reads the next JSON value.
+        """
+        self.next_char()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # the value may go on in the next characters
+                if self._fill():
+                    continue
+                raise
+            # so may a number ending with the characters read
+            if _NUMBER_TAIL.match(self.buffer, end) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        """
+        Reads an array, yielding its values as they are decoded.
+        """
+        self.read_char("[")
+        if self.next_char() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.decode()
+            if self.read_char(",]") == "]":
+                return
+
+    def iter_object(self):
+        """
+        Reads an object, yielding its keys. The caller reads each value before asking for the next key.
+        """
+        self.read_char("{")
+        if self.next_char() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.decode()
+            if type(key) != str:
+                raise ValueError("Expected a key.")
+            self.read_char(":")
+            yield key
+            if self.read_char(",}") == "}":
+                return
+
+    def check_end(self):
+        if self.next_char():
+            raise ValueError("Extra data.")
+
+
+def _scan_empire_file(path: str, countdown: int = None) -> (int, dict, frozenset):
+    """
+    One pass of load_empire_index over an Empire Communication .json file.
+
+    The bounty hunters are always validated, but only indexed if the countdown is known: given, or read
+    before the "bounty_hunters" list.
+
+    Returns:
+        - countdown (int | None): the countdown of the file, None if missing.
+        - bounty_index (dict[int] | None): see build_bounty_index, None if the bounty hunters are missing
+                                           or could not be indexed.
+        - late_hunters (frozenset | None): the (planet, day) pairs of the bounty hunters after the countdown.
+
+    Raises:
+        - ValueError: if the file is not valid JSON, has repeated keys, or a wrong countdown or bounty hunter.
+    """
+    read_countdown = None
+    bounty_index = None
+    late_hunters = None
+    seen = set()
+    with open(path, "r") as f:
+        stream = _JSONStream(f)
+        for key in stream.iter_object():
+            if key in seen:
+                raise ValueError("Repeated key {}.".format(key))
+            seen.add(key)
+            if key == "countdown":
+                read_countdown = stream.decode()
+                if type(read_countdown) != int:
+                    raise ValueError("Wrong countdown.")
+                if countdown is None:
+                    countdown = read_countdown
+            elif key == "bounty_hunters":
+                index = defaultdict(int)
+                late = set()
+                for entry in stream.iter_array():
+                    if type(entry) != dict or type(entry.get("planet")) != str or type(entry.get("day")) != int:
+                        raise ValueError("Wrong bounty hunter.")
+                    if countdown is None:
+                        continue
+                    # the Falcon leaves on day 0, earlier days can be ignored
+                    if 0 <= entry["day"] <= countdown:
+                        index[entry["planet"]] |= 1 << entry["day"]
+                    elif entry["day"] > countdown:
+                        late.add((entry["planet"], entry["day"]))
+                if countdown is not None:
+                    bounty_index, late_hunters = dict(index), frozenset(late)
+            else:
+                stream.decode()
+        stream.check_end()
+    return read_countdown, bounty_index, late_hunters
+
+
+def load_empire_index(path: str) -> IndexedEmpire:
+    """
+    Safely loads an Empire Communication .json file, validating and indexing its bounty hunters in one pass.
+
+    The "bounty_hunters" list is never built: each entry is decoded, checked and compiled into the
+    per-planet bitmasks of build_bounty_index before the next one is read from the file, so the memory
+    used does not grow with the number of entries. The file is read twice if its countdown comes after
+    the bounty hunters.
+
+    Parameters:
+        - path (str): the path to the .json file.
+
+    Returns:
+        - empire_dict (IndexedEmpire | None): the Empire Communication with its bounty hunters indexed,
+                                              None if the file is incorrect or does not match the EMPIRE_SCHEMA.
+    """
+    try:
+        countdown, bounty_index, late_hunters = _scan_empire_file(path)
+        if countdown is not None and bounty_index is None:
+            countdown, bounty_index, late_hunters = _scan_empire_file(path, countdown)
+    except (OSError, ValueError):
+        logger.warning(" Error loading %s file.", path)
+        return None
+
+    if countdown is None or bounty_index is None:
+        logger.warning(" JSON file has a wrong format.")
+        return None
+
+    logger.info(" Successfully load %s file.", path)
+    return IndexedEmpire(countdown, bounty_index, late_hunters)
+
+
+def safe_parse_json(content: str | bytes, schema: dict) -> dict:
+    """
+    Safely parse the content of a .json file (e.g. an upload kept in memory) and checks if it matches the schema
+
+    Parameters:
+        - content (str | bytes): the content of the .json file.
+        - schema (dict): the schema to compare with
+
+    Returns:
+        - loaded_dict (dict | None): the parsed content or None if it does not
+                                     match the schema or if the content is incorrect.
+    """
+    try:
+        loaded_dict = json.loads(content)
+    except (ValueError, TypeError):
+        logger.warning(" Error parsing JSON content.")
+        return None
+    if not matches_schema(loaded_dict, schema):
+        logger.warning(" JSON content has a wrong format.")
+        return None
     return loaded_dict
 
 
+def matches_schema(loaded, schema: dict) -> bool:
+    """
+    Checks wether already parsed JSON content is a dictionnary that fits with a type schema, see check_json_schema.
+    """
+    try:
+        return isinstance(loaded, dict) and check_json_schema(loaded, schema)
+    except (TypeError, AttributeError, KeyError):
+        return False
+
+
 def get_json_contents(millenium_path: str, empire_path: str) -> (dict, dict):
     """
-    Safely loads the content of the Millennium and Empire .json files.
+    Safely loads the content of the Millennium and Empire .json files, the bounty hunters of the
+    Empire Communication are indexed while loading, see load_empire_index.
     """
     millenium_dict = safe_load_json(millenium_path, FALCON_SCHEMA)
-    empire_dict = safe_load_json(empire_path, EMPIRE_SCHEMA)
+    empire_dict = load_empire_index(empire_path)
 
     return millenium_dict, empire_dict
 
@@ -184,51 +689,31 @@ def check_json_schema(dict_check: dict, schema: dict) -> bool:
                 )
                 return False
         elif type(schema[key]) == list:
-            if not all(
-                [type(schema[key][0]) == type(elem) for elem in dict_check[key]]
-            ):
-                logger.info(
-                    "Wrong type for element in list of property {}, invalid json schema.".format(
-                        key
+            # a single pass over the elements, which may be numerous
+            elem_schema = schema[key][0]
+            for elem in dict_check[key]:
+                if type(elem_schema) != type(elem):
+                    logger.info(
+                        "Wrong type for element in list of property %s, invalid json schema.", key
                     )
-                )
-                return False
-            if type(schema[key][0]) == dict and not all(
-                [check_json_schema(elem, schema[key][0]) for elem in dict_check[key]]
-            ):
-                return False
+                    return False
+                if type(elem_schema) == dict and not check_json_schema(elem, elem_schema):
+                    return False
 
         elif type(schema[key]) == dict:
-            return check_json_schema(dict_check[key], schema[key])
+            if not check_json_schema(dict_check[key], schema[key]):
+                return False
     return True
 
 
 def load_empire_dict(empire_path: str) -> dict:
     """
-    Safely loads the content of an empire .json file.
+    Safely loads the content of an empire .json file, with its bounty hunters indexed, see load_empire_index.
     """
-    empire_dict = safe_load_json(empire_path, EMPIRE_SCHEMA)
+    empire_dict = load_empire_index(empire_path)
     return empire_dict
 
 
-def setup_upload_folder(folder: str):
-    """
-    Prepare a local folder for the uploading of a .json file inside the webapp.
-    """
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-    else:
-        for filename in os.listdir(folder):
-            file_path = os.path.join(folder, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                logger.warning("Failed to delete %s. Reason: %s" % (file_path, e))
-
-
 def allowed_file(filename: str) -> bool:
     """
     Checks if filename has the right extension (i.e. .json here)
@@ -0,0 +1,149 @@
+import os
+import json
+import random
+import sqlite3
+
+# distributions of the travel times of the generated routes
+WEIGHT_DISTRIBUTIONS = ["uniform", "short"]
+
+
+def planet_name(planet: int) -> str:
+    return "P{:05d}".format(planet)
+
+
+def _travel_time(rng: random.Random, min_weight: int, max_weight: int, distribution: str) -> int:
+    if distribution == "uniform":
+        return rng.randint(min_weight, max_weight)
+    # "short": exponentially distributed, most routes are close to min_weight
+    return min(max_weight, min_weight + int(rng.expovariate(2 / (max_weight - min_weight + 1))))
+
+
+def generate_routes(
+    n_planets: int,
+    degree: float = 4,
+    min_weight: int = 1,
+    max_weight: int = 6,
+    distribution: str = "uniform",
+    seed: int = 0,
+) -> list:
+    """
+    Generates the routes of a random connected universe.
+
+    Each planet is first linked to a random planet generated before it, which makes the universe
+    connected, then random routes are added until the planets have the requested average degree.
+
+    Parameters:
+        - n_planets (int): the number of planets, named P00000, P00001...
+        - degree (float): the average number of routes of a planet.
+        - min_weight (int): the shortest travel time of a route.
+        - max_weight (int): the longest travel time of a route.
+        - distribution (str): the distribution of the travel times, one of WEIGHT_DISTRIBUTIONS.
+        - seed (int): the seed of the random generator, the same seed gives the same routes.
+
+    Returns:
+        - routes (list[tuple]): the (origin, destination, travel_time) routes.
+    """
+    if distribution not in WEIGHT_DISTRIBUTIONS:
+        raise ValueError(
+            "Unknown distribution {}, expected one of {}.".format(distribution, WEIGHT_DISTRIBUTIONS)
+        )
+    rng = random.Random(seed)
+    edges = set()
+    for planet in range(1, n_planets):
+        edges.add((rng.randrange(planet), planet))
+
+    n_edges = min(int(n_planets * degree / 2), n_planets * (n_planets - 1) // 2)
+    while len(edges) < n_edges:
+        origin, destination = rng.sample(range(n_planets), 2)
+        edges.add((min(origin, destination), max(origin, destination)))
+
+    return [
+        (
+            planet_name(origin),
+            planet_name(destination),
+            _travel_time(rng, min_weight, max_weight, distribution),
+        )
+        for origin, destination in sorted(edges)
+    ]
+
+
+def write_universe_db(db_path: str, routes: list):
+    """
+    Writes routes in a .db file with the schema of the examples, an existing file is replaced.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    con = sqlite3.connect(db_path)
+    try:
+        with con:
+            con.execute(
+                "CREATE TABLE routes (origin TEXT, destination TEXT, travel_time UNSIGNED INTEGER)"
+            )
+            con.executemany("INSERT INTO routes VALUES (?, ?, ?)", routes)
+    finally:
+        con.close()
+
+
+def generate_empire(
+    n_planets: int, countdown: int, hunter_density: float = 0.05, seed: int = 0
+) -> dict:
+    """
+    Generates a random Empire Communication.
+
+    Parameters:
+        - n_planets (int): the number of planets of the universe, see generate_routes.
+        - countdown (int): the countdown of the Empire Communication.
+        - hunter_density (float): the fraction of the (planet, day) pairs, for days 0 to countdown,
+                                  where bounty hunters are present.
+        - seed (int): the seed of the random generator.
+
+    Returns:
+        - empire_dict (dict): the Empire Communication.
+    """
+    rng = random.Random(seed)
+    n_slots = n_planets * (countdown + 1)
+    slots = rng.sample(range(n_slots), int(hunter_density * n_slots))
+    return {
+        "countdown": countdown,
+        "bounty_hunters": [
+            {"planet": planet_name(slot % n_planets), "day": slot // n_planets}
+            for slot in sorted(slots)
+        ],
+    }
+
+
+def write_mission(
+    folder: str,
+    routes: list,
+    empire_dict: dict,
+    autonomy: int,
+    departure: str,
+    arrival: str,
+) -> (str, str):
+    """
+    Writes a universe.db, millennium-falcon.json and empire.json files in a folder, like the examples.
+
+    Returns:
+        - millenium_path (str): the path to the Millennium Falcon .json file.
+        - empire_path (str): the path to the Empire Communication .json file.
+    """
+    os.makedirs(folder, exist_ok=True)
+    write_universe_db(os.path.join(folder, "universe.db"), routes)
+
+    millenium_path = os.path.join(folder, "millennium-falcon.json")
+    with open(millenium_path, "w") as f:
+        json.dump(
+            {
+                "autonomy": autonomy,
+                "departure": departure,
+                "arrival": arrival,
+                "routes_db": "universe.db",
+            },
+            f,
+        )
+
+    empire_path = os.path.join(folder, "empire.json")
+    with open(empire_path, "w") as f:
+        json.dump(empire_dict, f)
+
+    return millenium_path, empire_path
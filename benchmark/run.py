@@ -0,0 +1,368 @@
+import argparse
+import os
+import sys
+import json
+import math
+import time
+import heapq
+import random
+import logging
+import platform
+import tempfile
+import tracemalloc
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import networkx as nx
+
+from odd_computation import (
+    compute_odds,
+    compute_path_length,
+    compute_path_odds,
+    prepare_mission,
+    solve_mission,
+    clear_mission_cache,
+)
+from utils import build_unvierse_graph, clear_graph_cache, safe_load_json, FALCON_SCHEMA
+from generators import (
+    WEIGHT_DISTRIBUTIONS,
+    generate_routes,
+    generate_empire,
+    write_mission,
+    planet_name,
+)
+
+# a stage is a regression when it is slower than its baseline by more than this fraction
+REGRESSION_TOLERANCE = 0.5
+
+# stages faster than this are too noisy to be compared with the baseline (in seconds)
+MIN_COMPARED_SECONDS = 0.01
+
+# results of the default seeded suite, compared with by default with --compare
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# parameters that do not change the generated cases, a baseline is comparable whatever their values
+UNCOMPARED_PARAMETERS = ("sizes", "repeat", "tolerance")
+
+
+def measure(stage, setup=None, repeat: int = 3) -> (float, int):
+    """
+    Times a stage and measures its peak memory.
+
+    The stage is timed repeat times and the fastest run is kept, then it runs once more under
+    tracemalloc, which slows it down, to measure the peak of allocated memory.
+
+    Parameters:
+        - stage (callable): the function to measure, called with the result of setup.
+        - setup (callable | None): called before each run of the stage and not measured.
+        - repeat (int): the number of timed runs.
+
+    Returns:
+        - seconds (float): the fastest wall time of the stage.
+        - peak_bytes (int): the peak of memory allocated by the stage.
+    """
+    seconds = math.inf
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        stage(argument)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    argument = setup() if setup is not None else None
+    tracemalloc.start()
+    try:
+        stage(argument)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak_bytes
+
+
+def calibrate(repeat: int = 5) -> float:
+    """
+    Times a fixed loop of the dict and heap operations the solvers are made of, to scale the timings of
+    a baseline measured on another machine.
+
+    Returns:
+        - seconds (float): the fastest wall time of the loop.
+    """
+    rng = random.Random(0)
+    keys = [rng.randrange(1 << 20) for _ in range(100000)]
+    seconds = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        heap, best = [], {}
+        for key in keys:
+            if best.get(key % 4096, math.inf) > key:
+                best[key % 4096] = key
+                heapq.heappush(heap, (key, key % 4096))
+        while heap:
+            heapq.heappop(heap)
+        seconds = min(seconds, time.perf_counter() - start)
+    return seconds
+
+
+def clear_caches():
+    clear_graph_cache()
+    clear_mission_cache()
+
+
+def generate_case(folder: str, n_planets: int, args) -> (str, str):
+    """
+    Generates the mission of one size, with a countdown args.slack times the duration of the fastest itinerary.
+    """
+    routes = generate_routes(
+        n_planets, args.degree, args.min_weight, args.max_weight, args.distribution, args.seed
+    )
+    departure, arrival = planet_name(0), planet_name(n_planets - 1)
+
+    universe_graph = nx.Graph()
+    universe_graph.add_weighted_edges_from(routes)
+    shortest_path = nx.shortest_path(universe_graph, departure, arrival, weight="weight")
+    path_length = compute_path_length(shortest_path, universe_graph, args.autonomy)[0]
+
+    empire_dict = generate_empire(
+        n_planets, int(math.ceil(args.slack * path_length)), args.hunter_density, args.seed
+    )
+    return write_mission(
+        os.path.join(folder, "universe_{}".format(n_planets)),
+        routes,
+        empire_dict,
+        args.autonomy,
+        departure,
+        arrival,
+    )
+
+
+def benchmark_case(millenium_path: str, empire_path: str, n_planets: int, args) -> list:
+    """
+    Measures each stage of the odds computation on a generated mission.
+
+    Returns:
+        - results (list[dict]): the "size", "stage", "seconds" and "peak_kib" of each stage.
+    """
+    millenium_dict = safe_load_json(millenium_path, FALCON_SCHEMA)
+    with open(empire_path) as f:
+        empire_dict = json.load(f)
+    db_path = os.path.join(os.path.dirname(millenium_path), millenium_dict["routes_db"])
+
+    def prepared(solver):
+        def setup():
+            clear_mission_cache()
+            return prepare_mission(millenium_path, millenium_dict, solver)
+
+        return setup
+
+    stages = {
+        "build_universe_graph": (
+            lambda _: build_unvierse_graph(db_path, millenium_dict),
+            clear_caches,
+        ),
+        "prepare_mission": (
+            lambda _: prepare_mission(millenium_path, millenium_dict, "dp"),
+            clear_mission_cache,
+        ),
+        "solve_dp": (lambda mission: solve_mission(mission, empire_dict), prepared("dp")),
+        "solve_bidir": (lambda mission: solve_mission(mission, empire_dict), prepared("bidir")),
+        "compute_path_odds": (
+            lambda mission: compute_path_odds(
+                mission.shortest_path, mission.universe_graph, empire_dict, millenium_dict
+            ),
+            prepared("dp"),
+        ),
+        "compute_odds": (lambda _: compute_odds(millenium_path, empire_path), clear_caches),
+    }
+    if n_planets <= args.paths_max_planets:
+        stages["solve_paths"] = (
+            lambda mission: solve_mission(mission, empire_dict),
+            prepared("paths"),
+        )
+
+    results = []
+    for stage, (function, setup) in stages.items():
+        seconds, peak_bytes = measure(function, setup, args.repeat)
+        results.append(
+            {
+                "size": n_planets,
+                "stage": stage,
+                "seconds": seconds,
+                "peak_kib": peak_bytes / 1024,
+            }
+        )
+        print(
+            "{:>8} planets  {:<22} {:10.4f} s {:12.1f} KiB".format(
+                n_planets, stage, seconds, peak_bytes / 1024
+            ),
+            flush=True,
+        )
+    clear_caches()
+    return results
+
+
+def compare_with_baseline(
+    results: list, baseline: list, tolerance: float = REGRESSION_TOLERANCE, scale: float = 1.0
+) -> list:
+    """
+    Finds the stages slower than their baseline by more than tolerance.
+
+    Stages missing from the baseline, or too fast to be timed reliably, are not compared.
+
+    Parameters:
+        - results (list[dict]): the results of the run.
+        - baseline (list[dict]): the results of the baseline.
+        - tolerance (float): the slowdown, as a fraction of the baseline time, above which a stage is a regression.
+        - scale (float): the speed of this machine relative to the baseline one (see calibrate), the baseline
+                         timings are multiplied by it.
+
+    Returns:
+        - regressions (list[dict]): the "size", "stage", "seconds", "baseline_seconds" and "ratio"
+                                    of each regression.
+    """
+    baseline_seconds = {(result["size"], result["stage"]): result["seconds"] * scale for result in baseline}
+    regressions = []
+    for result in results:
+        reference = baseline_seconds.get((result["size"], result["stage"]))
+        if reference is None or max(reference, result["seconds"]) < MIN_COMPARED_SECONDS:
+            continue
+        ratio = result["seconds"] / max(reference, 1e-9)
+        if ratio > 1 + tolerance:
+            regressions.append(
+                dict(result, baseline_seconds=reference, ratio=ratio)
+            )
+    return regressions
+
+
+def same_parameters(meta: dict, baseline_meta: dict) -> bool:
+    """
+    Whether two runs generated the same cases, so their timings can be compared.
+    """
+    parameters, baseline_parameters = meta["parameters"], baseline_meta["parameters"]
+    return all(
+        parameters.get(key) == baseline_parameters.get(key)
+        for key in set(parameters) | set(baseline_parameters)
+        if key not in UNCOMPARED_PARAMETERS
+    )
+
+
+def parse_command_line():
+    """
+    Handle the argument parsing for the benchmark CLI.
+    """
+    parser = argparse.ArgumentParser("benchmark", add_help=True)
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=[50, 1000, 10000],
+        type=int,
+        help="Numbers of planets of the generated universes",
+    )
+    parser.add_argument("--degree", default=4, type=float, help="Average number of routes per planet")
+    parser.add_argument("--min-weight", default=1, type=int, help="Shortest travel time of a route")
+    parser.add_argument("--max-weight", default=6, type=int, help="Longest travel time of a route")
+    parser.add_argument(
+        "--distribution", default="uniform", choices=WEIGHT_DISTRIBUTIONS, help="Distribution of the travel times"
+    )
+    parser.add_argument("--autonomy", default=6, type=int, help="Autonomy of the Falcon")
+    parser.add_argument(
+        "--slack",
+        default=1.5,
+        type=float,
+        help="Countdown, as a multiple of the duration of the fastest itinerary",
+    )
+    parser.add_argument(
+        "--hunter-density",
+        default=0.1,
+        type=float,
+        help="Fraction of the (planet, day) pairs with bounty hunters",
+    )
+    parser.add_argument("--seed", default=0, type=int, help="Seed of the generators")
+    parser.add_argument("--repeat", default=3, type=int, help="Number of timed runs of each stage")
+    parser.add_argument(
+        "--paths-max-planets",
+        default=50,
+        type=int,
+        help="The 'paths' solver is only measured on universes up to this size",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=None,
+        type=str,
+        help="Folder where the generated files are kept, a temporary folder by default",
+    )
+    parser.add_argument("--output", default=None, type=str, help="JSON file where the results are written")
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Compare the timings with the baseline and exit with status 1 on a regression",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=BASELINE_PATH,
+        type=str,
+        help="JSON results of a previous run to compare with, the committed results of the default suite by default",
+    )
+    parser.add_argument(
+        "--tolerance",
+        default=REGRESSION_TOLERANCE,
+        type=float,
+        help="Slowdown, as a fraction of the baseline time, above which a stage is a regression",
+    )
+    return parser.parse_args()
+
+
+def main(args) -> int:
+    logging.getLogger("R2D2").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir or tmp_dir
+        results = []
+        for n_planets in args.sizes:
+            millenium_path, empire_path = generate_case(data_dir, n_planets, args)
+            results.extend(benchmark_case(millenium_path, empire_path, n_planets, args))
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "calibration_seconds": calibrate(),
+            "parameters": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("output", "baseline", "compare", "data_dir")
+            },
+        },
+        "results": results,
+    }
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if not args.compare:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.baseline == BASELINE_PATH and not same_parameters(report["meta"], baseline["meta"]):
+        print("The cases differ from those of {}, no comparison.".format(args.baseline))
+        return 0
+    # the baseline timings are scaled to the speed of this machine
+    scale = report["meta"]["calibration_seconds"] / baseline["meta"].get(
+        "calibration_seconds", report["meta"]["calibration_seconds"]
+    )
+    regressions = compare_with_baseline(results, baseline["results"], args.tolerance, scale)
+    for regression in regressions:
+        print(
+            "REGRESSION {:>8} planets  {:<22} {:.4f} s instead of {:.4f} s (x{:.2f})".format(
+                regression["size"],
+                regression["stage"],
+                regression["seconds"],
+                regression["baseline_seconds"],
+                regression["ratio"],
+            )
+        )
+    if not regressions:
+        print("No regression compared to {} (timings scaled by {:.2f}).".format(args.baseline, scale))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_command_line()))
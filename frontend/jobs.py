@@ -0,0 +1,191 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from odd_computation import load_mission, solve_mission
+from profiling import SolverStats
+from solvers import SearchTimeout
+
+
+def compute_job(millenium_path: str, empire_dict: dict, deadline: float = None) -> dict:
+    """
+    Computes the odds of an Empire Communication, runs in the workers of the JobQueue.
+
+    The routes graph and candidate paths are cached by the backend, so a worker only loads them
+    for its first job. The instrumentation of the computation is returned under "stats", see profiling.py.
+    The search raises solvers.SearchTimeout once the deadline, a time.time() timestamp, is passed.
+    """
+    stats = SolverStats()
+    mission = load_mission(millenium_path, stats=stats)
+    if mission is None:
+        return {"odds": None, "itinerary": None, "stats": stats.to_dict()}
+    odds, itinerary = solve_mission(mission, empire_dict, stats=stats, deadline=deadline)
+    return {"odds": odds, "itinerary": itinerary, "stats": stats.to_dict()}
+
+
+class JobQueue:
+    """
+    Runs the odds computations in a bounded pool of workers so that requests return immediately.
+
+    Jobs go through the statuses "queued", "running" and then "done", "failed" or "timeout".
+    Finished jobs are forgotten result_ttl seconds after their submission.
+
+    A job is given the deadline of its timeout: the search stops by itself once it is passed, and a
+    watchdog thread cancels the queued jobs and marks the jobs as timed out at the deadline, whether
+    their status is polled or not.
+    """
+
+    def __init__(
+        self,
+        millenium_path: str,
+        max_workers: int = 2,
+        max_pending: int = 32,
+        timeout: float = 60,
+        result_ttl: float = 600,
+        use_processes: bool = False,
+        metrics: SolverStats = None,
+    ):
+        """
+        Parameters:
+            - millenium_path (str): path to the Millennium Falcon .json file of all the jobs.
+            - max_workers (int): number of jobs computed at the same time.
+            - max_pending (int): maximum number of queued and running jobs, new jobs are refused above it.
+            - timeout (float): seconds after its submission when a job that is not finished is abandoned.
+            - result_ttl (float): seconds after their submission during which the job results are kept.
+            - use_processes (bool): run the jobs in processes instead of threads, so they are not
+                                    limited by the GIL.
+            - metrics (SolverStats | None): if set, aggregates the instrumentation of all the jobs
+                                            and counts the jobs by outcome.
+        """
+        self.millenium_path = millenium_path
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self.metrics = metrics
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self._executor = executor_class(max_workers)
+        self._jobs = {}
+        # reentrant, the done callback of a job finished before it is added runs in the submitting thread
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, name="JobQueue watchdog", daemon=True)
+        self._watchdog.start()
+
+    def _watch(self):
+        """
+        Watchdog thread, expires the jobs at their deadline.
+        """
+        while not self._stopped.wait(min(max(self.timeout, 0.01), 1)):
+            with self._lock:
+                self._expire(time.monotonic())
+
+    def _expire(self, now: float):
+        """
+        Marks the unfinished jobs submitted more than timeout seconds ago as timed out and cancels them,
+        a running computation stops by itself at its deadline.
+        """
+        for job in self._jobs.values():
+            if not job["timed_out"] and not job["future"].done() and now - job["submitted"] > self.timeout:
+                job["timed_out"] = True
+                job["future"].cancel()
+                if self.metrics is not None:
+                    self.metrics.count("jobs_timeout")
+
+    def _record(self, job: dict, future):
+        """
+        Done callback of the jobs, counts them by outcome and adds their instrumentation to the metrics.
+        """
+        with self._lock:
+            if job["timed_out"]:
+                # already counted when it expired
+                return
+            if not future.cancelled() and isinstance(future.exception(), SearchTimeout):
+                job["timed_out"] = True
+                if self.metrics is not None:
+                    self.metrics.count("jobs_timeout")
+                return
+        if self.metrics is None:
+            return
+        if future.cancelled():
+            self.metrics.count("jobs_cancelled")
+        elif future.exception() is not None:
+            self.metrics.count("jobs_failed")
+        else:
+            self.metrics.count("jobs_done")
+            self.metrics.merge(future.result()["stats"])
+
+    def _purge(self, now: float):
+        for job_id in [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job["future"].done() and now - job["submitted"] > self.result_ttl
+        ]:
+            del self._jobs[job_id]
+
+    def pending(self) -> int:
+        """
+        Returns the number of queued and running jobs.
+        """
+        with self._lock:
+            return sum(not job["future"].done() for job in self._jobs.values())
+
+    def submit(self, empire_dict: dict) -> str:
+        """
+        Queues the computation of the odds of an Empire Communication.
+
+        Returns:
+            - job_id (str | None): the id of the job, None if too many jobs are pending.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            if sum(not job["future"].done() for job in self._jobs.values()) >= self.max_pending:
+                return None
+            job_id = uuid.uuid4().hex
+            future = self._executor.submit(
+                compute_job, self.millenium_path, empire_dict, time.time() + self.timeout
+            )
+            job = {
+                "future": future,
+                "submitted": now,
+                "empire_dict": empire_dict,
+                "timed_out": False,
+            }
+            self._jobs[job_id] = job
+            future.add_done_callback(lambda future: self._record(job, future))
+        return job_id
+
+    def status(self, job_id: str) -> dict:
+        """
+        Returns the status of a job, with its result once it is done.
+
+        Returns:
+            - job_status (dict | None): a dict with the "status" of the job, and "odds", "itinerary" and
+                                        "empire_dict" when it is done. None if the job is unknown.
+        """
+        now = time.monotonic()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            future = job["future"]
+            self._expire(now)
+
+            if job["timed_out"]:
+                return {"status": "timeout"}
+            if not future.done():
+                return {"status": "running" if future.running() else "queued"}
+            if future.exception() is not None:
+                return {"status": "failed"}
+            result = future.result()
+            return {
+                "status": "done",
+                "empire_dict": job["empire_dict"],
+                "odds": result["odds"],
+                "itinerary": result["itinerary"],
+            }
+
+    def shutdown(self):
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
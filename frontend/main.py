@@ -1,23 +1,128 @@
 import os
 import sys
 import json
-from flask import Flask, render_template, request, url_for, flash, redirect, session
+import gzip
+import zlib
+import time
+import threading
+from flask import (
+    Flask,
+    render_template,
+    request,
+    url_for,
+    flash,
+    redirect,
+    jsonify,
+    make_response,
+    Response,
+    stream_with_context,
+)
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 
 sys.path.insert(1, "backend/")
 print(os.path.abspath("../"))
 
-from odd_computation import compute_odds
-from utils import load_empire_dict, setup_upload_folder, allowed_file, GRAPH_SAVE_PATH
+from jobs import JobQueue, compute_job
+from odd_computation import load_mission, solve_mission_anytime, solve_mission_matrix
+from profiling import SolverStats
+from solvers import SearchTimeout
+from universe_csr import is_universe_snapshot, load_universe_snapshot, snapshot_graph
+from utils import (
+    allowed_file,
+    safe_load_json,
+    safe_parse_json,
+    matches_schema,
+    build_unvierse_graph,
+    resolve_db_path,
+    FALCON_SCHEMA,
+    EMPIRE_SCHEMA,
+)
 
 
-UPLOAD_FOLDER = "frontend/static/uploads"
 MILLENIUM_PATH = "frontend/static/ressources/millennium-falcon.json"
 
+# odds computations run in the background, requests only submit and poll jobs
+JOB_WORKERS = 2
+JOB_MAX_PENDING = 32
+JOB_TIMEOUT = 60
+
+# default time budget of the anytime odds computations of the API (in seconds)
+ANYTIME_BUDGET = 0.2
+
+# the odds computed directly by /api/odds, all the Empire Communications of a request together,
+# must be found within this time (in seconds)
+API_TIMEOUT = 10
+# maximum number of Empire Communications in the JSON array of a request to /api/odds
+API_MAX_BATCH = 100
+
+# maximum size of a request body as sent, and once gzip decompressed (in bytes)
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+
+# JSON responses of the API larger than this are gzip compressed for the clients accepting it (in bytes)
+GZIP_MIN_SIZE = 1024
+
+# rendered routes images that were not used for this long are deleted (in seconds)
+IMAGE_MAX_AGE = 24 * 3600
+IMAGE_CLEANUP_PERIOD = 3600
+
+
+def render_routes_image() -> str:
+    """
+    Renders (or reuses) the image of the routes graph, returns its path relative to the static folder
+    or an empty string if the graph is not displayed.
+    """
+    # matplotlib is only imported when an image is actually needed
+    from graph_rendering import render_universe_graph, MAX_RENDERED_NODES
+
+    millenium_dict = safe_load_json(MILLENIUM_PATH, FALCON_SCHEMA)
+    if millenium_dict is None:
+        return ""
+    db_path = resolve_db_path(MILLENIUM_PATH, millenium_dict)
+    if is_universe_snapshot(db_path):
+        universe = load_universe_snapshot(db_path, millenium_dict["autonomy"])
+        # large graphs are not rendered, they are not converted either
+        universe_graph = (
+            snapshot_graph(universe)
+            if universe is not None and len(universe.names) < MAX_RENDERED_NODES
+            else None
+        )
+    else:
+        universe_graph = build_unvierse_graph(db_path, millenium_dict)
+    with metrics.stage("render_graph"):
+        image_path = render_universe_graph(universe_graph, millenium_dict)
+    return image_path.split("static")[1] if image_path is not None else ""
+
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "827491775492f30454eede9bd3d2614f330f2d1551d0cda5"
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+# larger requests are refused with a 413 before being read
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_SIZE
+
+def cleanup_images_periodically():
+    """
+    Deletes the rendered routes images that were not used recently, runs in a background thread.
+    """
+    from graph_rendering import cleanup_rendered_graphs
+
+    while True:
+        cleanup_rendered_graphs(max_age=IMAGE_MAX_AGE)
+        time.sleep(IMAGE_CLEANUP_PERIOD)
+
+
+threading.Thread(target=cleanup_images_periodically, daemon=True).start()
+
+# instrumentation of all the odds computations of the app, exposed on /metrics
+metrics = SolverStats()
+
+jobs = JobQueue(
+    MILLENIUM_PATH,
+    max_workers=JOB_WORKERS,
+    max_pending=JOB_MAX_PENDING,
+    timeout=JOB_TIMEOUT,
+    metrics=metrics,
+)
 
 
 @app.route("/")
@@ -25,18 +130,70 @@ def home():
     """
     Handles the main page interactions. Show odds computation results if available.
     """
-    if "odds_dict" in session:
-        odds_dict = session["odds_dict"]
-        del session["odds_dict"]
-        return render_template("home.html", messages=odds_dict)
+    job_id = request.args.get("job")
+    if job_id is not None:
+        job_status = jobs.status(job_id)
+        if job_status is None:
+            flash("Unknown or expired odds computation, please upload the Empire file again.")
+        elif job_status["status"] in ("queued", "running"):
+            return render_template(
+                "home.html", messages={"visibility": "hidden", "job_id": job_id}
+            )
+        elif job_status["status"] == "done" and job_status["odds"] is not None:
+            odds_dict = {
+                "odds": job_status["odds"],
+                "itinerary": job_status["itinerary"]
+                    if job_status["itinerary"] is not None
+                    else ["It is not possible to reach the planet in time."],
+                "empire_dict": job_status["empire_dict"],
+                "visibility": "visible",
+                "routes_img": render_routes_image(),
+            }
+            return render_template("home.html", messages=odds_dict)
+        elif job_status["status"] == "timeout":
+            flash("The odds computation took too long and was abandoned.")
+        else:
+            flash("An error occurred during the odds computation.")
     return render_template("home.html", messages={"visibility": "hidden"})
 
 
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    Submits the computation of the odds of an uploaded Empire file, returns the id of the job as JSON.
+    """
+    file = request.files.get("file")
+    empire_dict = None
+    if file is not None and allowed_file(file.filename):
+        empire_dict = safe_parse_json(file.read(), EMPIRE_SCHEMA)
+    if empire_dict is None:
+        return jsonify({"error": "A valid Empire JSON file is expected."}), 400
+
+    job_id = jobs.submit(empire_dict)
+    if job_id is None:
+        return jsonify({"error": "Too many odds computations in progress."}), 503
+    return (
+        jsonify({"job_id": job_id, "status_url": url_for("job_status", job_id=job_id)}),
+        202,
+    )
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id: str):
+    """
+    Returns the status of an odds computation as JSON, with its result once it is done.
+    """
+    job_status = jobs.status(job_id)
+    if job_status is None:
+        return jsonify({"status": "unknown"}), 404
+    return jsonify(job_status)
+
+
 @app.route("/", methods=["GET", "POST"])
 def upload_json():
     """
-    Handles the form submission from the webapp: checks if selected file is correct, saves
-    it and computes the odds using the backend module.
+    Handles the form submission from the webapp: checks if selected file is correct, parses
+    it and submits the computation of the odds to the job queue.
     """
 
     if "file" not in request.files:
@@ -50,31 +207,16 @@ def upload_json():
 
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        setup_upload_folder(app.config["UPLOAD_FOLDER"])
 
-        empire_file_path = os.path.join(
-            os.getcwd(), app.config["UPLOAD_FOLDER"], filename
-        )
-        file.save(empire_file_path)
-        empire_dict = load_empire_dict(empire_file_path)
+        # the upload is parsed in memory, concurrent requests never share any file
+        empire_dict = safe_parse_json(file.read(), EMPIRE_SCHEMA)
         if empire_dict is not None:
-            flash("Successfully loaded JSON Empire file: {}.".format(empire_file_path))
-            redirect(url_for("home"))
-            odds, itinerary = compute_odds(MILLENIUM_PATH, empire_file_path, verbose=True)
-
-            odds_dict = {
-                "odds": odds,
-                "itinerary": itinerary
-                    if itinerary is not None
-                    else ["It is not possible to reach the planet in time."],
-                "empire_dict": empire_dict,
-                "visibility": "visible",
-                "routes_img": GRAPH_SAVE_PATH.split("static")[1]
-                    if os.path.isfile(GRAPH_SAVE_PATH)
-                else "",
-            }
-            session["odds_dict"] = odds_dict
-            return redirect(url_for("home"))
+            job_id = jobs.submit(empire_dict)
+            if job_id is None:
+                flash("Too many odds computations in progress, please try again later.")
+                return redirect(url_for("home"))
+            flash("Successfully loaded JSON Empire file: {}.".format(filename))
+            return redirect(url_for("home", job=job_id))
         else:
             flash(
                 "Error loading JSON Empire file, please try with a proper Empire file."
@@ -85,5 +227,158 @@ def upload_json():
         return redirect(url_for("home"))
 
 
+def json_response(payload, status: int = 200):
+    """
+    Builds a JSON response, gzip compressed if it is large enough and the client accepts it.
+    """
+    body = json.dumps(payload).encode()
+    response = make_response(body, status)
+    response.mimetype = "application/json"
+    response.vary.add("Accept-Encoding")
+    if len(body) >= GZIP_MIN_SIZE and request.accept_encodings.quality("gzip") > 0:
+        response.set_data(gzip.compress(body))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    """
+    Answers the API requests whose body is too large, before or after decompression, with a JSON error.
+    """
+    if request.path.startswith("/api/"):
+        return json_response({"error": "The request body is too large."}, 413)
+    return error
+
+
+def read_json_body():
+    """
+    Reads the JSON body of a request, which may be gzip compressed.
+
+    Raises:
+        - RequestEntityTooLarge: if the body is larger than MAX_REQUEST_SIZE, or MAX_DECOMPRESSED_SIZE
+                                 once decompressed, which is checked while decompressing.
+
+    Returns:
+        - payload: the parsed JSON, None if the body is invalid.
+        - error (str | None): the reason why the body is invalid.
+    """
+    body = request.get_data()
+    if request.content_encoding == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, MAX_DECOMPRESSED_SIZE)
+        except zlib.error:
+            return None, "Invalid gzip request body."
+        if decompressor.unconsumed_tail:
+            raise RequestEntityTooLarge()
+        if not decompressor.eof or decompressor.unused_data:
+            return None, "Invalid gzip request body."
+    try:
+        return json.loads(body), None
+    except ValueError:
+        return None, "The request body is not valid JSON."
+
+
+@app.route("/api/odds", methods=["POST"])
+def api_odds():
+    """
+    Computes the odds of an Empire Communication sent as JSON in the request body, or of each
+    Empire Communication of a JSON array (at most API_MAX_BATCH), and returns the odds and itineraries
+    directly as JSON. The request body may be gzip compressed (Content-Encoding: gzip).
+    The request fails with a 408 if the odds are not all computed within API_TIMEOUT seconds.
+    """
+    payload, error = read_json_body()
+    if error is not None:
+        return json_response({"error": error}, 400)
+    if isinstance(payload, list) and len(payload) > API_MAX_BATCH:
+        return json_response(
+            {"error": "At most {} Empire Communications can be sent at once.".format(API_MAX_BATCH)}, 413
+        )
+    deadline = time.time() + API_TIMEOUT
+
+    def solve(empire_dict) -> dict:
+        if not matches_schema(empire_dict, EMPIRE_SCHEMA):
+            return {"error": "Invalid Empire Communication."}
+        result = compute_job(MILLENIUM_PATH, empire_dict, deadline)
+        metrics.merge(result.pop("stats"))
+        return result
+
+    try:
+        if isinstance(payload, list):
+            return json_response([solve(empire_dict) for empire_dict in payload])
+        result = solve(payload)
+    except SearchTimeout:
+        metrics.count("api_timeouts")
+        return json_response({"error": "The odds could not be computed in time."}, 408)
+    return json_response(result, 400 if "error" in result else 200)
+
+
+@app.route("/api/odds/anytime", methods=["POST"])
+def api_odds_anytime():
+    """
+    Streams improving odds of the Empire Communication sent as JSON in the request body, one JSON object
+    per line, until the best path is found or the time_budget (in seconds, query parameter) is spent.
+    The odds are null (unknown) if the budget runs out before any itinerary is found.
+    """
+    empire_dict, error = read_json_body()
+    if error is None and not matches_schema(empire_dict, EMPIRE_SCHEMA):
+        error = "Invalid Empire Communication."
+    if error is not None:
+        return json_response({"error": error}, 400)
+    time_budget = request.args.get("time_budget", ANYTIME_BUDGET, type=float)
+
+    mission = load_mission(MILLENIUM_PATH, solver="paths")
+    if mission is None:
+        return json_response({"error": "The Millennium Falcon configuration is invalid."}, 500)
+
+    def generate():
+        for result in solve_mission_anytime(mission, empire_dict, time_budget=time_budget):
+            yield json.dumps(result._asdict()) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route("/api/odds/matrix", methods=["POST"])
+def api_odds_matrix():
+    """
+    Streams the odds of the Empire Communication sent as JSON in the request body from each departure to
+    each arrival (repeated departure and arrival query parameters, those of the Falcon by default),
+    one JSON object per departure and line.
+    """
+    empire_dict, error = read_json_body()
+    if error is None and not matches_schema(empire_dict, EMPIRE_SCHEMA):
+        error = "Invalid Empire Communication."
+    if error is not None:
+        return json_response({"error": error}, 400)
+    departures = request.args.getlist("departure") or None
+    arrivals = request.args.getlist("arrival") or None
+
+    mission = load_mission(MILLENIUM_PATH)
+    if mission is None:
+        return json_response({"error": "The Millennium Falcon configuration is invalid."}, 500)
+
+    def generate():
+        for departure, row in solve_mission_matrix(mission, empire_dict, departures, arrivals, metrics):
+            arrivals_odds = {
+                arrival: {"odds": odds, "itinerary": itinerary} for arrival, (odds, itinerary) in row.items()
+            }
+            yield json.dumps({"departure": departure, "arrivals": arrivals_odds}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """
+    Exposes the time spent in each stage of the odds computations and the work counters
+    in the Prometheus text format.
+    """
+    response = make_response(metrics.to_prometheus())
+    response.mimetype = "text/plain"
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return response
+
+
 if __name__ == "__main__":
     app.run()
@@ -1,14 +1,35 @@
 import os
 import sys
 import json
+import tempfile
+import shutil
+import sqlite3
+import gzip
+import pickle
+import time
+import threading
+import tracemalloc
 
 import unittest
+from unittest import mock
+import numpy as np
 
 sys.path.insert(1, "backend/")
+sys.path.insert(1, "benchmark/")
+sys.path.insert(1, "frontend/")
 print(os.path.abspath("../"))
 
-from odd_computation import compute_odds, compute_path_length, compute_encounters
+from odd_computation import SOLVERS, compute_odds, compute_odds_anytime, compute_odds_batch, compute_odds_matrix, load_mission, solve_mission, SolverSession, compute_path_length, compute_encounters, compute_encounters_lower_bound, get_candidate_paths
 from utils import * 
+from solvers import solve_time_expanded, feasible_planets, SearchTimeout
+from universe_csr import CSRAdjacency, read_routes_csr, graph_to_csr, graph_from_csr, snapshot_graph, compile_universe_snapshot, load_universe_snapshot, is_universe_snapshot
+from result_cache import ResultCache, normalize_empire_dict
+from routes_db import RoutesIndex, install_routes_changelog
+from generators import generate_routes, generate_empire, write_mission
+from profiling import SolverStats
+from jobs import JobQueue
+from scoring import odds_array, rank_by_odds, best_by_odds, format_odds
+from fractions import Fraction
 
 
 EXAMPLES_MAIN_FOLDER = "examples/"
@@ -23,6 +44,211 @@ class TestGraphUtils(unittest.TestCase):
         self.assertEqual(compute_path_length(['Tatooine', 'Hoth', 'Endor'], universe_graph, 6), (8, 7, 1))
         self.assertEqual(compute_path_length(['Tatooine', 'Hoth', 'Tatooine', 'Hoth', 'Tatooine', 'Hoth'], universe_graph, 6), (34, 30, 4))
         
+    def test_load_universe_graph_cache(self):
+        db_path = os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/universe.db')
+        clear_graph_cache()
+        universe_graph = load_universe_graph(db_path, 6)
+        self.assertIs(load_universe_graph(db_path, 6), universe_graph)
+        self.assertEqual(load_universe_graph(db_path, 5).number_of_edges(), 3)
+        self.assertIsNone(load_universe_graph(os.path.join(EXAMPLES_MAIN_FOLDER, 'missing.db'), 6))
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            load_universe_graph(db_path, 4, cache_dir)
+            clear_graph_cache()
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            pickled_graph = load_universe_graph(db_path, 4, cache_dir)
+            self.assertEqual(sorted(pickled_graph.edges(data="weight")), sorted(read_routes_graph(db_path, 4).edges(data="weight")))
+
+            # the pickles used last are kept, the oldest ones are deleted
+            graph_pickle = os.listdir(cache_dir)[0]
+            os.utime(os.path.join(cache_dir, graph_pickle), (0, 0))
+            for i in range(GRAPH_PICKLE_CACHE_SIZE):
+                with open(os.path.join(cache_dir, '{}.pickle'.format(i)), 'wb'):
+                    pass
+                os.utime(os.path.join(cache_dir, '{}.pickle'.format(i)), (i, i))
+            clear_graph_cache()
+            load_universe_graph(db_path, 4, cache_dir)
+            load_universe_graph(db_path, 3, cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), GRAPH_PICKLE_CACHE_SIZE)
+            self.assertTrue({graph_pickle, '2.pickle'} <= set(os.listdir(cache_dir)))
+            self.assertFalse({'0.pickle', '1.pickle'} & set(os.listdir(cache_dir)))
+
+    def test_refresh_universe_graph(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db_path = os.path.join(folder, 'universe.db')
+            shutil.copy(os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/universe.db'), db_path)
+
+            def update(query, *args):
+                con = sqlite3.connect(db_path)
+                with con:
+                    con.execute(query, args)
+                con.close()
+                os.utime(db_path, ns=(os.stat(db_path).st_atime_ns, os.stat(db_path).st_mtime_ns + 10 ** 9))
+
+            def edges(graph):
+                return sorted(tuple(sorted((u, v))) + (w,) for u, v, w in graph.edges(data='weight'))
+
+            # without changelog, the appended rows are patched and other changes read everything again
+            clear_graph_cache()
+            universe_graph = load_universe_graph(db_path, 6)
+            original_edges = edges(universe_graph)
+            update("INSERT INTO ROUTES VALUES ('Hoth', 'Yavin', 2), ('Tatooine', 'Hoth', 5), ('Hoth', 'Bespin', 7)")
+            stats = SolverStats()
+            patched_graph = load_universe_graph(db_path, 6, stats=stats)
+            self.assertIsNot(patched_graph, universe_graph)
+            self.assertEqual(edges(universe_graph), original_edges)
+            self.assertEqual((patched_graph.graph['version'], stats.counters['routes_patched']), (1, 2))
+            self.assertEqual(edges(patched_graph), edges(read_routes_graph(db_path, 6)))
+            update("DELETE FROM ROUTES WHERE origin = 'Hoth' AND destination = 'Yavin'")
+            stats = SolverStats()
+            self.assertEqual(edges(load_universe_graph(db_path, 6, stats=stats)), edges(read_routes_graph(db_path, 6)))
+            self.assertEqual(stats.counters['routes_loaded'], len(edges(read_routes_graph(db_path, 6))))
+
+            # with a changelog, only the changed rows are read
+            install_routes_changelog(db_path)
+            clear_graph_cache()
+            universe_graph = load_universe_graph(db_path, 6)
+            update("INSERT INTO ROUTES VALUES ('Hoth', 'Yavin', 2)")
+            update("DELETE FROM ROUTES WHERE origin = 'Dagobah' AND destination = 'Endor'")
+            stats = SolverStats()
+            patched_graph = load_universe_graph(db_path, 6, stats=stats)
+            self.assertEqual((patched_graph.graph['version'], stats.counters['routes_patched']), (1, 2))
+            self.assertEqual(edges(patched_graph), edges(read_routes_graph(db_path, 6)))
+            self.assertEqual(sorted(patched_graph.nodes), sorted(read_routes_graph(db_path, 6).nodes))
+
+            update("DELETE FROM ROUTES WHERE origin = 'Hoth' AND destination = 'Yavin'")
+            self.assertEqual(edges(load_universe_graph(db_path, 6)), edges(read_routes_graph(db_path, 6)))
+            update("UPDATE ROUTES SET travel_time = 1 WHERE origin = 'Tatooine' AND destination = 'Dagobah'")
+            stats = SolverStats()
+            patched_graph = load_universe_graph(db_path, 6, stats=stats)
+            self.assertEqual((patched_graph.graph['version'], stats.counters['routes_patched']), (3, 1))
+            self.assertEqual(edges(patched_graph), edges(read_routes_graph(db_path, 6)))
+            self.assertNotIn('routes_loaded', stats.counters)
+            ROUTES_DB_POOL.close_all()
+        self.assertIsNone(read_routes_graph(db_path, 6))
+
+    def test_copy_graph(self):
+        universe_graph = read_routes_graph(os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/universe.db'), 6)
+        universe_graph.graph['version'] = 1
+        original = universe_graph.copy()
+        pairs = {('Dagobah', 'Endor'), ('Hoth', 'Tatooine'), ('Hoth', 'Yavin')}
+
+        def patch(graph):
+            graph['Dagobah']['Endor']['weight'] = 5
+            graph.remove_edge('Hoth', 'Tatooine')
+            graph.add_edge('Hoth', 'Yavin', weight=2)
+            return graph
+
+        def dump(graph):
+            return graph.graph, dict(graph.nodes(data=True)), sorted(tuple(sorted((u, v))) + (sorted(data.items()),) for u, v, data in graph.edges(data=True))
+
+        # the patched copy is the same as a patched graph.copy(), and the graph is left unchanged
+        self.assertEqual(dump(patch(RoutesIndex._copy_graph(universe_graph, pairs))), dump(patch(universe_graph.copy())))
+        self.assertEqual(dump(universe_graph), dump(original))
+
+    def test_universe_csr(self):
+        db_path = os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/universe.db')
+        millennium_dict = safe_load_json(os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/millennium-falcon.json'), FALCON_SCHEMA)
+        universe_graph = read_routes_graph(db_path, 6)
+        universe = read_routes_csr(db_path, 6)
+        self.assertEqual(len(universe.names), universe_graph.number_of_nodes())
+        self.assertEqual(len(universe.neighbors), 2 * universe_graph.number_of_edges())
+        converted = graph_to_csr(universe_graph)
+        self.assertEqual(
+            {(converted.names[i], converted.names[converted.neighbors[k]], converted.weights[k]) for i in range(len(converted.names)) for k in range(converted.offsets[i], converted.offsets[i + 1])},
+            {(u, v, w) for u, v, w in universe_graph.edges(data='weight')} | {(v, u, w) for u, v, w in universe_graph.edges(data='weight')},
+        )
+        for countdown in range(6, 11):
+            empire_dict = {'countdown': countdown, 'bounty_hunters': [{'planet': 'Hoth', 'day': day} for day in (6, 7, 8)]}
+            self.assertEqual(solve_time_expanded(universe, millennium_dict, empire_dict), solve_time_expanded(universe_graph, millennium_dict, empire_dict))
+
+    def test_universe_snapshot(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for example_folder in os.listdir(EXAMPLES_MAIN_FOLDER):
+                millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, example_folder, 'millennium-falcon.json')
+                empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, example_folder, 'empire.json')
+                millennium_dict = safe_load_json(millenium_path, FALCON_SCHEMA)
+                snapshot_path = os.path.join(folder, example_folder + '.csr')
+                compile_universe_snapshot(resolve_db_path(millenium_path, millennium_dict), snapshot_path)
+                self.assertTrue(is_universe_snapshot(snapshot_path))
+                snapshot_millenium_path = os.path.join(folder, example_folder + '.json')
+                with open(snapshot_millenium_path, 'w') as f:
+                    json.dump(dict(millennium_dict, routes_db=snapshot_path), f)
+                for solver in ['dp', 'bidir', 'paths']:
+                    self.assertEqual(compute_odds(snapshot_millenium_path, empire_path, solver=solver)[0], compute_odds(millenium_path, empire_path, solver=solver)[0])
+                self.assertEqual(list(compute_odds_anytime(snapshot_millenium_path, empire_path))[-1].odds, compute_odds(millenium_path, empire_path)[0])
+                # the graph of the snapshot is converted once, the missions prepared on it are reused
+                stats = SolverStats()
+                compute_odds(snapshot_millenium_path, empire_path, solver="paths", stats=stats)
+                self.assertEqual(stats.to_dict()["counters"]["mission_cache_hits"], 1)
+                universe = load_universe_snapshot(snapshot_path, millennium_dict["autonomy"])
+                self.assertIs(load_mission(snapshot_millenium_path, solver="paths").universe_graph, snapshot_graph(universe))
+
+            db_path = os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/universe.db')
+            compile_universe_snapshot(db_path, snapshot_path, autonomy=6)
+            universe = load_universe_snapshot(snapshot_path, 6)
+            self.assertIsInstance(universe.neighbors, np.memmap)
+            # the routes are read from the mapped arrays on each visit, no adjacency list is built
+            adjacency = CSRAdjacency(universe)
+            graph = read_routes_graph(db_path, 6)
+            for node, name in enumerate(universe.names):
+                self.assertEqual(sorted((universe.names[neighbor], weight) for neighbor, weight in adjacency[node]), sorted((neighbor, graph[name][neighbor]["weight"]) for neighbor in graph[name]))
+            self.assertEqual(set(vars(adjacency)), {"offsets", "neighbors", "weights", "_n_planets"})
+            # names are looked up in the snapshot, without building a dict of all of them
+            self.assertEqual([universe.index[name] for name in universe.names], list(range(len(universe.names))))
+            self.assertNotIn('Naboo', universe.index)
+            self.assertEqual(sorted(universe.names), sorted(read_routes_graph(db_path, 6).nodes))
+            universe = load_universe_snapshot(snapshot_path, 5)
+            self.assertEqual(sorted(graph_from_csr(universe).edges(data='weight')), sorted(read_routes_graph(db_path, 5).edges(data='weight')))
+            self.assertIsNone(load_universe_snapshot(snapshot_path, 7))
+            self.assertFalse(is_universe_snapshot(db_path))
+
+    def test_render_universe_graph(self):
+        from graph_rendering import render_universe_graph, cleanup_rendered_graphs
+
+        millennium_dict = safe_load_json(os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/millennium-falcon.json'), FALCON_SCHEMA)
+        universe_graph = build_unvierse_graph(os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/universe.db'), millennium_dict)
+        with tempfile.TemporaryDirectory() as save_folder:
+            image_path = render_universe_graph(universe_graph, millennium_dict, save_folder)
+            self.assertTrue(os.path.isfile(image_path))
+            self.assertEqual(render_universe_graph(universe_graph, millennium_dict, save_folder), image_path)
+            self.assertEqual(os.listdir(save_folder), [os.path.basename(image_path)])
+            self.assertEqual(cleanup_rendered_graphs(save_folder, max_age=3600), 0)
+            self.assertEqual(cleanup_rendered_graphs(save_folder, max_age=-1), 1)
+            self.assertEqual(os.listdir(save_folder), [])
+
+            # a failed rendering leaves no temporary file behind
+            with mock.patch("graph_rendering.Figure.savefig", side_effect=OSError("disk full")):
+                self.assertIsNone(render_universe_graph(universe_graph, millennium_dict, save_folder))
+            self.assertEqual(os.listdir(save_folder), [])
+
+    def test_candidate_paths(self):
+        universe_graph = read_routes_graph(os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/universe.db'), 6)
+        candidate_paths = get_candidate_paths(universe_graph, 'Tatooine', 'Endor', 6)
+        self.assertIs(get_candidate_paths(universe_graph, 'Tatooine', 'Endor', 6), candidate_paths)
+        self.assertIsNot(get_candidate_paths(universe_graph, 'Tatooine', 'Endor', 5), candidate_paths)
+        # the enumeration in the feasible planets of a countdown is cached for this countdown
+        feasible_paths = get_candidate_paths(universe_graph, 'Tatooine', 'Endor', 6, 8, {'Tatooine', 'Hoth', 'Endor'})
+        self.assertEqual([candidate.path for candidate in feasible_paths.iter_candidates(8)], [['Tatooine', 'Hoth', 'Endor']])
+        self.assertIs(get_candidate_paths(universe_graph, 'Tatooine', 'Endor', 6, 8, {'Tatooine', 'Hoth', 'Endor'}), feasible_paths)
+        self.assertIsNot(get_candidate_paths(universe_graph, 'Tatooine', 'Endor', 6, 9, {'Tatooine', 'Hoth', 'Endor'}), feasible_paths)
+
+        # the travel time of 7 days needs a refuel with an autonomy of 6
+        self.assertEqual([candidate.path for candidate in candidate_paths.iter_candidates(7)], [])
+        self.assertEqual([candidate.path for candidate in candidate_paths.iter_candidates(8)], [['Tatooine', 'Hoth', 'Endor']])
+        candidates = list(candidate_paths.iter_candidates())
+        self.assertEqual([candidate.total_length for candidate in candidates], [8, 9, 11, 12])
+        self.assertEqual(candidates[0].earliest_arrivals, [0, 6, 8])
+        self.assertEqual(candidates[0].remaining_lengths, [8, 1, 0])
+
+    def test_feasible_planets(self):
+        from_departure = {'Tatooine': 0, 'Dagobah': 6, 'Hoth': 6, 'Endor': 7}
+        to_arrival = {'Tatooine': 7, 'Dagobah': 4, 'Hoth': 1, 'Endor': 0}
+        self.assertEqual(feasible_planets(from_departure, to_arrival, 6, 7), set())
+        self.assertEqual(feasible_planets(from_departure, to_arrival, 6, 8), {'Tatooine', 'Hoth', 'Endor'})
+        self.assertEqual(feasible_planets(from_departure, to_arrival, 6, 11), {'Tatooine', 'Dagobah', 'Hoth', 'Endor'})
+        self.assertEqual(feasible_planets(from_departure, {'Endor': 0}, 10, 11), {'Endor'})
+
     def test_compute_encounters(self):
         self.assertEqual(compute_encounters(['Tatooine', 'Hoth'], [(0,0),(6,6)], {'Tatooine': {0,1,2}, 'Hoth': {4,5,6}}), 2)
         self.assertEqual(compute_encounters(['Tatooine', 'Hoth', 'Endor'], [(0,0),(6,7),(8,8)], {'Hoth': {6,7,8}}), 2)
@@ -31,6 +257,92 @@ class TestGraphUtils(unittest.TestCase):
         self.assertEqual(compute_encounters(['Tatooine', 'Dagobah', 'Hoth', 'Endor'], [(0,0),(6,7),(8,8),(9,9)], {'Hoth': {6,7,8}}), 1)
         self.assertEqual(compute_encounters(['Tatooine', 'Dagobah', 'Hoth', 'Endor'], [(0,1),(7,8),(9,9),(10,10)], {'Hoth': {6,7,8}}), 0)
 
+    def test_build_bounty_index(self):
+        bounty_hunters = [{'planet': 'Hoth', 'day': 6}, {'planet': 'Hoth', 'day': 7}, {'planet': 'Hoth', 'day': 8}, {'planet': 'Hoth', 'day': 8}]
+        bounty_index = build_bounty_index(bounty_hunters, 10)
+        self.assertEqual(bounty_index, {'Hoth': 0b111000000})
+        # the days after the countdown are not indexed, whatever their value
+        self.assertEqual(build_bounty_index(bounty_hunters + [{'planet': 'Hoth', 'day': 2 * 10**9}, {'planet': 'Endor', 'day': 11}], 10), bounty_index)
+        self.assertEqual(build_bounty_index(bounty_hunters, 7), {'Hoth': 0b11000000})
+        self.assertEqual(count_days(bounty_index['Hoth'], 7, 10), 2)
+        self.assertEqual(compute_encounters(['Tatooine', 'Hoth', 'Endor'], [(0,0),(6,7),(8,8)], bounty_index), 2)
+        self.assertEqual(compute_encounters(['Hoth', 'Endor', 'Hoth'], [(0,0),(1,6),(7,8)], bounty_index), 2)
+
+    def test_load_empire_index(self):
+        for example_folder in sorted(os.listdir(EXAMPLES_MAIN_FOLDER)):
+            empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, example_folder, "empire.json")
+            empire_dict = safe_load_json(empire_path, EMPIRE_SCHEMA)
+            indexed = load_empire_index(empire_path)
+            self.assertEqual(indexed, {"countdown": empire_dict["countdown"]})
+            self.assertEqual(indexed.bounty_index, build_bounty_index(empire_dict["bounty_hunters"], empire_dict["countdown"]))
+
+        with tempfile.TemporaryDirectory() as folder:
+            empire_path = os.path.join(folder, "empire.json")
+            for content, expected in [
+                ({"countdown": 7, "bounty_hunters": [{"planet": "Hoth", "day": 6}, {"planet": "Hoth", "day": -1}, {"planet": "Endor", "day": 1}]}, {"Hoth": 1 << 6, "Endor": 2}),
+                ({"countdown": 7, "bounty_hunters": []}, {}),
+                ({"countdown": 7, "bounty_hunters": [{"planet": "Hoth", "day": 7}, {"planet": "Hoth", "day": 2 * 10**9}]}, {"Hoth": 1 << 7}),
+                # only the entries of the bounty_hunters list are bounty hunters
+                ({"countdown": 7, "bounty_hunters": [], "meta": {"source": {"planet": "Hoth", "day": 6}}}, {}),
+                ({"countdown": 7, "bounty_hunters": [{"planet": "Hoth", "day": 6, "note": {"planet": 3}}]}, {"Hoth": 1 << 6}),
+                ({"countdown": 7, "bounty_hunters": [{"planet": "Hoth", "day": "6"}]}, None),
+                ({"countdown": 7, "bounty_hunters": [{"planet": "Hoth"}]}, None),
+                ({"countdown": 7, "bounty_hunters": [{}]}, None),
+                ({"countdown": 7, "bounty_hunters": [1]}, None),
+                ({"countdown": True, "bounty_hunters": []}, None),
+                ({"planet": "Hoth", "day": 6}, None),
+                # the countdown may come after the bounty hunters
+                ({"bounty_hunters": [{"planet": "Hoth", "day": 6}, {"planet": "Hoth", "day": 9}], "countdown": 7}, {"Hoth": 1 << 6}),
+                ({"bounty_hunters": [], "countdown": 7, "meta": [1.5e3, "]", {"a": None}]}, {}),
+            ]:
+                with open(empire_path, "w") as f:
+                    json.dump(content, f, indent=1)
+                # values cut by the chunks of the file are decoded whole
+                for chunk_size in [JSON_CHUNK_SIZE, 1, 5]:
+                    with mock.patch("utils.JSON_CHUNK_SIZE", chunk_size):
+                        indexed = load_empire_index(empire_path)
+                    if expected is None:
+                        self.assertIsNone(indexed)
+                    else:
+                        self.assertEqual(indexed, {"countdown": content["countdown"]})
+                        self.assertEqual(indexed.bounty_index, expected)
+                        self.assertEqual(indexed.bounty_index, build_bounty_index(content["bounty_hunters"], content["countdown"]))
+                        self.assertEqual(indexed.late_hunters, empire_late_hunters(content))
+
+            for content in ['{"countdown": 7, "bounty_hunters": [], "countdown": 8}', '{"countdown": 7, "bounty_hunters": []} []', '{"countdown": 7, "bounty_hunters": [}']:
+                with open(empire_path, "w") as f:
+                    f.write(content)
+                self.assertIsNone(load_empire_index(empire_path))
+
+            # the bounty hunters are indexed as they are read, the list is never built
+            with open(empire_path, "w") as f:
+                json.dump({"countdown": 100, "bounty_hunters": [{"planet": "P%d" % (i % 100), "day": i % 150} for i in range(50000)]}, f)
+            tracemalloc.start()
+            try:
+                indexed = load_empire_index(empire_path)
+                indexed_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.reset_peak()
+                empire_dict = safe_load_json(empire_path, EMPIRE_SCHEMA)
+                loaded_peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(indexed.bounty_index, build_bounty_index(empire_dict["bounty_hunters"], 100))
+            self.assertLess(indexed_peak, loaded_peak / 10)
+
+        # a bounty_index sent by a client is not trusted over its bounty hunters
+        forged = {"countdown": 7, "bounty_hunters": [], "bounty_index": {"Hoth": 1 << 6}}
+        self.assertEqual(empire_bounty_index(forged), {})
+        self.assertEqual(pickle.loads(pickle.dumps(IndexedEmpire(7, {"Hoth": 2}))).bounty_index, {"Hoth": 2})
+
+    def test_compute_encounters_lower_bound(self):
+        millennium_dict = safe_load_json(os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/millennium-falcon.json'), FALCON_SCHEMA)
+        universe_graph = build_unvierse_graph(os.path.join(EXAMPLES_MAIN_FOLDER, 'example1/universe.db'), millennium_dict)
+        path = ['Tatooine', 'Hoth', 'Endor']
+        self.assertEqual(compute_encounters_lower_bound(path, universe_graph, {'Hoth': {6,7,8}}, 6, 8), 1)
+        self.assertEqual(compute_encounters_lower_bound(path, universe_graph, {'Hoth': {6,7,8}}, 6, 9), 1)
+        self.assertEqual(compute_encounters_lower_bound(path, universe_graph, {'Hoth': {6,7,8}}, 6, 10), 0)
+        self.assertEqual(compute_encounters_lower_bound(path, universe_graph, {'Tatooine': {0}, 'Hoth': {6,7,8}}, 6, 8), 2)
+
     def test_correctness(self):
         n_examples = 0
         success = 0
@@ -47,6 +359,337 @@ class TestGraphUtils(unittest.TestCase):
             )
             self.assertAlmostEqual(odds / 100, answer, places=5)
 
+    def test_compute_odds_batch(self):
+        millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example1", "millennium-falcon.json")
+        empire_paths = [os.path.join(EXAMPLES_MAIN_FOLDER, example_folder, "empire.json") for example_folder in sorted(os.listdir(EXAMPLES_MAIN_FOLDER))]
+        results = list(compute_odds_batch(millenium_path, empire_paths + [os.path.join(EXAMPLES_MAIN_FOLDER, "missing.json")]))
+
+        self.assertEqual([empire_path for empire_path, _, _ in results], empire_paths + [os.path.join(EXAMPLES_MAIN_FOLDER, "missing.json")])
+        for (empire_path, odds, itinerary) in results[:-1]:
+            self.assertEqual((odds, itinerary), compute_odds(millenium_path, empire_path))
+        self.assertEqual(results[-1][1:], (None, None))
+
+        self.assertEqual(list(compute_odds_batch(millenium_path, empire_paths, workers=2)), results[:-1])
+
+    def test_parallel_paths(self):
+        import odd_computation
+
+        millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example1", "millennium-falcon.json")
+        pools = set()
+        for example_folder in sorted(os.listdir(EXAMPLES_MAIN_FOLDER)):
+            empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, example_folder, "empire.json")
+            self.assertEqual(
+                compute_odds(millenium_path, empire_path, solver="paths", workers=2),
+                compute_odds(millenium_path, empire_path, solver="paths"),
+            )
+            pools.add(odd_computation._path_pool)
+        # the worker processes are reused by the computations on the same graph,
+        # the first Empire Communication is infeasible and does not start them
+        self.assertEqual(len(pools - {None}), 1)
+
+        stats = SolverStats()
+        compute_odds(millenium_path, empire_path, solver="paths", workers=2, stats=stats)
+        self.assertGreater(stats.to_dict()["counters"]["paths_evaluated"], 0)
+        odd_computation.shutdown_path_pool()
+        self.assertIsNone(odd_computation._path_pool)
+
+    def test_solvers_agree(self):
+        for example_folder in os.listdir(EXAMPLES_MAIN_FOLDER):
+            millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, example_folder, "millennium-falcon.json")
+            empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, example_folder, "empire.json")
+
+            dp_odds, dp_itinerary = compute_odds(millenium_path, empire_path, solver="dp")
+            paths_odds, paths_itinerary = compute_odds(millenium_path, empire_path, solver="paths")
+            self.assertAlmostEqual(dp_odds, paths_odds, places=5)
+            self.assertEqual(dp_itinerary is None, paths_itinerary is None)
+            self.assertEqual(compute_odds(millenium_path, empire_path, solver="bidir")[0], dp_odds)
+
+    def test_bidirectional(self):
+        routes = generate_routes(60, degree=3, seed=2)
+        empire_dict = generate_empire(60, 40, hunter_density=0.3, seed=2)
+        # the arrival is guarded every day, the forward search alone keeps the states without encounter until the countdown
+        empire_dict["bounty_hunters"] += [{"planet": "P00059", "day": day} for day in range(41)]
+        with tempfile.TemporaryDirectory() as folder:
+            millenium_path, empire_path = write_mission(folder, routes, empire_dict, 4, "P00000", "P00059")
+            dp_stats, bidir_stats = SolverStats(), SolverStats()
+            dp_odds = compute_odds(millenium_path, empire_path, solver="dp", stats=dp_stats)[0]
+            self.assertEqual(compute_odds(millenium_path, empire_path, solver="bidir", stats=bidir_stats)[0], dp_odds)
+            self.assertLess(bidir_stats.counters["states_expanded"], dp_stats.counters["states_expanded"])
+
+    def test_result_cache(self):
+        self.assertEqual(
+            normalize_empire_dict({"countdown": 7, "bounty_hunters": [{"planet": "Hoth", "day": 7}, {"planet": "Endor", "day": 1}, {"planet": "Hoth", "day": 7}]}),
+            {"countdown": 7, "bounty_hunters": [{"planet": "Endor", "day": 1}, {"planet": "Hoth", "day": 7}]},
+        )
+
+        millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example2", "millennium-falcon.json")
+        empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example2", "empire.json")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            result_cache = ResultCache(db_path=os.path.join(cache_dir, "results.db"))
+            expected = compute_odds(millenium_path, empire_path)
+            self.assertEqual(compute_odds(millenium_path, empire_path, result_cache=result_cache), expected)
+            self.assertEqual(compute_odds(millenium_path, empire_path, result_cache=result_cache), expected)
+            self.assertEqual(result_cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+
+            # a new cache on the same file reuses the persisted results
+            result_cache = ResultCache(db_path=os.path.join(cache_dir, "results.db"))
+            self.assertEqual(compute_odds(millenium_path, empire_path, result_cache=result_cache), expected)
+            self.assertEqual(result_cache.stats(), {"hits": 1, "misses": 0, "size": 1})
+
+            result_cache = ResultCache(ttl=0)
+            compute_odds(millenium_path, empire_path, result_cache=result_cache)
+            compute_odds(millenium_path, empire_path, result_cache=result_cache)
+            self.assertEqual(result_cache.stats()["misses"], 2)
+
+    def test_anytime(self):
+        for example_folder in sorted(os.listdir(EXAMPLES_MAIN_FOLDER)):
+            millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, example_folder, "millennium-falcon.json")
+            empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, example_folder, "empire.json")
+            results = list(compute_odds_anytime(millenium_path, empire_path))
+            self.assertTrue(results[-1].optimal)
+            self.assertEqual((results[-1].odds, results[-1].itinerary), compute_odds(millenium_path, empire_path, solver="paths"))
+            self.assertEqual([result.odds for result in results], sorted(result.odds for result in results))
+            self.assertTrue(all(result.odds <= result.upper_bound for result in results))
+
+        millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example3", "millennium-falcon.json")
+        empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example3", "empire.json")
+        results = list(compute_odds_anytime(millenium_path, empire_path, max_paths=0))
+        self.assertEqual(results, [(None, None, False, 100)])
+        self.assertEqual(compute_odds(millenium_path, empire_path, max_paths=0), (None, None))
+        self.assertRaises(ValueError, compute_odds, millenium_path, empire_path, solver="dp", max_paths=0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result_cache = ResultCache(db_path=os.path.join(tmp_dir, "results.db"))
+            self.assertEqual(compute_odds(millenium_path, empire_path, max_paths=0, result_cache=result_cache), (None, None))
+            self.assertEqual(compute_odds(millenium_path, empire_path, max_paths=0, result_cache=result_cache), (None, None))
+            self.assertTrue(list(compute_odds_anytime(millenium_path, empire_path, result_cache=result_cache))[-1].optimal)
+            self.assertEqual(compute_odds(millenium_path, empire_path, max_paths=0, result_cache=result_cache), (90, compute_odds(millenium_path, empire_path)[1]))
+        self.assertEqual(compute_odds(millenium_path, empire_path, time_budget=60), compute_odds(millenium_path, empire_path, solver="paths"))
+
+    def test_profiling(self):
+        millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example3", "millennium-falcon.json")
+        empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example3", "empire.json")
+        for solver in ["dp", "paths"]:
+            stats = SolverStats()
+            self.assertEqual(compute_odds(millenium_path, empire_path, solver=solver, stats=stats), compute_odds(millenium_path, empire_path, solver=solver))
+            stats = stats.to_dict()
+            self.assertIn("solve_" + solver, stats["timings"])
+            self.assertEqual(stats["calls"]["load_json"], 1)
+            self.assertGreater(stats["counters"]["states_expanded"], 0)
+        self.assertGreater(stats["counters"]["paths_evaluated"], 0)
+
+    def test_scoring(self):
+        self.assertEqual([encounters_to_odds(k) for k in range(4)], [100, 90, 81, 72.9])
+        self.assertEqual(encounters_to_odds(3, exact=True), Fraction(729, 10))
+        self.assertEqual(encounters_to_odds(2, capture_probability=0.2), 64)
+        self.assertEqual(encounters_to_odds(2, "1/3", exact=True), Fraction(400, 9))
+        self.assertEqual(encounters_to_odds(2, Fraction(1, 3)), Fraction(400, 9))
+        for k in range(30):
+            self.assertAlmostEqual(encounters_to_odds(k), float(encounters_to_odds(k, exact=True)), places=10)
+        for capture_probability in [0.1, 0.25, 0, 1]:
+            self.assertEqual(list(odds_array(list(range(200)) + [None], capture_probability)), [encounters_to_odds(k, capture_probability) for k in range(200)] + [0])
+        self.assertEqual(list(odds_array([3, None], Fraction(1, 10))), [Fraction(729, 10), 0])
+        self.assertEqual(list(rank_by_odds([2, None, 1, 1])), [2, 3, 0, 1])
+        self.assertEqual(best_by_odds([2, None, 1, 1]), 2)
+        self.assertIsNone(best_by_odds([None, None]))
+        self.assertEqual(format_odds(Fraction(729, 10)), "729/10% (72.9%)")
+
+        millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example3", "millennium-falcon.json")
+        empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example3", "empire.json")
+        for solver in ["dp", "paths"]:
+            self.assertEqual(compute_odds(millenium_path, empire_path, solver=solver, capture_probability=0.2)[0], 80)
+        # the exact odds are reachable from the API and are never cached as floats
+        for solver in SOLVERS:
+            self.assertEqual(compute_odds(os.path.join(EXAMPLES_MAIN_FOLDER, "example2", "millennium-falcon.json"), os.path.join(EXAMPLES_MAIN_FOLDER, "example2", "empire.json"), solver=solver, capture_probability=Fraction(1, 10))[0], Fraction(81))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result_cache = ResultCache(db_path=os.path.join(tmp_dir, "results.db"))
+            compute_odds(millenium_path, empire_path, result_cache=result_cache)
+            self.assertIsInstance(compute_odds(millenium_path, empire_path, result_cache=result_cache, capture_probability=Fraction(1, 10))[0], Fraction)
+
+    def test_solver_session(self):
+        mission = load_mission(os.path.join(EXAMPLES_MAIN_FOLDER, "example2", "millennium-falcon.json"))
+        empire_dict = load_empire_dict(os.path.join(EXAMPLES_MAIN_FOLDER, "example2", "empire.json"))
+        session = SolverSession(mission, empire_dict)
+        self.assertEqual(session.solve(), solve_mission(mission, empire_dict))
+        updates = [
+            ("remove_hunter", "Hoth", 6), ("remove_hunter", "Hoth", 7), ("add_hunter", "Tatooine", 0),
+            ("set_countdown", 9), ("set_countdown", 10), ("add_hunter", "Dagobah", 7), ("set_countdown", 6),
+        ]
+        for method, *arguments in updates:
+            getattr(session, method)(*arguments)
+            self.assertEqual(session.solve(), solve_mission(mission, session.empire_dict()))
+        self.assertEqual(session.solve()[0], 0)
+        # the bounty hunters after the countdown are indexed when it is raised
+        session.add_hunter("Hoth", 2 * 10**9)
+        self.assertEqual(session.empire_dict().late_hunters, {("Hoth", 8), ("Dagobah", 7), ("Hoth", 2 * 10**9)})
+        session.set_countdown(10)
+        self.assertEqual(session.empire_dict().bounty_index, {"Hoth": 1 << 8, "Tatooine": 1, "Dagobah": 1 << 7})
+        self.assertEqual(session.solve(), solve_mission(mission, session.empire_dict()))
+        # a long countdown only costs the days the Falcon can travel
+        self.assertEqual(solve_mission(mission, {"countdown": 10**9, "bounty_hunters": [{"planet": "Hoth", "day": 10**9}]})[0], 100)
+        self.assertRaises(ValueError, SolverSession, load_mission(os.path.join(EXAMPLES_MAIN_FOLDER, "example2", "millennium-falcon.json"), "paths"), empire_dict)
+
+    def test_deadline(self):
+        empire_dict = load_empire_dict(os.path.join(EXAMPLES_MAIN_FOLDER, "example3", "empire.json"))
+        for solver in ["dp", "bidir", "paths"]:
+            mission = load_mission(os.path.join(EXAMPLES_MAIN_FOLDER, "example3", "millennium-falcon.json"), solver)
+            self.assertRaises(SearchTimeout, solve_mission, mission, empire_dict, deadline=time.time() - 1)
+            self.assertEqual(solve_mission(mission, empire_dict, deadline=time.time() + 60), solve_mission(mission, empire_dict))
+
+    def test_job_queue(self):
+        millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example2", "millennium-falcon.json")
+        empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example2", "empire.json")
+        empire_dict = safe_load_json(empire_path, EMPIRE_SCHEMA)
+
+        def wait_for(condition):
+            deadline = time.monotonic() + 10
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(condition())
+
+        metrics = SolverStats()
+        jobs = JobQueue(millenium_path, max_workers=1, max_pending=2, metrics=metrics)
+        job_id = jobs.submit(empire_dict)
+        wait_for(lambda: jobs.status(job_id)["status"] == "done")
+        job_status = jobs.status(job_id)
+        self.assertEqual([job_status["odds"], job_status["empire_dict"]], [compute_odds(millenium_path, empire_path)[0], empire_dict])
+        # the instrumentation of the job is merged into the metrics by the done callback
+        wait_for(lambda: metrics.counters["jobs_done"] == 1)
+        self.assertGreater(metrics.counters["states_expanded"], 0)
+        self.assertIsNone(jobs.status("unknown"))
+
+        release = threading.Event()
+        blocked = lambda *args: release.wait(10) and {"odds": 100, "itinerary": [], "stats": SolverStats().to_dict()}
+        with mock.patch("jobs.compute_job", blocked):
+            pending = [jobs.submit(empire_dict), jobs.submit(empire_dict)]
+            self.assertIsNone(jobs.submit(empire_dict))
+            self.assertEqual(jobs.pending(), 2)
+            release.set()
+            wait_for(lambda: all(jobs.status(job_id)["status"] == "done" for job_id in pending))
+        self.assertIsNotNone(jobs.submit(empire_dict))
+        with mock.patch("jobs.compute_job", mock.Mock(side_effect=RuntimeError)):
+            job_id = jobs.submit(empire_dict)
+            wait_for(lambda: jobs.status(job_id)["status"] == "failed")
+        wait_for(lambda: metrics.counters["jobs_failed"] == 1)
+        jobs.shutdown()
+
+        # the timeout is recorded by the watchdog, without polling the job
+        release = threading.Event()
+        jobs = JobQueue(millenium_path, max_workers=1, timeout=0.05, result_ttl=0.1, metrics=metrics)
+        with mock.patch("jobs.compute_job", lambda *args: release.wait(10) and {}):
+            job_id = jobs.submit(empire_dict)
+            wait_for(lambda: metrics.counters["jobs_timeout"] == 1)
+            self.assertEqual(jobs.status(job_id), {"status": "timeout"})
+            release.set()
+        # the search itself stops at the deadline
+        with mock.patch("jobs.solve_mission", mock.Mock(side_effect=SearchTimeout)):
+            timed_out = jobs.submit(empire_dict)
+            wait_for(lambda: metrics.counters["jobs_timeout"] == 2)
+        self.assertEqual(jobs.status(timed_out), {"status": "timeout"})
+        # finished jobs are forgotten after result_ttl, on the next submission
+        time.sleep(0.2)
+        jobs.submit(empire_dict)
+        self.assertIsNone(jobs.status(job_id))
+        self.assertIsNone(jobs.status(timed_out))
+        jobs.shutdown()
+
+    def test_api(self):
+        import main
+
+        client = main.app.test_client()
+        millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example2", "millennium-falcon.json")
+        empire_dicts = [safe_load_json(os.path.join(EXAMPLES_MAIN_FOLDER, example, "empire.json"), EMPIRE_SCHEMA) for example in ["example2", "example3"]]
+        expected = [solve_mission(load_mission(millenium_path), empire_dict) for empire_dict in empire_dicts]
+
+        response = client.post("/api/odds", json=empire_dicts[0])
+        self.assertEqual((response.status_code, response.json["odds"], response.json["itinerary"]), (200, *expected[0]))
+        self.assertNotIn("stats", response.json)
+        # the bounty hunters of planets that are not in the routes are ignored
+        unknown_planet = dict(empire_dicts[0], bounty_hunters=empire_dicts[0]["bounty_hunters"] + [{"planet": "Naboo", "day": 1}])
+        self.assertEqual(client.post("/api/odds", json=unknown_planet).json["odds"], expected[0][0])
+
+        response = client.post("/api/odds", json=empire_dicts + [{"countdown": 3}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result.get("odds") for result in response.json], [odds for odds, _ in expected] + [None])
+        self.assertEqual(response.json[2], {"error": "Invalid Empire Communication."})
+
+        # gzip request bodies, and gzip responses for the clients accepting them when they are large
+        response = client.post("/api/odds", data=gzip.compress(json.dumps(empire_dicts[1]).encode()), headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+        self.assertEqual(response.json["odds"], expected[1][0])
+        response = client.post("/api/odds", json=empire_dicts * 10, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual((response.headers.get("Content-Encoding"), response.headers.get("Vary")), ("gzip", "Accept-Encoding"))
+        self.assertEqual(len(json.loads(gzip.decompress(response.data))), 20)
+        self.assertIsNone(client.post("/api/odds", json=empire_dicts * 10).headers.get("Content-Encoding"))
+        self.assertIsNone(client.post("/api/odds", json=empire_dicts[0], headers={"Accept-Encoding": "gzip"}).headers.get("Content-Encoding"))
+
+        for url in ["/api/odds", "/api/odds/anytime", "/api/odds/matrix"]:
+            for body, headers in [(b"nope", {}), (b"nope", {"Content-Encoding": "gzip"}), (json.dumps({"countdown": "3", "bounty_hunters": []}).encode(), {})]:
+                response = client.post(url, data=body, headers=headers)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json)
+
+        # the size of the requests, the number of Empire Communications and the time spent are bounded
+        response = client.post("/api/odds", json=empire_dicts * (main.API_MAX_BATCH // 2 + 1))
+        self.assertEqual((response.status_code, "error" in response.json), (413, True))
+        body = gzip.compress(json.dumps(empire_dicts[1]).encode() + b" " * 10**6)
+        self.assertLess(len(body), 10**4)
+        with mock.patch.object(main, "MAX_DECOMPRESSED_SIZE", 10**5):
+            for url in ["/api/odds", "/api/odds/anytime", "/api/odds/matrix"]:
+                response = client.post(url, data=body, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+                self.assertEqual((response.status_code, "error" in response.json), (413, True))
+        with mock.patch.dict(main.app.config, MAX_CONTENT_LENGTH=100):
+            response = client.post("/api/odds", json=empire_dicts[1])
+            self.assertEqual((response.status_code, "error" in response.json), (413, True))
+        with mock.patch.object(main, "API_TIMEOUT", -1):
+            for payload in [empire_dicts[1], empire_dicts]:
+                response = client.post("/api/odds", json=payload)
+                self.assertEqual((response.status_code, "error" in response.json), (408, True))
+        self.assertEqual(main.metrics.to_dict()["counters"]["api_timeouts"], 2)
+
+        response = client.post("/api/odds/anytime?time_budget=5", json=empire_dicts[1])
+        self.assertEqual((response.status_code, response.mimetype), (200, "application/x-ndjson"))
+        results = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(results[-1]["odds"], expected[1][0])
+        self.assertTrue(results[-1]["optimal"])
+
+        response = client.post("/api/odds/matrix?departure=Tatooine&departure=Naboo&arrival=Endor", json=empire_dicts[1])
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual([row["departure"] for row in rows], ["Tatooine", "Naboo"])
+        self.assertEqual(rows[0]["arrivals"]["Endor"], {"odds": expected[1][0], "itinerary": expected[1][1]})
+        self.assertEqual(rows[1]["arrivals"]["Endor"], {"odds": 0, "itinerary": None})
+        response = client.post("/api/odds/matrix", json=empire_dicts[1])
+        self.assertEqual([json.loads(line)["departure"] for line in response.data.decode().splitlines()], ["Tatooine"])
+
+        response = client.get("/metrics")
+        self.assertEqual((response.status_code, response.headers["Content-Type"]), (200, "text/plain; version=0.0.4; charset=utf-8"))
+        self.assertIn("r2d2_states_expanded_total", response.data.decode())
+
+    def test_odds_matrix(self):
+        millenium_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example3", "millennium-falcon.json")
+        empire_path = os.path.join(EXAMPLES_MAIN_FOLDER, "example3", "empire.json")
+        rows = list(compute_odds_matrix(millenium_path, empire_path, ["Tatooine", "Hoth", "Naboo"], ["Endor", "Tatooine"]))
+        self.assertEqual([departure for departure, _ in rows], ["Tatooine", "Hoth", "Naboo"])
+        self.assertEqual(rows[0][1]["Endor"], compute_odds(millenium_path, empire_path))
+        self.assertEqual(rows[1][1]["Endor"][0], 100)
+        self.assertEqual(rows[1][1]["Tatooine"][0], 100)
+        self.assertEqual(rows[2][1]["Endor"], (0, None))
+        self.assertEqual(list(compute_odds_matrix(millenium_path, empire_path)), [("Tatooine", {"Endor": compute_odds(millenium_path, empire_path)})])
+
+    def test_benchmark_generators(self):
+        routes = generate_routes(40, degree=3, seed=1)
+        self.assertEqual(routes, generate_routes(40, degree=3, seed=1))
+        self.assertEqual(len(routes), 60)
+        self.assertTrue(all(1 <= travel_time <= 6 for _, _, travel_time in routes))
+        empire_dict = generate_empire(40, 10, hunter_density=0.1, seed=1)
+        self.assertEqual(len(empire_dict["bounty_hunters"]), 44)
+
+        with tempfile.TemporaryDirectory() as folder:
+            millenium_path, empire_path = write_mission(folder, routes, empire_dict, 6, "P00000", "P00039")
+            self.assertEqual(
+                compute_odds(millenium_path, empire_path, solver="dp")[0],
+                compute_odds(millenium_path, empire_path, solver="paths")[0],
+            )
+
    
 
 if __name__ == "__main__":